@@ -4,7 +4,7 @@ Two-Phase Model: Discovery (Harvester) + Processing (Workers)
 
 Features:
 - Non-blocking UI using threading
-- Live stats refresh every 5 seconds
+- Live stats refresh every 5 seconds (pushed via LISTEN/NOTIFY, no polling queries)
 - Supabase (PostgreSQL) for persistent state
 - Optimized for HF Spaces (16GB RAM limit)
 """
@@ -27,11 +27,18 @@ if os.getenv("SPACE_ID") and not os.path.exists("/home/user/.cache/ms-playwright
 # FIX for Gradio Auth on HF Spaces: Prevent requests from routing localhost through HF proxies
 os.environ["NO_PROXY"] = "localhost,127.0.0.1,0.0.0.0"
 
-from database_supabase import db
+from storage import db
+from status_listener import create_status_listener
 from harvester import harvest_and_save
-from pipeline_runner import process_video, process_backup_video
-from config import MAX_WORKERS, DEFAULT_MAX_PAGES, UPLOAD_PROVIDER
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from pipeline_runner import process_video, process_backup_video, run_leased_processing
+from config import MAX_WORKERS, DEFAULT_MAX_PAGES, UPLOAD_PROVIDER, MAINTENANCE_BATCH_SIZE
+from concurrent.futures import ThreadPoolExecutor
+from core.utils import submit_bounded
+from core.sessions import pool_stats as http_pool_stats
+
+
+# Dashboard numbers pushed by the database (LISTEN/NOTIFY on PostgreSQL) instead of polled
+status_feed = create_status_listener(db)
 
 
 # ============================================================================
@@ -149,39 +156,24 @@ def run_processing_background(max_workers):
         if stale_count > 0:
             print(f"[PROCESSING] Reset {stale_count} stale videos")
         
-        # Get pending URLs (including completed videos on other providers)
+        # Claim pending videos from the shared queue in small batches
+        # (other Spaces/workers on the same database never get the same video)
         import config
-        pending_urls = db.get_pending_videos(current_provider=config.UPLOAD_PROVIDER)
+        print(f"[PROCESSING] Claiming jobs as worker {config.WORKER_ID}")
+        
+        result = run_leased_processing(
+            process_video,
+            max_workers,
+            current_provider=config.UPLOAD_PROVIDER,
+            on_progress=state.update_processing_stats
+        )
+        completed = result['completed']
+        failed = result['failed']
         
-        if not pending_urls:
+        if completed + failed == 0:
             print("[PROCESSING] No pending URLs")
             return
         
-        print(f"[PROCESSING] Processing {len(pending_urls)} videos")
-        
-        # Process concurrently
-        completed = 0
-        failed = 0
-        
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(process_video, url): url for url in pending_urls}
-            
-            for future in as_completed(futures):
-                if getattr(config, "STOP_PROCESSING", False):
-                    print("[PROCESSING] Stop requested! Cancelling unstarted tasks...")
-                    for f in futures:
-                        if not f.done():
-                            f.cancel()
-                    break
-                try:
-                    future.result()
-                    completed += 1
-                except Exception:
-                    failed += 1
-                
-                # Update stats periodically
-                state.update_processing_stats(completed, failed)
-        
         if getattr(config, "STOP_PROCESSING", False):
             print(f"[PROCESSING] Stopped. {completed} succeeded, {failed} failed, remainder cancelled.")
         else:
@@ -200,9 +192,8 @@ def start_processing():
     import config
     config.STOP_PROCESSING = False  # Reset stop signal on start
     
-    # Check if there are pending videos (including completed videos on other providers)
-    pending_count = len(db.get_pending_videos(current_provider=config.UPLOAD_PROVIDER))
-    if pending_count == 0:
+    # Check if there are pending videos (only the first page is read)
+    if next(db.iter_pending_videos(current_provider=config.UPLOAD_PROVIDER, page_size=1), None) is None:
         return "❌ No pending videos to process. Run discovery first."
     
     # Start background thread
@@ -213,7 +204,7 @@ def start_processing():
     )
     thread.start()
     
-    return f"🚀 Processing started for {pending_count} videos with {MAX_WORKERS} workers...\nCheck stats below for progress..."
+    return f"🚀 Processing started with {MAX_WORKERS} workers...\nCheck stats below for progress..."
 
 
 def stop_processing():
@@ -223,7 +214,7 @@ def stop_processing():
     
     import config
     config.STOP_PROCESSING = True
-    return "🛑 Stop signal sent! Active worker tasks will finish their current video download/upload step, and then the pipeline will stop gracefully."
+    return "🛑 Stop signal sent! Active worker tasks will finish their current video download/upload step, and then the pipeline will stop gracefully. Unstarted claimed videos are released back to the queue."
 
 
 def run_backup_processing_background(max_workers):
@@ -233,23 +224,17 @@ def run_backup_processing_background(max_workers):
         import config
         config.STOP_PROCESSING = False
 
-        missing_backup_urls = db.get_missing_backup_videos()
-        if not missing_backup_urls:
-            print("[BACKUP] No videos missing backup uploads!")
-            return
-
-        print(f"[BACKUP] Processing backup uploads for {len(missing_backup_urls)} videos")
+        # Stream the backlog page by page; workers start after the first page
+        # Rows come with the page, so workers do not read them again
+        missing_backup_records = db.iter_missing_backup_videos(with_records=True)
+        print("[BACKUP] Processing backup uploads for videos missing DoodStream/LuluStream")
 
         completed = 0
         failed = 0
 
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(process_backup_video, url): url for url in missing_backup_urls}
-
-            for future in as_completed(futures):
-                if getattr(config, "STOP_PROCESSING", False):
-                    print("[BACKUP] Stop requested!")
-                    break
+            backup_job = lambda record: process_backup_video(record['original_url'], record)
+            for record, future in submit_bounded(executor, backup_job, missing_backup_records, max_pending=max_workers * 2):
                 try:
                     future.result()
                     completed += 1
@@ -258,6 +243,14 @@ def run_backup_processing_background(max_workers):
                     print(f"[BACKUP] Error: {e}")
 
                 state.update_backup_stats(completed, failed)
+                
+                if getattr(config, "STOP_PROCESSING", False):
+                    print("[BACKUP] Stop requested!")
+                    break
+
+        if completed + failed == 0:
+            print("[BACKUP] No videos missing backup uploads!")
+            return
 
         print(f"[BACKUP] Complete: {completed} succeeded, {failed} failed")
     except Exception as e:
@@ -277,8 +270,8 @@ def start_backup_processing():
     import config
     config.STOP_PROCESSING = False
 
-    missing_backup_urls = db.get_missing_backup_videos()
-    if not missing_backup_urls:
+    # Only peek at the first page to decide whether there is any work
+    if next(db.iter_missing_backup_videos(page_size=1), None) is None:
         return "✅ All SeekStreaming videos already have Doodstream and LuluStream backup uploads!"
 
     thread = threading.Thread(
@@ -288,7 +281,7 @@ def start_backup_processing():
     )
     thread.start()
 
-    return f"🛡️ Backup upload started for {len(missing_backup_urls)} videos (DoodStream & LuluStream) with {MAX_WORKERS} workers...\nCheck Hugging Face Space logs and live stats for progress."
+    return f"🛡️ Backup upload started (DoodStream & LuluStream) with {MAX_WORKERS} workers...\nCheck Hugging Face Space logs and live stats for progress."
 
 
 def change_upload_provider(provider):
@@ -302,67 +295,34 @@ def change_upload_provider(provider):
 
 
 def run_ui_maintenance():
-    """Run database maintenance: clean failed videos and reset stuck tasks."""
+    """Run database maintenance: dead-letter permanently failed videos and reset stuck tasks."""
     try:
-        deleted = db.clean_failed_videos()
+        dead = db.clean_failed_videos(MAINTENANCE_BATCH_SIZE)
         reset = db.reset_stale_statuses()
-        return f"✅ Maintenance Complete!\n- Removed {deleted} failed videos.\n- Reset {reset} stuck/zombie tasks to PENDING."
+        return f"✅ Maintenance Complete!\n- Moved {dead} permanently failed videos to dead letters.\n- Reset {reset} stuck/zombie tasks to PENDING."
     except Exception as e:
         return f"❌ Maintenance failed: {str(e)}"
         
 def run_db_migration():
-    """Manually run database migration to add missing columns."""
+    """Manually apply pending schema migrations and repair SeekStreaming statuses."""
     try:
-        from database_supabase import db
-        with db.get_cursor() as cursor:
-            # 1. Terminate other connections to release any active locks
-            try:
-                cursor.execute("""
-                    SELECT pg_terminate_backend(pid) 
-                    FROM pg_stat_activity 
-                    WHERE pid <> pg_backend_pid() 
-                      AND usename = current_user;
-                """)
-                terminated = cursor.rowcount
-                print(f"[MIGRATION] Terminated {terminated} other database connections to release locks.")
-            except Exception as lock_err:
-                print(f"[MIGRATION] Could not terminate other connections: {lock_err}")
-                
-            # 2. Run the ALTER TABLE statement
-            cursor.execute("""
-                ALTER TABLE videos 
-                ADD COLUMN IF NOT EXISTS upload_provider TEXT,
-                ADD COLUMN IF NOT EXISTS upload_id TEXT,
-                ADD COLUMN IF NOT EXISTS doodstream_id TEXT,
-                ADD COLUMN IF NOT EXISTS seekstreaming_id TEXT,
-                ADD COLUMN IF NOT EXISTS lulustream_id TEXT,
-                ADD COLUMN IF NOT EXISTS title TEXT,
-                ADD COLUMN IF NOT EXISTS description TEXT,
-                ADD COLUMN IF NOT EXISTS unique_id TEXT,
-                ADD COLUMN IF NOT EXISTS metadata_synced BOOLEAN DEFAULT FALSE
-            """)
-            
-            # 3. Create indexes
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_status ON videos(status)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_created_at ON videos(created_at)")
-            
-            # 4. Update status for all videos with seekstreaming_id to COMPLETED
-            cursor.execute("""
-                UPDATE videos 
-                SET status = 'COMPLETED' 
-                WHERE seekstreaming_id IS NOT NULL AND status != 'COMPLETED'
-            """)
-            fixed_count = cursor.rowcount
-            
-        return f"✅ Database migration ran successfully! Updated {fixed_count} existing SeekStreaming videos to COMPLETED status."
+        from storage import db
+        # 1. Apply pending migrations (serialized by an advisory lock; no need to kill other connections)
+        applied = db.migrate()
+        print(f"[MIGRATION] Applied migrations: {applied or 'none (schema up to date)'}")
+        
+        # 2. Update status for all videos with seekstreaming_id to COMPLETED
+        fixed_count = db.promote_seekstreaming_completed()
+        
+        return f"✅ Database migration ran successfully (schema version {db.get_schema_version()})! Updated {fixed_count} existing SeekStreaming videos to COMPLETED status."
     except Exception as e:
         return f"❌ Database migration failed: {str(e)}"
 
 def reset_seekstreaming_metadata():
     """Reset SeekStreaming videos with missing metadata to PENDING."""
     try:
-        from database_supabase import db
-        affected = db.reset_seekstreaming_missing_metadata()
+        from storage import db
+        affected = db.reset_seekstreaming_missing_metadata(MAINTENANCE_BATCH_SIZE)
         return f"✅ Successfully reset {affected} SeekStreaming videos with missing metadata to PENDING. They will be re-uploaded on next processing run."
     except Exception as e:
         return f"❌ Failed to reset SeekStreaming videos: {str(e)}"
@@ -372,12 +332,10 @@ def delete_all_seekstreaming_api_background():
     try:
         print("[API DELETE] Starting to delete all SeekStreaming videos from storage...")
         import requests
-        from database_supabase import db
+        from storage import db
         import config
         
-        with db.get_cursor() as cursor:
-            cursor.execute("SELECT original_url, seekstreaming_id FROM videos WHERE seekstreaming_id IS NOT NULL")
-            rows = cursor.fetchall()
+        rows = list(db.iter_provider_uploads('seekstreaming'))
             
         if not rows:
             print("[API DELETE] No SeekStreaming videos found to delete.")
@@ -387,6 +345,14 @@ def delete_all_seekstreaming_api_background():
         
         deleted_count = 0
         failed_count = 0
+        # Deleted videos are re-queued in bulk, MAINTENANCE_BATCH_SIZE per transaction.
+        # A crash before the flush is harmless: the next run sees HTTP 404 and resets them.
+        to_reset = []
+        
+        def flush_resets():
+            if to_reset:
+                db.clear_provider_uploads(to_reset, 'seekstreaming', MAINTENANCE_BATCH_SIZE)
+                to_reset.clear()
         
         for url, filecode in rows:
             is_deleted = False
@@ -421,15 +387,10 @@ def delete_all_seekstreaming_api_background():
                         print(f"[API DELETE] ❌ Legacy DELETE also failed for {filecode}: HTTP {res_leg.status_code} - {res_leg.text[:150]}")
                 
                 if is_deleted:
-                    with db.get_cursor() as cursor:
-                        cursor.execute("""
-                            UPDATE videos 
-                            SET seekstreaming_id = NULL,
-                                status = 'PENDING',
-                                updated_at = CURRENT_TIMESTAMP
-                            WHERE original_url = %s
-                        """, (url,))
+                    to_reset.append(url)
                     deleted_count += 1
+                    if len(to_reset) >= MAINTENANCE_BATCH_SIZE:
+                        flush_resets()
                 else:
                     failed_count += 1
                     
@@ -439,7 +400,8 @@ def delete_all_seekstreaming_api_background():
             except Exception as err:
                 failed_count += 1
                 print(f"[API DELETE] Exception deleting {filecode}: {err}")
-                
+        
+        flush_resets()
         print(f"[API DELETE] Complete! Deleted {deleted_count}/{len(rows)} videos successfully from storage. ({failed_count} failed)")
         
     except Exception as e:
@@ -490,7 +452,7 @@ def run_metadata_backfill():
 def get_recent_data():
     """Fetch recent videos for Data Explorer."""
     try:
-        videos = db.get_recent_videos(limit=50)
+        videos = status_feed.recent(50)
         if not videos:
             return [["No data", "", "", "", "", "", ""]]
         
@@ -518,9 +480,11 @@ def get_recent_data():
 def get_live_stats():
     """Get clean, simple, and beautiful database stats for dashboard."""
     try:
-        db_stats = db.get_stats(provider=None)
-        total = db.get_total_count()
-        provider_stats = db.get_provider_stats()
+        # In-memory view kept current by the status feed (no query per refresh)
+        counters = status_feed.snapshot()
+        db_stats = counters['status']
+        total = counters['total']
+        provider_stats = counters['provider']
         
         current_state = state.get_state()
         
@@ -586,7 +550,29 @@ def get_live_stats():
             stats_md += f"🛡️ **Backup Upload Phase**: ⏳ Running (✅ {b_stats['completed']:,} succeeded | ❌ {b_stats['failed']:,} failed)\n"
         else:
             stats_md += "🛡️ **Backup Upload Phase**: ⏸️ Idle\n"
-        
+
+        # 4. Database latency (only when DB_METRICS is enabled)
+        if db.query_metrics() is not None:
+            stats_md += "\n---\n\n### 🗄️ Database Latency (top methods by total time)\n\n"
+            stats_md += "| Method | Calls | Exec p50 / p95 (ms) | Connect p95 | Commit p95 | Rows | Rollbacks | Slow |\n"
+            stats_md += "| :--- | :---: | :---: | :---: | :---: | :---: | :---: | :---: |\n"
+            fmt = lambda ms: "-" if ms is None else f"{ms:,.0f}"
+            for method, m in db.metrics.top(8):
+                stats_md += (
+                    f"| `{method}` | {m['calls']:,} | {fmt(m['execute']['p50_ms'])} / {fmt(m['execute']['p95_ms'])} "
+                    f"| {fmt(m['connect']['p95_ms'])} | {fmt(m['commit']['p95_ms'])} "
+                    f"| {m['rows']:,} | {m['rollbacks']:,} | {m['slow']:,} |\n"
+                )
+
+        # 5. Scraping connection reuse (shared HTTP pools)
+        http = http_pool_stats()
+        if http['requests']:
+            stats_md += "\n---\n\n### 🌐 Scraping Connections\n\n"
+            stats_md += (
+                f"{http['requests']:,} requests, {http['hit_rate']:.0%} on a pooled connection "
+                f"({http['hits']:,} hits, {http['misses']:,} new connections)\n"
+            )
+
         return stats_md
     except Exception as e:
         return f"❌ Error fetching stats: {str(e)}"
@@ -755,7 +741,7 @@ with gr.Blocks(title="Video Scraper Pipeline", theme=gr.themes.Soft()) as app:
             
             ### 1. Environment Variables (HF Spaces Secrets)
             
-            - `DATABASE_URL`: Supabase connection string (PostgreSQL)
+            - `DATABASE_URL`: Supabase connection string (PostgreSQL), or `sqlite:///videos.db` for a local single-box database
             - `UPLOAD_PROVIDER`: Selected video upload provider (`seekstreaming` (default), `doodstream`, `lulustream`, or `bunny`)
             - `DOODSTREAM_API_KEY`: DoodStream API key (and optional `DOODSTREAM_BASE_URL`)
             - `SEEKSTREAMING_API_KEY`: SeekStreaming API key (and optional `SEEKSTREAMING_BASE_URL`)
@@ -815,9 +801,9 @@ with gr.Blocks(title="Video Scraper Pipeline", theme=gr.themes.Soft()) as app:
 
 if __name__ == "__main__":
     # Initialize database on startup
-    print("🔧 Initializing Supabase connection...")
+    print("🔧 Initializing database connection...")
     try:
-        db._init_db()
+        db.migrate()
         print("✅ Database ready")
     except Exception as e:
         print(f"❌ Database error: {e}")
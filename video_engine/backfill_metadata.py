@@ -2,18 +2,33 @@ import sys
 import os
 import uuid
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from database_supabase import db
+from storage import db
+from config import WORKER_ID
+from core.attempts import AttemptRecorder, record_stage, save_attempt
 from core.logger import logger
 from extractors import get_extractor
 from core.uploader import get_uploader
+from core.utils import submit_bounded
 
 def sync_video_metadata(url, unique_id, db_title, db_description, seek_id, dood_id, lulu_id):
-    """Extracts metadata if needed and syncs it across DB and providers."""
+    """Extracts metadata if needed and syncs it across DB and providers (timed in video_attempts)."""
+    attempt = AttemptRecorder(url, 'metadata', worker_id=WORKER_ID).start()
+    try:
+        result = _sync_video_metadata(url, unique_id, db_title, db_description, seek_id, dood_id, lulu_id)
+        attempt.finish('COMPLETED' if all(stage['ok'] for stage in attempt.stages) else 'FAILED')
+        return result
+    except Exception as e:
+        attempt.finish('FAILED', e)
+        raise
+    finally:
+        save_attempt(db, attempt)
+
+def _sync_video_metadata(url, unique_id, db_title, db_description, seek_id, dood_id, lulu_id):
     updates = {}
     
     if not unique_id:
@@ -25,8 +40,9 @@ def sync_video_metadata(url, unique_id, db_title, db_description, seek_id, dood_
     # 1. Force Extract / Re-extract metadata to ensure we have the best SEO version
     try:
         logger.info(f"Extracting metadata for {url}")
-        extractor = get_extractor(url)
-        _, ext_title, ext_desc = extractor.extract(url)
+        with record_stage('extract'):
+            extractor = get_extractor(url)
+            _, ext_title, ext_desc = extractor.extract(url)
         
         # Only update if extraction yielded valid data
         if ext_title:
@@ -52,7 +68,8 @@ def sync_video_metadata(url, unique_id, db_title, db_description, seek_id, dood_
         # Doodstream
         if dood_id:
             try:
-                get_uploader('doodstream').set_metadata(dood_id, video_title, video_desc)
+                with record_stage('metadata', 'doodstream'):
+                    get_uploader('doodstream').set_metadata(dood_id, video_title, video_desc)
                 logger.info(f"Synced metadata to Doodstream: {dood_id}")
                 sync_success = True
             except Exception as e:
@@ -61,7 +78,8 @@ def sync_video_metadata(url, unique_id, db_title, db_description, seek_id, dood_
         # SeekStreaming
         if seek_id:
             try:
-                get_uploader('seekstreaming').set_metadata(seek_id, video_title, video_desc)
+                with record_stage('metadata', 'seekstreaming'):
+                    get_uploader('seekstreaming').set_metadata(seek_id, video_title, video_desc)
                 logger.info(f"Synced metadata to SeekStreaming: {seek_id}")
                 sync_success = True
             except Exception as e:
@@ -70,7 +88,8 @@ def sync_video_metadata(url, unique_id, db_title, db_description, seek_id, dood_
         # LuluStream
         if lulu_id:
             try:
-                get_uploader('lulustream').set_metadata(lulu_id, video_title, video_desc)
+                with record_stage('metadata', 'lulustream'):
+                    get_uploader('lulustream').set_metadata(lulu_id, video_title, video_desc)
                 logger.info(f"Synced metadata to LuluStream: {lulu_id}")
                 sync_success = True
             except Exception as e:
@@ -87,45 +106,23 @@ def main():
     logger.info("Starting Backfill & Sync of Metadata to 3 Providers")
     logger.info("=" * 60)
     
-    videos_to_process = []
-    
-    with db.get_cursor() as cursor:
-        cursor.execute("""
-            SELECT original_url, unique_id, title, description, seekstreaming_id, doodstream_id, lulustream_id
-            FROM videos
-            WHERE status = 'COMPLETED' AND (metadata_synced IS NULL OR metadata_synced = FALSE)
-        """)
-        
-        for row in cursor.fetchall():
-            url = row[0]
-            unique_id = row[1]
-            title = row[2]
-            description = row[3]
-            seek_id = row[4]
-            dood_id = row[5]
-            lulu_id = row[6]
-            
-            videos_to_process.append((url, unique_id, title, description, seek_id, dood_id, lulu_id))
-            
-    logger.info(f"Found {len(videos_to_process)} completed videos to sync.")
+    # Stream (url, unique_id, title, description, seek_id, dood_id, lulu_id) rows page by page,
+    # so syncing starts after the first page instead of after loading the whole backlog
+    videos_to_process = db.iter_unsynced_metadata_videos()
     
     success_count = 0
+    processed_count = 0
     with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {
-            executor.submit(sync_video_metadata, url, unique_id, title, desc, seek_id, dood_id, lulu_id): url 
-            for url, unique_id, title, desc, seek_id, dood_id, lulu_id in videos_to_process
-        }
-        
-        for future in as_completed(futures):
-            url = futures[future]
+        for row, future in submit_bounded(executor, lambda row: sync_video_metadata(*row), videos_to_process, max_pending=10):
+            processed_count += 1
             try:
                 if future.result():
                     success_count += 1
             except Exception as e:
-                logger.error(f"Unhandled error for {url}: {e}")
+                logger.error(f"Unhandled error for {row[0]}: {e}")
                 
     logger.info("=" * 60)
-    logger.info(f"Sync Complete. Successfully processed {success_count}/{len(videos_to_process)} videos.")
+    logger.info(f"Sync Complete. Successfully processed {success_count}/{processed_count} videos.")
     logger.info("=" * 60)
 
 if __name__ == "__main__":
@@ -1,24 +1,87 @@
 import os
+import socket
 
 # ============================================================================
 # DATABASE CONFIGURATION (Supabase PostgreSQL)
 # ============================================================================
+# postgresql://... selects Supabase; sqlite:///path selects the local SQLite backend (see storage.py)
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
-    raise ValueError(
-        "DATABASE_URL environment variable must be set. "
-        "Get it from Supabase: Settings > Database > Connection String (URI)"
+    import logging
+    DATABASE_URL = "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), "videos.db")
+    logging.warning(
+        "[WARN] DATABASE_URL not set. Using local SQLite database (single machine only). "
+        "For shared state get it from Supabase: Settings > Database > Connection String (URI)"
     )
 
+IS_POSTGRES = DATABASE_URL.startswith(("postgresql://", "postgres://"))
+
 # CRITICAL: Add connection timeout to handle HF Spaces latency spikes
 # Supabase shared environment can have variable latency
-if "connect_timeout" not in DATABASE_URL:
+if IS_POSTGRES and "connect_timeout" not in DATABASE_URL:
     import logging
     logging.warning(
         "[WARN] DATABASE_URL missing connect_timeout parameter. "
         "Add '?connect_timeout=10' to prevent hanging connections."
     )
 
+# Connection pool (see database_supabase.ConnectionPool)
+# Supabase free tier allows ~15 clients through the session pooler, shared by
+# every process (Gradio app, GitHub Action, local scripts). Keep each pool small.
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "4"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds to wait for a free connection
+DB_POOL_VALIDATE_AFTER = float(os.getenv("DB_POOL_VALIDATE_AFTER", "30"))  # Ping connections idle longer than this
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))  # Recycle connections older than this
+DB_POOL_HARD_LIMIT = 10
+if DB_POOL_MAX_SIZE > DB_POOL_HARD_LIMIT:
+    import logging
+    logging.warning(f"[WARN] DB_POOL_MAX_SIZE={DB_POOL_MAX_SIZE} exceeds Supabase client budget. Capping at {DB_POOL_HARD_LIMIT}.")
+    DB_POOL_MAX_SIZE = DB_POOL_HARD_LIMIT
+DB_POOL_MIN_SIZE = max(0, min(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE))
+
+# Write-behind for intermediate status updates (EXTRACTING/DOWNLOADING/UPLOADING).
+# When > 0, these are batched in memory and flushed every N milliseconds;
+# terminal writes (COMPLETED, provider IDs, errors) stay synchronous. 0 = disabled.
+DB_WRITE_BEHIND_MS = int(os.getenv("DB_WRITE_BEHIND_MS", "0"))
+
+# Durable local journal for status writes (see core/journal.py). When set to a file path,
+# update_status/log_error/record_upload/save_successful_upload append to this SQLite file
+# and return; a background thread replays them into PostgreSQL in order, so workers keep
+# going through database outages. Replaces DB_WRITE_BEHIND_MS. Empty = disabled.
+DB_STATUS_JOURNAL = os.getenv("DB_STATUS_JOURNAL", "")
+DB_JOURNAL_REPLAY_MS = int(os.getenv("DB_JOURNAL_REPLAY_MS", "500"))  # Replay interval while healthy
+
+# Per-method query latency metrics (core/metrics.py): connect/execute/commit histograms,
+# rows and rollbacks for every SupabaseManager call, shown on the dashboard. Off by default.
+DB_METRICS = os.getenv("DB_METRICS", "false").lower() == "true"
+DB_SLOW_QUERY_MS = int(os.getenv("DB_SLOW_QUERY_MS", "500"))  # Log statements slower than this (0 = never)
+
+# Live status feed for the dashboard (see status_listener.py). PostgreSQL pushes
+# changes over LISTEN/NOTIFY; other backends re-read counters at most every N seconds.
+STATUS_POLL_SECONDS = float(os.getenv("STATUS_POLL_SECONDS", "5"))
+
+# Archival of finished videos (SupabaseManager.archive_completed, run by maintenance_db.py).
+# COMPLETED rows with every backup and synced metadata, untouched for N days, move to
+# videos_archive so the live table only carries the working set. 0 = disabled.
+ARCHIVE_COMPLETED_AFTER_DAYS = int(os.getenv("ARCHIVE_COMPLETED_AFTER_DAYS", "0"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "5000"))  # Rows moved per transaction
+
+# Set-based maintenance (clean_failed_videos, reset_seekstreaming_missing_metadata,
+# clear_provider_uploads): rows changed per transaction, so a bulk pass never holds
+# row locks (or SQLite's write lock) that a worker is waiting on for long.
+MAINTENANCE_BATCH_SIZE = int(os.getenv("MAINTENANCE_BATCH_SIZE", "1000"))
+
+# Dead letters (see core/fingerprint.py). A video that failed with an error class marked
+# permanent (404, removed, not a video page...) or failed this many times leaves the
+# queue for the dead_letters table, and seeding never re-queues it.
+DEAD_LETTER_AFTER_FAILURES = int(os.getenv("DEAD_LETTER_AFTER_FAILURES", "3"))
+
+# Columnar snapshot export (export_snapshot.py). Rows per Parquet row group / Arrow
+# record batch, and how recent a change must be to wait for the next incremental run.
+EXPORT_ROW_GROUP_SIZE = int(os.getenv("EXPORT_ROW_GROUP_SIZE", "100000"))
+EXPORT_WATERMARK_LAG_SECONDS = int(os.getenv("EXPORT_WATERMARK_LAG_SECONDS", "60"))
+
 # ============================================================================
 # VIDEO UPLOAD PROVIDER CONFIGURATION
 # ============================================================================
@@ -52,12 +115,15 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 TEMP_STORAGE_DIR = os.path.join(BASE_DIR, "temp_storage")
 os.makedirs(TEMP_STORAGE_DIR, exist_ok=True)
 
-# SQLite database path (used by legacy database.py module)
+# SQLite database path (default for sqlite:/// DATABASE_URL, see database.py)
 DB_PATH = os.path.join(BASE_DIR, "videos.db")
 
 # Logging
 LOG_FILE_PATH = os.path.join(BASE_DIR, "pipeline.log")
 
+# Snapshot exports (export_snapshot.py --out overrides)
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(BASE_DIR, "exports"))
+
 # ============================================================================
 # CONCURRENCY SETTINGS (HF Spaces Optimized)
 # ============================================================================
@@ -78,6 +144,14 @@ if _MAX_WORKERS_ENV > 2:
 else:
     MAX_WORKERS = _MAX_WORKERS_ENV
 
+# ============================================================================
+# JOB QUEUE (lease-based claiming, safe for several worker processes/hosts)
+# ============================================================================
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+# A claimed video is owned by this worker until the lease expires.
+# Leases are renewed by a heartbeat, so this only bounds recovery after a crash.
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "900"))
+
 # ============================================================================
 # BROWSER EXTRACTOR SETTINGS
 # ============================================================================
@@ -88,8 +162,24 @@ BROWSER_HEADLESS = True  # Always True for production/HF Spaces
 # HARVESTER PAGINATION SETTINGS
 # ============================================================================
 DEFAULT_MAX_PAGES = int(os.getenv("DEFAULT_MAX_PAGES", "5"))
-PAGINATION_DELAY_MIN = float(os.getenv("PAGINATION_DELAY_MIN", "2.0"))
-PAGINATION_DELAY_MAX = float(os.getenv("PAGINATION_DELAY_MAX", "5.0"))
+
+# Pages are fetched concurrently (core/fetcher.py) within a politeness budget per
+# domain, instead of one at a time with a random 2-7s sleep in between.
+HARVEST_RATE_PER_DOMAIN = float(os.getenv("HARVEST_RATE_PER_DOMAIN", "1.0"))  # Requests per second
+HARVEST_BURST = int(os.getenv("HARVEST_BURST", "2"))  # Requests allowed back to back
+HARVEST_CONCURRENCY = int(os.getenv("HARVEST_CONCURRENCY", "4"))  # Requests in flight per domain
+
+# Incremental discovery: once a site has been crawled, a run stops after this many
+# consecutive pages whose links are all already in the database (0 = always crawl
+# max_pages). Crawl progress per site is kept in harvest_marks.
+HARVEST_STOP_AFTER_KNOWN_PAGES = int(os.getenv("HARVEST_STOP_AFTER_KNOWN_PAGES", "2"))
+
+# Shared scraping HTTP clients (core/sessions.py): one keep-alive connection pool per
+# host, reused by every harvester and extractor request.
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "32"))  # Open connections, all hosts
+HTTP_POOL_KEEPALIVE = int(os.getenv("HTTP_POOL_KEEPALIVE", "16"))  # Idle connections kept open
+HTTP_POOL_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_POOL_KEEPALIVE_EXPIRY", "60"))  # Seconds an idle connection is kept
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))  # Seconds per request
 
 # ============================================================================
 # PROXY SETTINGS (Optional)
@@ -109,7 +199,7 @@ if IS_HF_SPACES:
     import logging
     logging.warning("🚀 Running on Hugging Face Spaces - Optimizations enabled")
     logging.warning(f"   MAX_WORKERS: {MAX_WORKERS}")
-    logging.warning(f"   Database: Supabase (PostgreSQL)")
+    logging.warning(f"   Database: {'Supabase (PostgreSQL)' if IS_POSTGRES else 'SQLite (local)'}")
 
 # Global cancel signal for active processing tasks
 STOP_PROCESSING = False
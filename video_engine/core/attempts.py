@@ -0,0 +1,160 @@
+"""
+Per-attempt history for the processing pipeline.
+
+An AttemptRecorder collects the wall time, bytes and outcome of every stage of one
+attempt at a video (extract, download, validate, each provider upload, metadata set)
+in memory. The caller stores it with one db.record_attempt() call when the attempt
+ends, so timing adds no database round trips while the video is being processed.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlparse
+from core.logger import logger
+
+_local = threading.local()
+
+
+def url_domain(url):
+    """Host of a URL without a leading www. (the grouping key for per-domain stats)."""
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class AttemptRecorder:
+    """
+    Stage timings of one attempt at a video, written as one video_attempts row.
+
+    Usage:
+        attempt = AttemptRecorder(url, 'primary', worker_id=WORKER_ID).start()
+        with attempt.stage('download') as stage:
+            ...
+            stage['bytes'] = os.path.getsize(filepath)
+        attempt.finish('COMPLETED')
+        db.record_attempt(attempt.to_record())
+    """
+
+    def __init__(self, url, kind, worker_id=None):
+        """
+        Args:
+            url: Video page URL
+            kind: 'primary' (process_video), 'backup' (process_backup_video) or 'metadata'
+            worker_id: Worker that made the attempt
+        """
+        self.url = url
+        self.kind = kind
+        self.worker_id = worker_id
+        self.domain = url_domain(url)
+        self.extractor = None
+        self.outcome = None
+        self.error_message = None
+        self.stages = []
+        self.started_at = datetime.now()
+        self.finished_at = None
+        self._start = time.monotonic()
+        self._duration = None
+
+    def start(self):
+        """Make this the current attempt of the calling thread (see record_stage). Returns self."""
+        _local.attempt = self
+        return self
+
+    @contextmanager
+    def stage(self, name, provider=None):
+        """
+        Time one stage. The yielded dict may be given a 'bytes' count; the stage
+        is recorded as failed (ok=False) if the block raises.
+        """
+        entry = {'stage': name, 'provider': provider, 'seconds': None, 'bytes': None, 'ok': False}
+        start = time.monotonic()
+        try:
+            yield entry
+            entry['ok'] = True
+        finally:
+            entry['seconds'] = round(time.monotonic() - start, 3)
+            self.stages.append(entry)
+
+    def finish(self, outcome, error=None):
+        """Set the outcome (COMPLETED, PENDING, FAILED, ...), stop the clock and detach from the thread."""
+        self.outcome = outcome
+        if error is not None:
+            self.error_message = str(error)[:1000]
+        self.finished_at = datetime.now()
+        self._duration = round(time.monotonic() - self._start, 3)
+        if current_attempt() is self:
+            _local.attempt = None
+
+    def bytes_for(self, stage_name):
+        """Total bytes recorded by stages called `stage_name`."""
+        return sum(entry['bytes'] or 0 for entry in self.stages if entry['stage'] == stage_name) or None
+
+    def to_record(self):
+        """
+        Returns:
+            dict: Row for BaseStorage.record_attempt()
+        """
+        if self.finished_at is None:
+            self.finish(self.outcome or 'FAILED')
+        return {
+            'video_url': self.url,
+            'kind': self.kind,
+            'worker_id': self.worker_id,
+            'domain': self.domain,
+            'extractor': self.extractor,
+            'outcome': self.outcome,
+            'error_message': self.error_message,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'duration_seconds': self._duration,
+            'bytes_downloaded': self.bytes_for('download'),
+            'bytes_uploaded': self.bytes_for('upload'),
+            'stages': self.stages
+        }
+
+
+def save_attempt(storage, attempt):
+    """
+    Store a finished attempt through `storage` (a BaseStorage). Never raises:
+    losing one history row must not fail the video it describes.
+    """
+    if attempt is None:
+        return
+    try:
+        storage.record_attempt(attempt.to_record())
+    except Exception as e:
+        logger.warning(f"Could not record attempt history for {attempt.url}: {e}")
+
+
+def current_attempt():
+    """The AttemptRecorder active on this thread, or None."""
+    return getattr(_local, "attempt", None)
+
+
+@contextmanager
+def record_stage(name, provider=None):
+    """
+    Time a stage of the thread's current attempt; a plain no-op outside one.
+    Lets shared code (uploaders) report sub-stages without being handed the recorder.
+    """
+    attempt = current_attempt()
+    if attempt is None:
+        yield {}
+        return
+    with attempt.stage(name, provider) as entry:
+        yield entry
+
+
+def percentile(sorted_values, fraction):
+    """
+    Linear-interpolated percentile of an ascending list (same as PostgreSQL percentile_cont).
+
+    Returns:
+        float: Value at `fraction` (0..1), or None for an empty list
+    """
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
@@ -2,12 +2,16 @@
 Custom exceptions for the video ingestion pipeline.
 All exceptions are logged automatically when raised.
 """
+import logging
 from core.logger import logger
 
 
 class PipelineException(Exception):
     """Base exception for all pipeline errors."""
     
+    # Level the exception is logged at when raised
+    log_level = logging.ERROR
+    
     def __init__(self, message, url=None, details=None):
         self.message = message
         self.url = url
@@ -20,7 +24,7 @@ class PipelineException(Exception):
             log_msg += f" | URL: {url}"
         if details:
             log_msg += f" | Details: {details}"
-        logger.error(log_msg)
+        logger.log(self.log_level, log_msg)
 
 
 class ExtractionError(PipelineException):
@@ -48,6 +52,14 @@ class DatabaseError(PipelineException):
     pass
 
 
+class InvalidTransitionError(PipelineException):
+    """
+    Raised when a video's current status does not allow the requested stage change.
+    Workers skip such a video (it moved on without them), so this is only a warning.
+    """
+    log_level = logging.WARNING
+
+
 class ConfigurationError(PipelineException):
     """Raised when configuration is invalid or missing."""
     pass
@@ -66,6 +78,7 @@ __all__ = [
     'UploadError',
     'DiskSpaceError',
     'DatabaseError',
+    'InvalidTransitionError',
     'ConfigurationError',
     'ProxyError',
 ]
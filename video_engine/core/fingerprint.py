@@ -0,0 +1,93 @@
+"""
+Error fingerprinting.
+
+Pipeline errors repeat the same few failures with different URLs, IDs, sizes and
+paths baked in. error_template() reduces a message to a stack-free template
+("Failed to upload binary (HTTP 502)", "Video file too small (<n> bytes), likely
+corrupted: <path>"), which the storage backends keep once per class in
+error_classes and reference from each failed video.
+"""
+import hashlib
+import re
+
+# Stored per video next to the class; the class template carries the rest
+ERROR_MESSAGE_MAX = 500
+
+# Longest template kept (longer ones are truncated before hashing)
+TEMPLATE_MAX = 300
+
+# Templates of failures that will not go away by retrying the same URL
+PERMANENT_ERROR_PATTERNS = [
+    r"\bHTTP(?: Error)? (?:404|410)\b",
+    r"Skipping non-video page",
+    r"Unsupported URL",
+    r"Video unavailable",
+    r"This video is private",
+    r"\b(?:video|file) (?:has been|was) (?:removed|deleted)",
+    r"Video duration too short",
+]
+
+_PERMANENT_RE = re.compile("|".join(PERMANENT_ERROR_PATTERNS), re.IGNORECASE)
+_ANSI_RE = re.compile(r"\x1b\[[0-9;]*m")
+_SUBSTITUTIONS = [
+    (re.compile(r"\b[a-z][a-z0-9+.-]*://\S+", re.IGNORECASE), "<url>"),
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.IGNORECASE), "<uuid>"),
+    (re.compile(r"(?:[A-Za-z]:)?(?:[\\/][\w.-]+){2,}"), "<path>"),
+    (re.compile(r"\b0x[0-9a-f]+\b|\b(?=[0-9a-f]*\d)(?=[0-9a-f]*[a-f])[0-9a-f]{8,}\b", re.IGNORECASE), "<hex>"),
+    (re.compile(r"'[^'\n]{16,}'|\"[^\"\n]{16,}\""), "'<str>'"),
+]
+_NUMBER_RE = re.compile(r"(?<![\w<])\d+(?:\.\d+)?")
+# Status codes stay in the template: HTTP 404 and HTTP 502 are different failures
+_STATUS_CONTEXT_RE = re.compile(r"(?:HTTP(?: Error)?|status(?: code)?)\s*:?\s*$", re.IGNORECASE)
+
+
+def error_summary(message):
+    """
+    The meaningful line of an error message: ANSI colours removed and, for a
+    traceback, its final "SomeError: ..." line instead of the stack.
+    """
+    text = _ANSI_RE.sub("", str(message or ""))
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines:
+        return ""
+    if any(line.startswith("Traceback (most recent call last)") for line in lines):
+        return lines[-1]
+    return lines[0]
+
+
+def short_error(message):
+    """error_summary() capped at ERROR_MESSAGE_MAX, for the per-video error_message column."""
+    return error_summary(message)[:ERROR_MESSAGE_MAX]
+
+
+def error_template(message):
+    """
+    Normalize an error message into its class template: URLs, paths, UUIDs, hex IDs,
+    long quoted values and numbers (except HTTP status codes) become placeholders.
+    """
+    template = error_summary(message)
+    for pattern, placeholder in _SUBSTITUTIONS:
+        template = pattern.sub(placeholder, template)
+
+    def number(match):
+        if _STATUS_CONTEXT_RE.search(match.string[max(0, match.start() - 16):match.start()]):
+            return match.group(0)
+        return "<n>"
+
+    template = _NUMBER_RE.sub(number, template)
+    return " ".join(template.split())[:TEMPLATE_MAX]
+
+
+def error_fingerprint(message):
+    """
+    Returns:
+        tuple: (fingerprint, template), the fingerprint being md5(template) as a UUID string
+    """
+    template = error_template(message)
+    digest = hashlib.md5(template.encode("utf-8")).hexdigest()
+    return f"{digest[:8]}-{digest[8:12]}-{digest[12:16]}-{digest[16:20]}-{digest[20:]}", template
+
+
+def is_permanent_error(template):
+    """Whether an error template matches PERMANENT_ERROR_PATTERNS."""
+    return bool(_PERMANENT_RE.search(template or ""))
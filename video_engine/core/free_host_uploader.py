@@ -4,6 +4,7 @@ from tenacity import retry, stop_after_attempt, wait_exponential
 from core.logger import logger
 from core.exceptions import UploadError, ConfigurationError
 from core.uploader import BaseUploader
+from core.attempts import record_stage
 
 class FreeHostBaseUploader(BaseUploader):
     """
@@ -142,7 +143,8 @@ class FreeHostBaseUploader(BaseUploader):
         filecode = self._upload_to_server(server_url, filepath, title)
         
         # After upload, set metadata if provider supports it
-        self.set_metadata(filecode, title, description)
+        with record_stage('metadata', self.provider_name):
+            self.set_metadata(filecode, title, description)
         
         return filecode
 
@@ -320,7 +322,8 @@ class SeekStreamingUploader(FreeHostBaseUploader):
         logger.info(f"🎉 SeekStreaming upload successful! Filecode: {filecode}")
         
         # Explicitly set metadata after upload using v1 API
-        self.set_metadata(filecode, title, description)
+        with record_stage('metadata', self.provider_name):
+            self.set_metadata(filecode, title, description)
         
         return filecode
     
@@ -393,7 +396,8 @@ class SeekStreamingUploader(FreeHostBaseUploader):
         logger.info(f"🎉 SeekStreaming chunked upload successful! Filecode: {filecode}")
         
         # Explicitly set metadata after upload using v1 API
-        self.set_metadata(filecode, title, description)
+        with record_stage('metadata', self.provider_name):
+            self.set_metadata(filecode, title, description)
         
         return filecode
 
@@ -0,0 +1,136 @@
+"""
+Job-scoped cache of one video's row.
+
+The per-video pipeline used to re-read status and provider IDs with
+get_all_upload_ids() before every decision. A CachedJob reads the row at most once
+(or not at all, when the backlog query already returned it) and applies this
+process's own writes to its copy, so every later check is served from memory.
+"""
+
+
+class CachedJob:
+    """
+    One video's status and provider IDs, kept current by the writes made through it.
+
+    Only valid while this worker owns the video (claimed with a lease, or processed
+    by a single caller): writes by other processes are not seen.
+
+    Usage:
+        job = CachedJob(db, url, record)   # record from claim_jobs(..., with_records=True)
+        if not job.get('seekstreaming_id'):
+            job.start_stage('UPLOADING', upload_provider='seekstreaming')
+    """
+
+    def __init__(self, storage, url, record=None):
+        """
+        Args:
+            storage: BaseStorage backend that receives the writes
+            url: Video page URL
+            record: Row already read by a backlog query (dict with the
+                    BaseStorage.JOB_COLUMNS keys), or None to load it lazily
+        """
+        self.storage = storage
+        self.url = url
+        self._row = None
+        self._loaded = False
+        self.reads = 0
+        if record is not None:
+            self._row = {column: record.get(column) for column in storage.JOB_COLUMNS}
+            self._loaded = True
+
+    def _load(self):
+        if not self._loaded:
+            self._row = self.storage.get_all_upload_ids(self.url)
+            self._loaded = True
+            self.reads += 1
+        return self._row
+
+    @property
+    def exists(self):
+        """Whether the video has a row in storage."""
+        return self._load() is not None
+
+    def get(self, column, default=None):
+        """Cached value of one of BaseStorage.JOB_COLUMNS."""
+        row = self._load()
+        if row is None:
+            return default
+        value = row.get(column)
+        return default if value is None else value
+
+    def _apply(self, **values):
+        if self._row is None:
+            self._row = {column: None for column in self.storage.JOB_COLUMNS}
+            self._loaded = True
+        for column, value in values.items():
+            if column in self.storage.JOB_COLUMNS:
+                self._row[column] = value
+
+    def insert(self, status='PENDING'):
+        """
+        Insert the video if it has no row yet.
+
+        Returns:
+            bool: True if inserted
+        """
+        inserted = self.storage.insert_video(self.url, status)
+        if inserted:
+            self._apply(status=status)
+        else:
+            # Someone else created it meanwhile: take their row
+            self.refresh()
+        return inserted
+
+    def update_status(self, status, **fields):
+        """storage.update_status() for this video, mirrored in the cache."""
+        self.storage.update_status(self.url, status, **fields)
+        self._apply(status=status, **{
+            column: value for column, value in fields.items()
+            if column in self.storage.ALLOWED_UPDATE_COLUMNS
+        })
+
+    def start_stage(self, stage, **fields):
+        """
+        storage.start_stage() for this video (inserting it if new). The cache takes
+        the job record it returns, or applies the stage itself if the write was deferred.
+        """
+        record = self.storage.start_stage(self.url, stage, **fields)
+        if record is not None:
+            self._row = dict(record)
+            self._loaded = True
+        else:
+            self._apply(status=stage, **fields)
+
+    def record_upload(self, provider, remote_id, size=None, status=None):
+        """storage.record_upload() for this video, mirrored in the cache."""
+        self.storage.record_upload(self.url, provider, remote_id, size=size, status=status)
+        values = {}
+        prov_col = self.storage.PROVIDER_COLUMNS.get(provider)
+        if prov_col:
+            values[prov_col] = remote_id
+        if status:
+            values['status'] = status
+        self._apply(**values)
+
+    def save_successful_upload(self, title, seek_id, dood_id, lulu_id):
+        """storage.save_successful_upload() for this video, mirrored in the cache."""
+        self.storage.save_successful_upload(self.url, title, seek_id, dood_id, lulu_id)
+        self._apply(
+            status='COMPLETED', upload_provider='seekstreaming', upload_id=seek_id,
+            seekstreaming_id=seek_id, doodstream_id=dood_id, lulustream_id=lulu_id
+        )
+
+    def log_error(self, error_msg, provider=None):
+        """storage.log_error() for this video, mirrored in the cache."""
+        self.storage.log_error(self.url, error_msg, provider=provider)
+        if not self.exists:
+            return
+        values = {'status': 'COMPLETED' if self.get('seekstreaming_id') else 'FAILED'}
+        if provider:
+            values['upload_provider'] = provider
+        self._apply(**values)
+
+    def refresh(self):
+        """Drop the cached row; the next read loads it again."""
+        self._row = None
+        self._loaded = False
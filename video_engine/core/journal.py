@@ -0,0 +1,242 @@
+"""
+Durable local journal for status writes.
+
+With the journal enabled (DB_STATUS_JOURNAL), SupabaseManager.update_status(),
+log_error(), record_upload() and save_successful_upload() append the write to a
+local SQLite file and return at once. A background thread replays the journal into
+PostgreSQL in append order and deletes what was committed, so a database brownout
+delays the writes instead of stalling (or failing) the workers that made them.
+
+Every journaled write sets absolute values (status, IDs, error text), so replaying
+an entry twice (e.g. after a crash between the PostgreSQL commit and the journal
+delete) leaves the same row behind. Entries that fail for a non-transient reason
+are kept with dead = 1 and their error, so one bad row never blocks the rest.
+"""
+import json
+import sqlite3
+import threading
+import time
+from core.logger import logger
+
+JOURNAL_SCHEMA = [
+    """
+        CREATE TABLE IF NOT EXISTS journal (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            op TEXT NOT NULL,
+            url TEXT NOT NULL,
+            args TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            dead INTEGER NOT NULL DEFAULT 0
+        )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_journal_live_url ON journal(url, seq) WHERE dead = 0",
+]
+
+
+class StatusJournal:
+    """
+    Append-only SQLite journal with an in-order background replayer.
+
+    Usage:
+        journal = StatusJournal(path, apply_batch, transient_errors=(psycopg2.OperationalError,))
+        journal.append('status', url, {'status': 'UPLOADING', 'fields': {}})
+        journal.replay(url)   # apply this URL's entries now (before a synchronous write)
+    """
+
+    def __init__(self, path, apply_batch, transient_errors=(), interval=0.5,
+                 batch_size=200, max_backoff=30.0):
+        """
+        Args:
+            path: SQLite file holding the journal (created if missing)
+            apply_batch: Callable applying a list of (op, url, args) in one transaction
+            transient_errors: Exception types meaning "database unavailable, retry later"
+            interval: Seconds between background replays while the database is healthy
+            batch_size: Entries applied per transaction
+            max_backoff: Longest pause between retries during an outage
+        """
+        self.path = path
+        self.apply_batch = apply_batch
+        self.transient_errors = tuple(transient_errors)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+
+        # isolation_level=None: autocommit, every append is durable when it returns
+        self._conn = sqlite3.connect(path, timeout=60.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=FULL')  # An acknowledged write survives power loss
+        for statement in JOURNAL_SCHEMA:
+            self._conn.execute(statement)
+        self._lock = threading.Lock()  # Guards the SQLite connection
+        self._replay_lock = threading.Lock()  # One replayer at a time keeps append order
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+        self._appended = 0
+        self._replayed = 0
+        self._dead = 0
+        self._failures = 0
+        self._outage_since = None
+
+        leftover = self.pending()
+        if leftover:
+            logger.info(f"[JOURNAL] {leftover} status writes left from a previous run, replaying")
+
+        self._thread = threading.Thread(target=self._run, name="status-journal", daemon=True)
+        self._thread.start()
+
+    def append(self, op, url, args):
+        """
+        Durably record one write.
+
+        Args:
+            op: Operation name understood by apply_batch
+            url: Video page URL (entries for one URL are applied in append order)
+            args: JSON-serialisable keyword arguments of the operation
+        """
+        payload = json.dumps(args, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO journal (op, url, args, created_at) VALUES (?, ?, ?, ?)",
+                (op, url, payload, time.time())
+            )
+            self._appended += 1
+
+    def _read_batch(self, url=None):
+        with self._lock:
+            if url is None:
+                rows = self._conn.execute(
+                    "SELECT seq, op, url, args FROM journal WHERE dead = 0 ORDER BY seq LIMIT ?",
+                    (self.batch_size,)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT seq, op, url, args FROM journal WHERE url = ? AND dead = 0 ORDER BY seq LIMIT ?",
+                    (url, self.batch_size)
+                ).fetchall()
+        return [(seq, op, entry_url, json.loads(args)) for seq, op, entry_url, args in rows]
+
+    def _delete(self, seqs):
+        if not seqs:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM journal WHERE seq = ?", [(seq,) for seq in seqs])
+            self._replayed += len(seqs)
+
+    def _bury(self, seq, error):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE journal SET dead = 1, attempts = attempts + 1, last_error = ? WHERE seq = ?",
+                (str(error)[:1000], seq)
+            )
+            self._dead += 1
+
+    def replay(self, url=None):
+        """
+        Apply journaled writes (all, or one URL's) to the database in append order.
+
+        Returns:
+            int: Entries applied
+
+        Raises:
+            One of transient_errors if the database is unavailable (entries stay queued)
+        """
+        total = 0
+        with self._replay_lock:
+            while True:
+                batch = self._read_batch(url)
+                if not batch:
+                    return total
+                try:
+                    self.apply_batch([(op, entry_url, args) for _, op, entry_url, args in batch])
+                    self._delete([seq for seq, _, _, _ in batch])
+                except self.transient_errors:
+                    self._failures += 1
+                    raise
+                except Exception:
+                    # Something in the batch is unappliable: isolate it entry by entry
+                    self._replay_each(batch)
+                total += len(batch)
+
+    def _replay_each(self, batch):
+        for seq, op, entry_url, args in batch:
+            try:
+                self.apply_batch([(op, entry_url, args)])
+            except self.transient_errors:
+                self._failures += 1
+                raise
+            except Exception as e:
+                logger.error(f"[JOURNAL] Parking unappliable {op} for {entry_url} (dead = 1): {e}")
+                self._bury(seq, e)
+                continue
+            self._delete([seq])
+
+    def _run(self):
+        delay = self.interval
+        while not self._stop.is_set():
+            self._wake.wait(delay)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                replayed = self.replay()
+            except self.transient_errors as e:
+                if self._outage_since is None:
+                    self._outage_since = time.time()
+                    logger.warning(f"[JOURNAL] Database unavailable, queueing status writes locally: {e}")
+                delay = min(max(delay * 2, 1.0), self.max_backoff)
+                continue
+            except Exception as e:
+                logger.error(f"[JOURNAL] Replay failed, will retry: {e}")
+                delay = min(max(delay * 2, 1.0), self.max_backoff)
+                continue
+            if self._outage_since is not None:
+                logger.info(
+                    f"[JOURNAL] Database back after {time.time() - self._outage_since:.0f}s, "
+                    f"replayed {replayed} queued writes"
+                )
+                self._outage_since = None
+            delay = self.interval
+
+    def pending(self):
+        """Number of entries not yet applied (dead entries excluded)."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM journal WHERE dead = 0").fetchone()[0]
+
+    def close(self):
+        """Stop the replayer and try a last replay; anything left is replayed on next start."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        try:
+            self.replay()
+        finally:
+            left = self.pending()
+            if left:
+                logger.warning(f"[JOURNAL] {left} status writes still queued in {self.path}")
+            with self._lock:
+                self._conn.close()
+
+    def stats(self):
+        """
+        Returns:
+            dict: {pending, dead, oldest_age_seconds, appended, replayed, failures, outage_seconds}
+        """
+        with self._lock:
+            pending, dead, oldest = self._conn.execute(
+                "SELECT COUNT(*) FILTER (WHERE dead = 0), COUNT(*) FILTER (WHERE dead = 1), "
+                "MIN(created_at) FILTER (WHERE dead = 0) FROM journal"
+            ).fetchone()
+            return {
+                'pending': pending,
+                'dead': dead,
+                'oldest_age_seconds': round(time.time() - oldest, 1) if oldest else None,
+                'appended': self._appended,
+                'replayed': self._replayed,
+                'failures': self._failures,
+                'outage_seconds': round(time.time() - self._outage_since, 1) if self._outage_since else None,
+            }
@@ -0,0 +1,212 @@
+"""
+Per-method database latency metrics.
+
+SupabaseManager.get_cursor() feeds a QueryMetrics when DB_METRICS is enabled: for
+every cursor it records the time spent getting a connection from the pool, inside
+execute() calls and in the commit, the rows touched, and whether the transaction
+was rolled back, all attributed to the public storage method that opened the cursor.
+Statements slower than DB_SLOW_QUERY_MS are logged.
+
+Usage:
+    db.query_metrics()              # {method: {calls, rows, rollbacks, slow, connect, execute, commit}}
+    db.metrics.top(5)               # methods with the most total time
+"""
+import sys
+import threading
+import time
+from core.logger import logger
+
+# Upper bounds (milliseconds) of the histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+PHASES = ('connect', 'execute', 'commit')
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (constant memory, no samples kept)."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        index = 0
+        while index < len(LATENCY_BUCKETS_MS) and ms > LATENCY_BUCKETS_MS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction):
+        """
+        Upper bound (ms) of the bucket holding the `fraction` quantile; the maximum
+        observed value for the open-ended bucket. None when empty.
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                if index < len(LATENCY_BUCKETS_MS):
+                    return min(LATENCY_BUCKETS_MS[index], self.max * 1000)
+                return self.max * 1000
+        return self.max * 1000
+
+    def to_dict(self):
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            'count': self.count,
+            'total_ms': round(self.total * 1000, 1),
+            'avg_ms': round(self.total * 1000 / self.count, 2) if self.count else None,
+            'p50_ms': None if p50 is None else round(p50, 2),
+            'p95_ms': None if p95 is None else round(p95, 2),
+            'max_ms': round(self.max * 1000, 1),
+            'buckets': dict(zip([*map(str, LATENCY_BUCKETS_MS), 'inf'], self.buckets)),
+        }
+
+
+class _MethodStats:
+    def __init__(self):
+        self.phases = {phase: LatencyHistogram() for phase in PHASES}
+        self.calls = 0
+        self.rows = 0
+        self.rollbacks = 0
+        self.slow = 0
+
+
+def caller_method(depth=1, max_frames=8):
+    """
+    Qualified name of the first public function up the stack, skipping private
+    helpers (_iter_keyset, _restore_archived, ...), get_cursor and contextlib frames.
+    """
+    frame = sys._getframe(depth + 1)
+    for _ in range(max_frames):
+        if frame is None:
+            break
+        code = frame.f_code
+        if not code.co_name.startswith('_') and code.co_name != 'get_cursor':
+            return getattr(code, 'co_qualname', code.co_name)
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryMetrics:
+    """Thread-safe registry of per-method latency histograms, row and rollback counters."""
+
+    def __init__(self, slow_query_ms=500):
+        """
+        Args:
+            slow_query_ms: Log statements slower than this (0 disables)
+        """
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._methods = {}
+        self._since = time.time()
+
+    def _stats(self, method):
+        stats = self._methods.get(method)
+        if stats is None:
+            stats = self._methods[method] = _MethodStats()
+        return stats
+
+    def start_call(self, method):
+        with self._lock:
+            self._stats(method).calls += 1
+
+    def observe(self, method, phase, seconds):
+        with self._lock:
+            self._stats(method).phases[phase].observe(seconds)
+
+    def add_rows(self, method, rows):
+        if rows and rows > 0:
+            with self._lock:
+                self._stats(method).rows += rows
+
+    def add_rollback(self, method):
+        with self._lock:
+            self._stats(method).rollbacks += 1
+
+    def observe_statement(self, method, seconds, query):
+        """Record one execute() and log it if slower than slow_query_ms."""
+        self.observe(method, 'execute', seconds)
+        if self.slow_query_ms and seconds * 1000 >= self.slow_query_ms:
+            with self._lock:
+                self._stats(method).slow += 1
+            if isinstance(query, bytes):
+                query = query.decode(errors='replace')
+            statement = " ".join(str(query).split())[:300]
+            logger.warning(f"[METRICS] Slow query in {method}: {seconds * 1000:.0f} ms: {statement}")
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: {method: {'calls', 'rows', 'rollbacks', 'slow', 'total_ms',
+                   'connect'|'execute'|'commit': LatencyHistogram.to_dict()}}
+        """
+        with self._lock:
+            result = {}
+            for method, stats in self._methods.items():
+                phases = {phase: histogram.to_dict() for phase, histogram in stats.phases.items()}
+                result[method] = {
+                    'calls': stats.calls,
+                    'rows': stats.rows,
+                    'rollbacks': stats.rollbacks,
+                    'slow': stats.slow,
+                    'total_ms': round(sum(phase['total_ms'] for phase in phases.values()), 1),
+                    **phases,
+                }
+            return result
+
+    def top(self, limit=10):
+        """
+        Returns:
+            list of tuple: (method, stats) with the most total time first
+        """
+        return sorted(self.snapshot().items(), key=lambda item: item[1]['total_ms'], reverse=True)[:limit]
+
+    def uptime(self):
+        """Seconds since the metrics were created or last reset."""
+        return time.time() - self._since
+
+    def reset(self):
+        with self._lock:
+            self._methods = {}
+            self._since = time.time()
+
+
+class TimedCursor:
+    """Cursor proxy timing execute()/executemany()/copy_expert() and counting rows."""
+
+    def __init__(self, cursor, metrics, method):
+        self._cursor = cursor
+        self._metrics = metrics
+        self._method = method
+
+    def _timed(self, call, query, *args, **kwargs):
+        started = time.monotonic()
+        try:
+            return call(query, *args, **kwargs)
+        finally:
+            self._metrics.observe_statement(self._method, time.monotonic() - started, query)
+            self._metrics.add_rows(self._method, self._cursor.rowcount)
+
+    def execute(self, query, params=None):
+        return self._timed(self._cursor.execute, query, params)
+
+    def executemany(self, query, params_seq):
+        return self._timed(self._cursor.executemany, query, params_seq)
+
+    def copy_expert(self, query, file, *args, **kwargs):
+        return self._timed(self._cursor.copy_expert, query, file, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
@@ -0,0 +1,138 @@
+"""
+Shared HTTP clients for scraping (harvesters and extractors).
+
+Every scraping request goes through one of two process-wide httpx clients built
+here from the same settings: get_client() (synchronous, used by the extractors)
+and the AsyncClient that PageFetcher creates once with create_async_client() on
+its event loop (the harvesters). httpx keeps a connection pool per host, so DNS,
+TCP and TLS setup is paid once per host and later requests reuse a warm
+keep-alive connection instead of opening a new one each time.
+
+Pools hold at most HTTP_POOL_MAX_CONNECTIONS connections, of which up to
+HTTP_POOL_KEEPALIVE stay open while idle, for HTTP_POOL_KEEPALIVE_EXPIRY seconds.
+Per-host concurrency is bounded by the callers (HARVEST_CONCURRENCY, MAX_WORKERS).
+
+pool_stats() counts, per host, the requests that reused a pooled connection (hits)
+and the ones that had to open a new connection (misses).
+"""
+import threading
+import httpx
+from config import HTTP_POOL_MAX_CONNECTIONS, HTTP_POOL_KEEPALIVE, HTTP_POOL_KEEPALIVE_EXPIRY, HTTP_TIMEOUT
+
+# httpcore trace event emitted when a request has to open a new connection
+NEW_CONNECTION_EVENT = "connection.connect_tcp.started"
+
+
+class PoolStats:
+    """Thread-safe per-host counters of pooled (hit) vs newly opened (miss) connections."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts = {}  # host -> [hits, misses]
+
+    def record(self, host, reused):
+        with self._lock:
+            counts = self._hosts.setdefault(host, [0, 0])
+            counts[0 if reused else 1] += 1
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: {requests, hits, misses, hit_rate, hosts: {host: {hits, misses}}}
+        """
+        with self._lock:
+            hosts = {host: {'hits': hits, 'misses': misses} for host, (hits, misses) in self._hosts.items()}
+        hits = sum(counts['hits'] for counts in hosts.values())
+        misses = sum(counts['misses'] for counts in hosts.values())
+        requests = hits + misses
+        return {
+            'requests': requests,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / requests, 3) if requests else 0.0,
+            'hosts': hosts,
+        }
+
+
+POOL_STATS = PoolStats()
+
+
+class _CountingTransport(httpx.HTTPTransport):
+    """HTTPTransport that records whether each request reused a pooled connection."""
+
+    def handle_request(self, request):
+        opened = []
+
+        def trace(event, info):
+            if event == NEW_CONNECTION_EVENT:
+                opened.append(event)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        try:
+            return super().handle_request(request)
+        finally:
+            POOL_STATS.record(request.url.host, reused=not opened)
+
+
+class _AsyncCountingTransport(httpx.AsyncHTTPTransport):
+    """AsyncHTTPTransport counterpart of _CountingTransport."""
+
+    async def handle_async_request(self, request):
+        opened = []
+
+        async def trace(event, info):
+            if event == NEW_CONNECTION_EVENT:
+                opened.append(event)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        try:
+            return await super().handle_async_request(request)
+        finally:
+            POOL_STATS.record(request.url.host, reused=not opened)
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=HTTP_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_POOL_KEEPALIVE,
+        keepalive_expiry=HTTP_POOL_KEEPALIVE_EXPIRY,
+    )
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide synchronous client (thread-safe; redirects followed)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(
+                transport=_CountingTransport(limits=_limits()),
+                follow_redirects=True,
+                timeout=HTTP_TIMEOUT,
+            )
+        return _client
+
+
+def create_async_client():
+    """
+    New AsyncClient with the shared settings. An async client is bound to the event
+    loop it is used on, so its owner (PageFetcher) creates it once on that loop.
+    """
+    return httpx.AsyncClient(
+        transport=_AsyncCountingTransport(limits=_limits()),
+        follow_redirects=True,
+        timeout=HTTP_TIMEOUT,
+    )
+
+
+def pool_stats():
+    """
+    Connection reuse across every shared client.
+
+    Returns:
+        dict: See PoolStats.snapshot()
+    """
+    return POOL_STATS.snapshot()
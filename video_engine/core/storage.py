@@ -0,0 +1,693 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from core.logger import logger
+
+
+class BaseStorage(ABC):
+    """
+    Abstract base class for video state storage backends.
+
+    Implementations:
+    - SupabaseManager (database_supabase.py): PostgreSQL, shared by every worker
+    - DatabaseManager (database.py): local SQLite file, single box, no network round trips
+
+    Use storage.get_storage() to pick one from DATABASE_URL.
+    """
+
+    # Placeholder for query parameters in this backend's SQL dialect
+    PARAM = '%s'
+
+    # Provider name -> column holding that provider's upload ID
+    PROVIDER_COLUMNS = {
+        'doodstream': 'doodstream_id',
+        'seekstreaming': 'seekstreaming_id',
+        'lulustream': 'lulustream_id',
+        'bunny': 'bunny_guid'
+    }
+
+    # Hosts that mirror the primary (SeekStreaming) upload
+    BACKUP_PROVIDERS = ('doodstream', 'lulustream')
+
+    # Statuses of a video that a worker currently owns (claimed or mid-pipeline)
+    IN_FLIGHT_STATUSES = ('CLAIMED', 'EXTRACTING', 'DOWNLOADING', 'UPLOADING')
+
+    # Videos live on SeekStreaming but missing at least one backup host
+    MISSING_BACKUP_FILTER = (
+        "(seekstreaming_id IS NOT NULL OR status = 'COMPLETED') "
+        "AND (doodstream_id IS NULL OR lulustream_id IS NULL)"
+    )
+
+    # Completed videos whose metadata was never pushed to the providers
+    UNSYNCED_METADATA_FILTER = "status = 'COMPLETED' AND (metadata_synced IS NULL OR metadata_synced = FALSE)"
+
+    # Columns of a job record (get_all_upload_ids, and claim_jobs/iter_missing_backup_videos
+    # with with_records=True); see core.jobs.CachedJob
+    JOB_COLUMNS = (
+        'status', 'upload_provider', 'upload_id',
+        'doodstream_id', 'seekstreaming_id', 'lulustream_id', 'bunny_guid'
+    )
+
+    # Pipeline stage -> statuses a video may enter it from (start_stage). Mirrored by
+    # the start_stage() SQL function of migrations.py (version 13).
+    STAGE_TRANSITIONS = {
+        'EXTRACTING': ('PENDING', 'FAILED', 'CLAIMED', 'EXTRACTING', 'COMPLETED'),
+        'DOWNLOADING': ('EXTRACTING', 'DOWNLOADING'),
+        'UPLOADING': ('DOWNLOADING', 'UPLOADING'),
+    }
+
+    # Pipeline stage -> further statuses it may be entered from once the primary
+    # (SeekStreaming) upload exists: a failed backup upload leaves the video COMPLETED
+    # and the next backup host is still tried. Mirrored by migration 15.
+    PRIMARY_STAGE_TRANSITIONS = {
+        'UPLOADING': ('COMPLETED',),
+    }
+
+    # Columns start_stage() sets together with the stage
+    STAGE_COLUMNS = ('upload_provider', 'local_filename', 'title', 'description', 'unique_id')
+
+    # Grouping keys accepted by get_stage_percentiles ('stage' is always included)
+    ATTEMPT_GROUP_KEYS = ('stage', 'provider', 'domain', 'extractor', 'kind')
+
+    # Whitelist of valid column names to prevent SQL injection in dynamic queries
+    ALLOWED_UPDATE_COLUMNS = {
+        'bunny_guid', 'upload_provider', 'upload_id',
+        'local_filename', 'error_message',
+        'doodstream_id', 'seekstreaming_id', 'lulustream_id',
+        'title', 'description', 'unique_id', 'metadata_synced'
+    }
+
+    def _provider_column(self, provider):
+        """Column holding `provider`'s upload ID (raises ValueError for unknown providers)."""
+        prov_col = self.PROVIDER_COLUMNS.get(provider.strip().lower())
+        if not prov_col:
+            raise ValueError(f"Unknown upload provider: {provider}")
+        return prov_col
+
+    def _job_record(self, row):
+        """Job record dict from a (original_url, *JOB_COLUMNS) row."""
+        return {'original_url': row[0], **dict(zip(self.JOB_COLUMNS, row[1:]))}
+
+    def _stage_fields(self, stage, fields):
+        """Validate a start_stage() call: the stage must be known, unknown columns are dropped."""
+        if stage not in self.STAGE_TRANSITIONS:
+            raise ValueError(f"Unknown pipeline stage: {stage}")
+        valid = {}
+        for key, value in fields.items():
+            if key not in self.STAGE_COLUMNS:
+                logger.warning(f"[STORAGE] Ignoring column not set by start_stage: {key}")
+                continue
+            valid[key] = value
+        return valid
+
+    def _stage_allowed(self, stage, record):
+        """Whether a video with job record `record` may enter `stage` (STAGE_TRANSITIONS)."""
+        status = record['status'] or 'PENDING'
+        if status in self.STAGE_TRANSITIONS[stage]:
+            return True
+        return bool(record['seekstreaming_id']) and status in self.PRIMARY_STAGE_TRANSITIONS.get(stage, ())
+
+    def _attempt_group_keys(self, group_by):
+        """Validated grouping keys for get_stage_percentiles, 'stage' first."""
+        unknown = set(group_by) - set(self.ATTEMPT_GROUP_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown attempt grouping key(s): {', '.join(sorted(unknown))}")
+        return ('stage',) + tuple(key for key in dict.fromkeys(group_by) if key != 'stage')
+
+    def _pending_filter(self, current_provider=None):
+        """
+        WHERE clause (and params) selecting videos still waiting for an upload.
+
+        Args:
+            current_provider (str, optional): The currently selected upload provider.
+
+        Returns:
+            tuple: (sql_fragment, params)
+        """
+        if current_provider:
+            provider = current_provider.strip().lower()
+            prov_col = self.PROVIDER_COLUMNS.get(provider)
+            if prov_col:
+                return f"status IN ('PENDING', 'FAILED') AND {prov_col} IS NULL", ()
+            return (
+                f"status IN ('PENDING', 'FAILED') AND (upload_provider IS NULL OR upload_provider != {self.PARAM})",
+                (provider,)
+            )
+        return "status IN ('PENDING', 'FAILED') AND seekstreaming_id IS NULL", ()
+
+    # ------------------------------------------------------------------
+    # Schema
+    # ------------------------------------------------------------------
+
+    @abstractmethod
+    def migrate(self):
+        """
+        Apply pending schema migrations.
+
+        Returns:
+            list: Versions applied by this call (empty if already up to date)
+        """
+        pass
+
+    @abstractmethod
+    def get_schema_version(self):
+        """
+        Returns:
+            int: Highest applied migration version
+        """
+        pass
+
+    def close(self):
+        """Release connections and flush anything buffered."""
+        pass
+
+    def flush_writes(self, url=None):
+        """Flush buffered status updates (all, or one URL). No-op for unbuffered backends."""
+        pass
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group several writes into one commit where the backend supports it.
+        The default runs each write on its own (still correct, just not batched).
+        """
+        yield
+
+    def pool_stats(self):
+        """Connection pool statistics, or None if the backend has no pool."""
+        return None
+
+    def write_behind_stats(self):
+        """Write-behind buffer statistics, or None when write-behind is unavailable/disabled."""
+        return None
+
+    def journal_stats(self):
+        """Status journal statistics, or None when writes are not journaled."""
+        return None
+
+    def query_metrics(self):
+        """Per-method latency metrics (see core.metrics), or None when not collected."""
+        return None
+
+    # ------------------------------------------------------------------
+    # Seeding
+    # ------------------------------------------------------------------
+
+    @abstractmethod
+    def seed_new_links(self, links, status='PENDING'):
+        """
+        Insert URLs, skipping ones already stored, and report exactly which were new.
+
+        Args:
+            links: Iterable of URLs to insert
+            status: Initial status (default: PENDING)
+
+        Returns:
+            list: URLs that were actually inserted, in discovery order
+        """
+        pass
+
+    @abstractmethod
+    def insert_video(self, url, status='PENDING'):
+        """
+        Insert a single video record.
+
+        Returns:
+            bool: True if inserted, False if duplicate
+        """
+        pass
+
+    def bulk_seed_links(self, links, status='PENDING'):
+        """
+        Bulk insert URLs with automatic deduplication.
+
+        Args:
+            links: List or set of URLs to insert
+            status: Initial status (default: PENDING)
+
+        Returns:
+            int: Number of NEW URLs inserted (duplicates are ignored, errors count as 0)
+        """
+        if not links:
+            logger.warning("bulk_seed_links called with empty list")
+            return 0
+
+        try:
+            return len(self.seed_new_links(links, status))
+        except Exception as e:
+            logger.error(f"[STORAGE] Error in bulk_seed_links: {e}")
+            return 0
+
+    def insert_videos_batch(self, links, status='PENDING'):
+        """
+        Alias for bulk_seed_links to maintain compatibility with Harvester.
+        """
+        return self.bulk_seed_links(links, status)
+
+    @abstractmethod
+    def get_harvest_mark(self, site):
+        """
+        Discovery progress of one listing (see harvester.LinkHarvester).
+
+        Returns:
+            dict or None: {high_water_page, reached_end, updated_at}; None if never crawled
+        """
+        pass
+
+    @abstractmethod
+    def save_harvest_mark(self, site, high_water_page, reached_end=False):
+        """
+        Record discovery progress of one listing. The page only moves forward and
+        reached_end stays set once a crawl has hit the end of the listing.
+        """
+        pass
+
+    # ------------------------------------------------------------------
+    # Per-video state
+    # ------------------------------------------------------------------
+
+    @abstractmethod
+    def get_known_urls(self, urls):
+        """
+        Batch lookup: which of `urls` are already stored (live, archived or dead-lettered).
+
+        Returns:
+            set: The stored URLs among `urls`
+        """
+        pass
+
+    @abstractmethod
+    def get_video_status(self, url):
+        """
+        Returns:
+            str: Status or None if not found
+        """
+        pass
+
+    @abstractmethod
+    def get_video_details(self, url):
+        """
+        Returns:
+            tuple: (status, upload_provider) or None if not found
+        """
+        pass
+
+    @abstractmethod
+    def get_all_upload_ids(self, url):
+        """
+        Returns:
+            dict: {status, upload_provider, upload_id, doodstream_id, seekstreaming_id, lulustream_id, bunny_guid} or None if not found
+        """
+        pass
+
+    @abstractmethod
+    def update_status(self, url, status, **kwargs):
+        """
+        Set the status of a video, plus any whitelisted columns (ALLOWED_UPDATE_COLUMNS).
+
+        Example:
+            db.update_status(url, 'COMPLETED', bunny_guid='xxx', local_filename='yyy')
+        """
+        pass
+
+    @abstractmethod
+    def start_stage(self, url, stage, **fields):
+        """
+        Move a video into a pipeline stage (STAGE_TRANSITIONS, PRIMARY_STAGE_TRANSITIONS),
+        inserting it first if it is not stored yet, and set any STAGE_COLUMNS passed.
+        Check and write are atomic.
+
+        Example:
+            record = db.start_stage(url, 'UPLOADING', local_filename='x.mp4', upload_provider='doodstream')
+
+        Returns:
+            dict: The updated job record (JOB_COLUMNS), or None if the write was deferred
+                  (write-behind buffer or journal)
+
+        Raises:
+            InvalidTransitionError: The current status does not allow `stage`, or the
+                                    video is dead-lettered
+        """
+        pass
+
+    @abstractmethod
+    def save_successful_upload(self, url, title, seek_id, dood_id, lulu_id):
+        """
+        Upsert a COMPLETED video with all provider IDs and real title in one row.
+
+        Raises:
+            InvalidTransitionError: `seek_id` is empty (COMPLETED means live on the primary host)
+        """
+        pass
+
+    @abstractmethod
+    def log_error(self, url, error_msg, provider=None):
+        """
+        Mark video as FAILED (COMPLETED if SeekStreaming already has it) with error details.
+        The error is fingerprinted into its class (core.fingerprint); a FAILED video whose
+        class is permanent, or that failed DEAD_LETTER_AFTER_FAILURES times, is dead-lettered.
+        """
+        pass
+
+    @abstractmethod
+    def record_upload(self, url, provider, remote_id, size=None, status=None):
+        """
+        Save one provider's upload of a video.
+
+        Args:
+            url: Video page URL
+            provider: Provider name (see get_upload_providers())
+            remote_id: The provider's file ID
+            size: Uploaded bytes, if known
+            status: New video status (None keeps the current one)
+
+        Returns:
+            bool: True if the video exists
+
+        Raises:
+            InvalidTransitionError: `status` is COMPLETED but the video has no primary upload
+        """
+        pass
+
+    @abstractmethod
+    def clear_provider_upload(self, url, provider):
+        """
+        Forget a video's upload on one provider and queue it again (status PENDING).
+
+        Returns:
+            bool: True if the video existed
+        """
+        pass
+
+    def clear_provider_uploads(self, urls, provider, batch_size=1000, on_progress=None):
+        """
+        Set-based clear_provider_upload() for many videos: one short transaction per
+        `batch_size` URLs, so bulk resets never hold locks a worker is waiting on for long.
+
+        Args:
+            urls: Page URLs of the videos to reset
+            provider: Provider whose upload is forgotten
+            batch_size: URLs per transaction
+            on_progress: Optional callback(done, total) after each batch
+
+        Returns:
+            int: Number of videos reset
+        """
+        urls = list(dict.fromkeys(urls))
+        reset = 0
+        for start in range(0, len(urls), batch_size):
+            batch = urls[start:start + batch_size]
+            reset += sum(1 for url in batch if self.clear_provider_upload(url, provider))
+            if on_progress:
+                on_progress(start + len(batch), len(urls))
+        return reset
+
+    # ------------------------------------------------------------------
+    # Job queue
+    # ------------------------------------------------------------------
+
+    @abstractmethod
+    def claim_jobs(self, worker_id, limit=1, lease_seconds=900, current_provider=None, with_records=False):
+        """
+        Atomically lease up to `limit` pending videos to one worker (status CLAIMED).
+
+        Returns:
+            list: Claimed URLs, oldest first (job record dicts with original_url
+                  and JOB_COLUMNS if with_records)
+        """
+        pass
+
+    @abstractmethod
+    def renew_leases(self, worker_id, lease_seconds=900):
+        """
+        Returns:
+            int: Number of leases renewed
+        """
+        pass
+
+    @abstractmethod
+    def release_jobs(self, worker_id, urls):
+        """
+        Hand back claimed videos that were never started.
+
+        Returns:
+            int: Number of videos returned to PENDING
+        """
+        pass
+
+    @abstractmethod
+    def reclaim_expired_leases(self):
+        """
+        Returns:
+            int: Number of in-flight videos with an expired lease returned to the queue
+        """
+        pass
+
+    @abstractmethod
+    def reset_stale_statuses(self):
+        """
+        Reset in-flight videos not covered by a live lease (crash recovery on startup).
+
+        Returns:
+            int: Number of videos reset
+        """
+        pass
+
+    # ------------------------------------------------------------------
+    # Backlogs
+    # ------------------------------------------------------------------
+
+    @abstractmethod
+    def iter_pending_videos(self, current_provider=None, page_size=500):
+        """
+        Stream URLs still waiting for an upload, oldest first, page by page.
+
+        Yields:
+            str: URL to process
+        """
+        pass
+
+    @abstractmethod
+    def iter_missing_backup_videos(self, page_size=500, with_records=False):
+        """
+        Stream URLs live on SeekStreaming but missing a DoodStream or LuluStream copy.
+
+        Yields:
+            str: URL to process for backup uploads (job record dict if with_records)
+        """
+        pass
+
+    @abstractmethod
+    def iter_unsynced_metadata_videos(self, page_size=500):
+        """
+        Stream COMPLETED videos whose metadata has not been synced to the providers.
+
+        Yields:
+            tuple: (url, unique_id, title, description, seekstreaming_id, doodstream_id, lulustream_id)
+        """
+        pass
+
+    @abstractmethod
+    def iter_provider_uploads(self, provider, page_size=500):
+        """
+        Stream every video uploaded to one provider.
+
+        Yields:
+            tuple: (url, remote_id)
+        """
+        pass
+
+    @abstractmethod
+    def iter_missing_provider_uploads(self, provider, page_size=500):
+        """
+        Stream videos live on the primary host that have no upload on a backup provider.
+
+        Yields:
+            str: URL to upload to `provider`
+        """
+        pass
+
+    def get_upload_providers(self):
+        """
+        Upload hosts known to this storage: PROVIDER_COLUMNS, unless the backend keeps a
+        provider registry (SupabaseManager.add_upload_provider).
+
+        Returns:
+            list of dict: {'name': str, 'is_backup': bool}
+        """
+        return [{'name': name, 'is_backup': name in self.BACKUP_PROVIDERS} for name in self.PROVIDER_COLUMNS]
+
+    def get_pending_videos(self, current_provider=None):
+        """
+        Returns:
+            list: URLs where the active provider's upload is missing, oldest first
+        """
+        return list(self.iter_pending_videos(current_provider))
+
+    def get_missing_backup_videos(self):
+        """
+        Returns:
+            list: URLs to process for backup uploads
+        """
+        return list(self.iter_missing_backup_videos())
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    @abstractmethod
+    def clean_failed_videos(self, batch_size=1000, on_progress=None):
+        """
+        Move FAILED videos that retrying will not fix (permanent error class, or
+        DEAD_LETTER_AFTER_FAILURES failures) to dead_letters; seeding skips those URLs.
+        Works in transactions of at most `batch_size` rows, calling
+        on_progress(done, None) after each one.
+
+        Returns:
+            int: Number of videos dead-lettered
+        """
+        pass
+
+    @abstractmethod
+    def get_error_classes(self, limit=20):
+        """
+        Most frequent error classes (see core.fingerprint).
+
+        Returns:
+            list of dict: {id, template, permanent, occurrences, dead_letters, last_seen}
+        """
+        pass
+
+    @abstractmethod
+    def release_dead_letters(self, error_class_id=None, mark_transient=False):
+        """
+        Forget dead-lettered URLs (all, or one error class) so discovery can queue them again.
+
+        Returns:
+            int: Number of URLs released
+        """
+        pass
+
+    @abstractmethod
+    def reset_seekstreaming_missing_metadata(self, batch_size=1000, on_progress=None):
+        """
+        Re-queue SeekStreaming uploads that have no title, in transactions of at most
+        `batch_size` rows (on_progress(done, None) after each one).
+
+        Returns:
+            int: Number of videos reset
+        """
+        pass
+
+    @abstractmethod
+    def promote_seekstreaming_completed(self):
+        """
+        Mark every video with a SeekStreaming upload as COMPLETED.
+
+        Returns:
+            int: Number of videos updated
+        """
+        pass
+
+    def archive_completed(self, older_than_days, batch_size=5000):
+        """
+        Move finished videos out of the live table, in batches (reads keep seeing them).
+        Backends without an archive keep every row in place.
+
+        Returns:
+            int: Number of videos archived
+        """
+        return 0
+
+    # ------------------------------------------------------------------
+    # Attempt history
+    # ------------------------------------------------------------------
+
+    @abstractmethod
+    def record_attempt(self, attempt):
+        """
+        Store one processing attempt with its stage timings.
+
+        Args:
+            attempt: dict from core.attempts.AttemptRecorder.to_record()
+        """
+        pass
+
+    @abstractmethod
+    def get_stage_percentiles(self, group_by=('stage', 'provider'), since_hours=24):
+        """
+        Wall-time percentiles of pipeline stages over recent attempts.
+
+        Args:
+            group_by: Keys from ATTEMPT_GROUP_KEYS ('stage' is always included)
+            since_hours: Only attempts started in this window (None = all history)
+
+        Returns:
+            list of dict: One per group: the group keys plus count, failures,
+                          p50 and p95 (seconds) and bytes (total)
+        """
+        pass
+
+    # ------------------------------------------------------------------
+    # Dashboard
+    # ------------------------------------------------------------------
+
+    @abstractmethod
+    def get_counters(self):
+        """
+        Returns:
+            dict: {'total': int, 'status': {status: count}, 'provider': {provider: count}},
+                  plus 'uploaded'/'missing' {provider: count} where video_uploads exists
+        """
+        pass
+
+    @abstractmethod
+    def get_stats(self, provider=None):
+        """
+        Status distribution, tailored to one provider if given.
+
+        Returns:
+            dict: Status counts (e.g., {'PENDING': 45, 'COMPLETED': 12})
+        """
+        pass
+
+    @abstractmethod
+    def get_recent_videos(self, limit=20):
+        """
+        Returns:
+            list of dict: Most recently completed videos (Title, URL, IDs, Completed At)
+        """
+        pass
+
+    def get_provider_stats(self):
+        """
+        Returns:
+            dict: Provider counts (e.g., {'doodstream': 25, 'lulustream': 10})
+        """
+        counts = self.get_counters()['provider']
+        return {name: counts.get(name, 0) for name in ('doodstream', 'seekstreaming', 'lulustream')}
+
+    def get_total_count(self):
+        """Get total number of videos in storage."""
+        return self.get_counters()['total']
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+
+    @abstractmethod
+    def export_videos_csv(self, out, columns, since=None, lag_seconds=60):
+        """
+        Stream every video (live and archived) changed after `since` into the binary
+        file `out` as CSV with a header row, oldest change first. NULL is written as
+        an unquoted \\N. A row's change time is COALESCE(updated_at, created_at); rows
+        changed in the last `lag_seconds` are left for the next export, so writes
+        still committing are not skipped.
+
+        Args:
+            columns: Column names to export ('archived' is the videos_all flag)
+            since: Watermark returned by the previous export (None = everything)
+
+        Returns:
+            str: Change time exported up to, the next call's `since`
+        """
+        pass
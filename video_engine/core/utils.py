@@ -4,6 +4,7 @@ import random
 import shutil
 import subprocess
 import json
+from concurrent.futures import wait, FIRST_COMPLETED
 from core.logger import logger
 
 
@@ -39,6 +40,36 @@ def cleanup_file(filepath):
             logger.warning(f"Failed to delete {filepath}: {e}")
 
 
+def submit_bounded(executor, fn, items, max_pending):
+    """
+    Submit fn(item) for every item while keeping at most `max_pending` jobs queued.
+    A lazy iterable (e.g. a database stream) is consumed only as fast as workers free up,
+    and breaking out of the loop stops further submissions.
+    
+    Yields:
+        tuple: (item, future) for each finished job, in completion order
+    """
+    items = iter(items)
+    pending = {}
+    exhausted = False
+    
+    while True:
+        while not exhausted and len(pending) < max_pending:
+            try:
+                item = next(items)
+            except StopIteration:
+                exhausted = True
+                break
+            pending[executor.submit(fn, item)] = item
+        
+        if not pending:
+            return
+        
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future
+
+
 def get_video_duration(filepath):
     """
     Get video duration in seconds using ffprobe.
@@ -1,265 +1,851 @@
+import csv
+import io
+import json
 import sqlite3
 import threading
-from datetime import datetime
-from config import DB_PATH
+import time
+import uuid
+from contextlib import contextmanager
+from config import DB_PATH, DEAD_LETTER_AFTER_FAILURES
+from migrations import CHANGED_AT_SQL
+from core.attempts import percentile
+from core.exceptions import InvalidTransitionError
+from core.fingerprint import error_fingerprint, is_permanent_error, short_error
+from core.logger import logger
+from core.storage import BaseStorage
 
 
-class DatabaseManager:
-    """Thread-safe SQLite database manager with zombie thread recovery."""
-    
-    def __init__(self, db_path=None):
-        self.db_path = db_path or DB_PATH
-        self.lock = threading.Lock()
-        self._init_db()
-    
-    def _init_db(self):
-        """Initialize database schema with WAL mode for better concurrency."""
-        with self.lock:
-            conn = sqlite3.connect(self.db_path, timeout=60.0, isolation_level='DEFERRED')
-            conn.execute('PRAGMA busy_timeout = 60000')  # 60 second busy timeout
-            # Enable WAL mode for better concurrent access
-            conn.execute('PRAGMA journal_mode=WAL')
-            conn.execute('''
+def _add_missing_columns(conn):
+    """Bring a pre-storage-interface SQLite file up to the shared videos schema."""
+    existing = {info[1] for info in conn.execute("PRAGMA table_info(videos)")}
+    for column, decl in DatabaseManager.COLUMNS:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE videos ADD COLUMN {column} {decl}")
+
+
+class DatabaseManager(BaseStorage):
+    """
+    Thread-safe SQLite database manager with zombie thread recovery.
+
+    Same interface and schema as SupabaseManager, for single-box deployments and
+    for benchmarking the pipeline without network round trips.
+    """
+
+    PARAM = '?'
+
+    # Columns added after the original SQLite schema (name, declaration)
+    COLUMNS = [
+        ('upload_provider', 'TEXT'),
+        ('upload_id', 'TEXT'),
+        ('doodstream_id', 'TEXT'),
+        ('seekstreaming_id', 'TEXT'),
+        ('lulustream_id', 'TEXT'),
+        ('title', 'TEXT'),
+        ('description', 'TEXT'),
+        ('unique_id', 'TEXT'),
+        ('metadata_synced', 'BOOLEAN DEFAULT FALSE'),
+        ('worker_id', 'TEXT'),
+        ('lease_expires_at', 'TIMESTAMP'),
+        ('error_class_id', 'INTEGER'),
+        ('failure_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ]
+
+    # Run-once schema steps, tracked in PRAGMA user_version (see migrations.py for PostgreSQL).
+    # A step is either SQL or a callable taking the connection.
+    MIGRATIONS = [
+        (1, "create_videos_table", [
+            '''
                 CREATE TABLE IF NOT EXISTS videos (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     original_url TEXT UNIQUE,
                     status TEXT DEFAULT 'PENDING',
                     bunny_guid TEXT,
-                    upload_provider TEXT,
-                    upload_id TEXT,
                     local_filename TEXT,
                     error_message TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    updated_at DATETIME
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP
                 )
-            ''')
-            
-            # Migration check for existing SQLite database
-            cursor = conn.cursor()
-            cursor.execute("PRAGMA table_info(videos)")
-            columns = [info[1] for info in cursor.fetchall()]
-            if 'upload_provider' not in columns:
-                conn.execute("ALTER TABLE videos ADD COLUMN upload_provider TEXT")
-            if 'upload_id' not in columns:
-                conn.execute("ALTER TABLE videos ADD COLUMN upload_id TEXT")
-                
-            # Migrate any old streamwish entries to seekstreaming
-            conn.execute("UPDATE videos SET upload_provider = 'seekstreaming' WHERE upload_provider = 'streamwish'")
-                 
-            conn.commit()
-            conn.close()
-    
-    def reset_stale_statuses(self):
+            ''',
+            _add_missing_columns,
+            "UPDATE videos SET upload_provider = 'seekstreaming' WHERE upload_provider = 'streamwish'",
+            "UPDATE videos SET doodstream_id = upload_id WHERE upload_provider = 'doodstream' AND doodstream_id IS NULL AND upload_id IS NOT NULL",
+            "UPDATE videos SET seekstreaming_id = upload_id WHERE upload_provider = 'seekstreaming' AND seekstreaming_id IS NULL AND upload_id IS NOT NULL",
+            "UPDATE videos SET lulustream_id = upload_id WHERE upload_provider = 'lulustream' AND lulustream_id IS NULL AND upload_id IS NOT NULL",
+            "UPDATE videos SET bunny_guid = upload_id WHERE upload_provider = 'bunny' AND bunny_guid IS NULL AND upload_id IS NOT NULL",
+            "UPDATE videos SET status = 'COMPLETED' WHERE seekstreaming_id IS NOT NULL AND status != 'COMPLETED'",
+            "CREATE INDEX IF NOT EXISTS idx_status ON videos(status)",
+            "CREATE INDEX IF NOT EXISTS idx_created_at ON videos(created_at, id)",
+            "CREATE INDEX IF NOT EXISTS idx_videos_in_flight ON videos(worker_id, lease_expires_at) "
+            "WHERE status IN ('CLAIMED', 'EXTRACTING', 'DOWNLOADING', 'UPLOADING')",
+            "CREATE INDEX IF NOT EXISTS idx_videos_recent_completed ON videos(updated_at) WHERE status = 'COMPLETED'",
+        ]),
+        # Without ANALYZE stats SQLite prefers idx_status for the queue and sorts every
+        # pending row on each claim; partial indexes in (created_at, id) order avoid that.
+        (2, "queue_indexes", [
+            "DROP INDEX IF EXISTS idx_status",
+            "CREATE INDEX IF NOT EXISTS idx_videos_queue ON videos(created_at, id) "
+            "WHERE status IN ('PENDING', 'FAILED')",
+            "CREATE INDEX IF NOT EXISTS idx_videos_missing_backup ON videos(created_at, id) "
+            f"WHERE {BaseStorage.MISSING_BACKUP_FILTER}",
+            "CREATE INDEX IF NOT EXISTS idx_videos_unsynced_metadata ON videos(created_at, id) "
+            f"WHERE {BaseStorage.UNSYNCED_METADATA_FILTER}",
+        ]),
+        # Processing attempt history; stages is a JSON array (see migrations.py, version 8)
+        (3, "video_attempts", [
+            '''
+                CREATE TABLE IF NOT EXISTS video_attempts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    video_url TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    worker_id TEXT,
+                    domain TEXT,
+                    extractor TEXT,
+                    outcome TEXT,
+                    error_message TEXT,
+                    started_at TIMESTAMP NOT NULL,
+                    finished_at TIMESTAMP,
+                    duration_seconds REAL,
+                    bytes_downloaded INTEGER,
+                    bytes_uploaded INTEGER,
+                    stages TEXT NOT NULL DEFAULT '[]'
+                )
+            ''',
+            "CREATE INDEX IF NOT EXISTS idx_video_attempts_started ON video_attempts(started_at)",
+            "CREATE INDEX IF NOT EXISTS idx_video_attempts_url ON video_attempts(video_url)",
+        ]),
+        # Error classes and dead letters (see migrations.py, version 11)
+        (4, "dead_letters", [
+            '''
+                CREATE TABLE IF NOT EXISTS error_classes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    fingerprint TEXT NOT NULL UNIQUE,
+                    template TEXT NOT NULL,
+                    permanent BOOLEAN NOT NULL DEFAULT FALSE,
+                    occurrences INTEGER NOT NULL DEFAULT 0,
+                    first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''',
+            _add_missing_columns,
+            '''
+                CREATE TABLE IF NOT EXISTS dead_letters (
+                    original_url TEXT PRIMARY KEY,
+                    error_class_id INTEGER REFERENCES error_classes(id),
+                    failures INTEGER NOT NULL DEFAULT 1,
+                    dead_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''',
+            "CREATE INDEX IF NOT EXISTS idx_dead_letters_class ON dead_letters(error_class_id)",
+        ]),
+        # Snapshot export watermark (see migrations.py, version 12)
+        (5, "snapshot_changed_at", [
+            f"CREATE INDEX IF NOT EXISTS idx_videos_changed_at ON videos({CHANGED_AT_SQL})",
+        ]),
+        # Per-site discovery progress (see migrations.py, version 14)
+        (6, "harvest_marks", [
+            '''
+                CREATE TABLE IF NOT EXISTS harvest_marks (
+                    site TEXT PRIMARY KEY,
+                    high_water_page INTEGER NOT NULL DEFAULT 0,
+                    reached_end BOOLEAN NOT NULL DEFAULT FALSE,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''',
+        ]),
+    ]
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or DB_PATH
+        # One persistent connection per thread. Under WAL readers never block the
+        # writer (or each other), so SELECTs take no lock at all; writers are
+        # serialised in-process so threads queue here instead of spinning on SQLITE_BUSY.
+        self._local = threading.local()
+        self._connections = {}  # thread -> connection, for close() and dead-thread cleanup
+        self._registry_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self.migrate()
+
+    def _conn(self):
+        """This thread's connection (opened on first use)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None: no implicit transactions, we issue BEGIN ourselves
+            conn = sqlite3.connect(self.db_path, timeout=60.0, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA busy_timeout = 60000')  # 60 second busy timeout
+            # Enable WAL mode for better concurrent access
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')  # Durable at checkpoints; safe with WAL
+            self._local.conn = conn
+            self._local.depth = 0
+            with self._registry_lock:
+                for thread in [t for t in self._connections if not t.is_alive()]:
+                    self._connections.pop(thread).close()
+                self._connections[threading.current_thread()] = conn
+        return conn
+
+    @contextmanager
+    def _read(self):
+        """Connection for SELECTs: no lock, each statement sees a consistent WAL snapshot."""
+        yield self._conn()
+
+    @contextmanager
+    def transaction(self):
         """
-        Reset zombie threads from previous crashes.
-        DOWNLOADING/UPLOADING -> PENDING
+        Group several writes into one commit (BEGIN IMMEDIATE ... COMMIT).
+
+        Every write method runs inside one; nested calls on the same thread join the
+        outer transaction, so e.g. a burst of update_status() calls costs one fsync:
+
+            with db.transaction():
+                for url in urls:
+                    db.update_status(url, 'PENDING')
+
+        Rolled back as a whole if the block raises.
         """
-        with self.lock:
-            conn = sqlite3.connect(self.db_path, timeout=60.0, isolation_level='DEFERRED')
-            conn.execute('PRAGMA busy_timeout = 60000')  # 60 second busy timeout
-            cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE videos 
-                SET status = 'PENDING', updated_at = ? 
-                WHERE status IN ('DOWNLOADING', 'UPLOADING', 'EXTRACTING')
-            """, (datetime.now(),))
-            affected = cursor.rowcount
-            conn.commit()
-            conn.close()
-            return affected
-    
-    def get_pending_urls(self, current_provider=None):
-        """Returns all PENDING or FAILED URLs, or COMPLETED URLs with a different upload provider for crash recovery."""
-        with self.lock:
-            conn = sqlite3.connect(self.db_path, timeout=60.0, isolation_level='DEFERRED')
-            conn.execute('PRAGMA busy_timeout = 60000')  # 60 second busy timeout
-            cursor = conn.cursor()
-            if current_provider:
-                cursor.execute("""
-                    SELECT original_url 
-                    FROM videos 
-                    WHERE status IN ('PENDING', 'FAILED')
-                       OR (status = 'COMPLETED' AND (upload_provider IS NULL OR upload_provider != ?))
-                    ORDER BY created_at ASC
-                """, (current_provider,))
+        conn = self._conn()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        with self._write_lock:
+            conn.execute('BEGIN IMMEDIATE')
+            self._local.depth = 1
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
             else:
-                cursor.execute("""
-                    SELECT original_url 
-                    FROM videos 
-                    WHERE status IN ('PENDING', 'FAILED')
-                    ORDER BY created_at ASC
-                """)
-            urls = [row[0] for row in cursor.fetchall()]
-            conn.close()
-            return urls
-    
-    def get_video_status(self, url):
-        """Check status of a video by URL."""
-        with self.lock:
-            conn = sqlite3.connect(self.db_path, timeout=60.0, isolation_level='DEFERRED')
-            conn.execute('PRAGMA busy_timeout = 60000')  # 60 second busy timeout
-            cursor = conn.cursor()
-            cursor.execute("SELECT status FROM videos WHERE original_url = ?", (url,))
-            result = cursor.fetchone()
-            conn.close()
-            return result[0] if result else None
+                conn.commit()
+            finally:
+                self._local.depth = 0
+
+    _write = transaction
+
+    def close(self):
+        """Close every thread's connection (they are reopened on next use)."""
+        with self._registry_lock:
+            connections, self._connections = self._connections, {}
+        for conn in connections.values():
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+    def migrate(self):
+        """
+        Apply pending schema migrations (tracked in PRAGMA user_version).
+
+        Returns:
+            list: Versions applied by this call (empty if already up to date)
+        """
+        applied = []
+        with self._write() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for number, name, steps in self.MIGRATIONS:
+                if number <= version:
+                    continue
+                logger.info(f"[SQLITE] Applying migration {number:03d}_{name}...")
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(f"PRAGMA user_version = {int(number)}")
+                applied.append(number)
+        return applied
+
+    def get_schema_version(self):
+        """Highest applied migration version."""
+        with self._read() as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def seed_new_links(self, links, status='PENDING'):
+        """
+        Insert URLs, skipping ones already stored or dead-lettered, and report exactly which were new.
+
+        Returns:
+            list: URLs that were actually inserted, in discovery order
+        """
+        links_list = list(dict.fromkeys(links))  # Deduplicate in Python first, keep order
+        if not links_list:
+            return []
+
+        new_urls = []
+        with self._write() as conn:
+            for url in links_list:
+                cursor = conn.execute("""
+                    INSERT OR IGNORE INTO videos (original_url, status, unique_id, created_at)
+                    SELECT ?, ?, ?, CURRENT_TIMESTAMP
+                    WHERE NOT EXISTS (SELECT 1 FROM dead_letters WHERE original_url = ?)
+                """, (url, status, uuid.uuid4().hex, url))
+                if cursor.rowcount == 1:
+                    new_urls.append(url)
+
+        logger.info(f"[SQLITE] Successfully added {len(new_urls)} new URLs (skipped {len(links_list) - len(new_urls)} duplicates)")
+        return new_urls
 
-    def get_video_details(self, url):
-        """Get status and upload_provider of a video by URL."""
-        with self.lock:
-            conn = sqlite3.connect(self.db_path, timeout=60.0, isolation_level='DEFERRED')
-            conn.execute('PRAGMA busy_timeout = 60000')  # 60 second busy timeout
-            cursor = conn.cursor()
-            cursor.execute("SELECT status, upload_provider FROM videos WHERE original_url = ?", (url,))
-            result = cursor.fetchone()
-            conn.close()
-            return result if result else None
-
-    def clean_failed_videos(self):
-        """Delete all videos with status 'FAILED' from the database."""
-        with self.lock:
-            conn = sqlite3.connect(self.db_path, timeout=60.0, isolation_level='DEFERRED')
-            conn.execute('PRAGMA busy_timeout = 60000')  # 60 second busy timeout
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM videos WHERE status = 'FAILED'")
-            affected = cursor.rowcount
-            conn.commit()
-            conn.close()
-            return affected
-    
     def insert_video(self, url, status='PENDING'):
-        """Insert a new video record."""
+        """Insert a new video record. Returns False if the URL already exists or is dead-lettered."""
         try:
-            with self.lock:
-                conn = sqlite3.connect(self.db_path, timeout=60.0, isolation_level='DEFERRED')
-                conn.execute('PRAGMA busy_timeout = 60000')  # 60 second busy timeout
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO videos (original_url, status, created_at) 
-                    VALUES (?, ?, ?)
-                """, (url, status, datetime.now()))
-                conn.commit()
-                conn.close()
-                return True
+            with self._write() as conn:
+                cursor = conn.execute("""
+                    INSERT INTO videos (original_url, status, unique_id, created_at)
+                    SELECT ?, ?, ?, CURRENT_TIMESTAMP
+                    WHERE NOT EXISTS (SELECT 1 FROM dead_letters WHERE original_url = ?)
+                """, (url, status, uuid.uuid4().hex, url))
+            return cursor.rowcount == 1
         except sqlite3.IntegrityError:
             # URL already exists
             return False
-    
-    def insert_videos_batch(self, urls, status='PENDING', batch_size=100):
-        """
-        Insert multiple videos in batches for better performance.
-        
-        Args:
-            urls: List/set of URLs to insert
-            status: Initial status for all URLs
-            batch_size: Number of URLs per batch
-            
-        Returns:
-            int: Number of successfully inserted URLs
-        """
-        inserted_count = 0
-        urls_list = list(urls) if isinstance(urls, set) else urls
-        
-        with self.lock:
-            conn = sqlite3.connect(self.db_path, timeout=60.0, isolation_level='DEFERRED')
-            conn.execute('PRAGMA busy_timeout = 60000')  # 60 second busy timeout
-            cursor = conn.cursor()
-            
-            # Process in batches
-            for i in range(0, len(urls_list), batch_size):
-                batch = urls_list[i:i + batch_size]
-                now = datetime.now()
-                
-                # Prepare batch data
-                batch_data = [(url, status, now) for url in batch]
-                
-                try:
-                    cursor.executemany("""
-                        INSERT OR IGNORE INTO videos (original_url, status, created_at)
-                        VALUES (?, ?, ?)
-                    """, batch_data)
-                    inserted_count += cursor.rowcount
-                except Exception as e:
-                    # Log error but continue with next batch
-                    import logging
-                    logging.error(f"Batch insert error: {e}")
-            
-            conn.commit()
-            conn.close()
-        
-        return inserted_count
-    
+
+    # Host parameters per statement stay well under SQLite's limit
+    KNOWN_URLS_CHUNK = 500
+
+    def get_known_urls(self, urls):
+        """Which of `urls` are already stored or dead-lettered (one indexed query per chunk)."""
+        urls = list(dict.fromkeys(urls))
+        known = set()
+        with self._read() as conn:
+            for start in range(0, len(urls), self.KNOWN_URLS_CHUNK):
+                chunk = urls[start:start + self.KNOWN_URLS_CHUNK]
+                placeholders = ', '.join('?' * len(chunk))
+                rows = conn.execute(f"""
+                    SELECT original_url FROM videos WHERE original_url IN ({placeholders})
+                    UNION ALL
+                    SELECT original_url FROM dead_letters WHERE original_url IN ({placeholders})
+                """, chunk + chunk).fetchall()
+                known.update(row[0] for row in rows)
+        return known
+
+    def get_harvest_mark(self, site):
+        """Discovery progress of one listing: {high_water_page, reached_end, updated_at}, or None."""
+        with self._read() as conn:
+            row = conn.execute("""
+                SELECT high_water_page, reached_end, updated_at FROM harvest_marks WHERE site = ?
+            """, (site,)).fetchone()
+        if not row:
+            return None
+        return {'high_water_page': row[0], 'reached_end': bool(row[1]), 'updated_at': row[2]}
+
+    def save_harvest_mark(self, site, high_water_page, reached_end=False):
+        """Record discovery progress of one listing (the page only moves forward, reached_end stays set)."""
+        with self._write() as conn:
+            conn.execute("""
+                INSERT INTO harvest_marks (site, high_water_page, reached_end, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (site) DO UPDATE
+                SET high_water_page = MAX(high_water_page, excluded.high_water_page),
+                    reached_end = reached_end OR excluded.reached_end,
+                    updated_at = excluded.updated_at
+            """, (site, high_water_page, reached_end))
+
+    def get_video_status(self, url):
+        """Check status of a video by URL."""
+        with self._read() as conn:
+            result = conn.execute("SELECT status FROM videos WHERE original_url = ?", (url,)).fetchone()
+        return result[0] if result else None
+
+    def get_video_details(self, url):
+        """Get status and upload_provider of a video by URL."""
+        with self._read() as conn:
+            result = conn.execute(
+                "SELECT status, upload_provider FROM videos WHERE original_url = ?", (url,)
+            ).fetchone()
+        return result if result else None
+
+    def get_all_upload_ids(self, url):
+        """Get status and all provider upload IDs of a video by URL."""
+        with self._read() as conn:
+            row = conn.execute("""
+                SELECT status, upload_provider, upload_id, doodstream_id, seekstreaming_id, lulustream_id, bunny_guid
+                FROM videos
+                WHERE original_url = ?
+            """, (url,)).fetchone()
+
+        if not row:
+            return None
+
+        return {
+            'status': row[0],
+            'upload_provider': row[1],
+            'upload_id': row[2],
+            'doodstream_id': row[3],
+            'seekstreaming_id': row[4],
+            'lulustream_id': row[5],
+            'bunny_guid': row[6]
+        }
+
     def update_status(self, url, status, **kwargs):
         """
         Thread-safe atomic status update with dynamic kwargs.
         Example: update_status(url, 'COMPLETED', bunny_guid='xxx', local_filename='yyy')
         """
-        with self.lock:
-            conn = sqlite3.connect(self.db_path, timeout=60.0, isolation_level='DEFERRED')
-            conn.execute('PRAGMA busy_timeout = 60000')  # 60 second busy timeout
-            cursor = conn.cursor()
-            
-            # Build dynamic UPDATE query
-            set_clauses = ["status = ?", "updated_at = ?"]
-            params = [status, datetime.now()]
-            
-            for key, value in kwargs.items():
-                set_clauses.append(f"{key} = ?")
-                params.append(value)
-            
-            query = f"UPDATE videos SET {', '.join(set_clauses)} WHERE original_url = ?"
-            params.append(url)
-            
-            cursor.execute(query, params)
-            conn.commit()
-            conn.close()
-    
+        # Build dynamic UPDATE query
+        set_clauses = ["status = ?", "updated_at = CURRENT_TIMESTAMP"]
+        params = [status]
+
+        for key, value in kwargs.items():
+            # Validate column name against whitelist to prevent SQL injection
+            if key not in self.ALLOWED_UPDATE_COLUMNS:
+                logger.warning(f"[SQLITE] Ignoring unknown column: {key}")
+                continue
+            set_clauses.append(f"{key} = ?")
+            params.append(value)
+
+        query = f"UPDATE videos SET {', '.join(set_clauses)} WHERE original_url = ?"
+        params.append(url)
+
+        with self._write() as conn:
+            conn.execute(query, params)
+
+    def start_stage(self, url, stage, **fields):
+        """Move a video into a pipeline stage (inserting it if new) in one transaction."""
+        fields = self._stage_fields(stage, fields)
+        columns = ', '.join(self.JOB_COLUMNS)
+        with self._write() as conn:
+            row = conn.execute(f"SELECT {columns} FROM videos WHERE original_url = ?", (url,)).fetchone()
+            if row is None:
+                dead = conn.execute("SELECT 1 FROM dead_letters WHERE original_url = ?", (url,)).fetchone()
+                if stage != 'EXTRACTING' or dead:
+                    raise InvalidTransitionError(f"Cannot start {stage}: video not stored or dead-lettered", url=url)
+                conn.execute("""
+                    INSERT INTO videos (original_url, status, unique_id, created_at)
+                    VALUES (?, 'PENDING', ?, CURRENT_TIMESTAMP)
+                """, (url, uuid.uuid4().hex))
+            elif not self._stage_allowed(stage, dict(zip(self.JOB_COLUMNS, row))):
+                raise InvalidTransitionError(f"Cannot start {stage} in status {row[0]}", url=url)
+
+            set_sql = ''.join(f", {key} = ?" for key in fields)
+            conn.execute(
+                f"UPDATE videos SET status = ?, updated_at = CURRENT_TIMESTAMP{set_sql} WHERE original_url = ?",
+                [stage, *fields.values(), url]
+            )
+            row = conn.execute(f"SELECT {columns} FROM videos WHERE original_url = ?", (url,)).fetchone()
+        return dict(zip(self.JOB_COLUMNS, row))
+
+    def save_successful_upload(self, url, title, seek_id, dood_id, lulu_id):
+        """Upsert a video record with all provider IDs and real title."""
+        if not seek_id:
+            raise InvalidTransitionError("Cannot finish video without a primary upload", url=url)
+        with self._write() as conn:
+            conn.execute("""
+                INSERT INTO videos (
+                    original_url, title, status, upload_provider, upload_id,
+                    seekstreaming_id, doodstream_id, lulustream_id, updated_at
+                )
+                VALUES (?, ?, 'COMPLETED', 'seekstreaming', ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (original_url) DO UPDATE SET
+                    title = excluded.title,
+                    status = excluded.status,
+                    upload_provider = excluded.upload_provider,
+                    upload_id = excluded.upload_id,
+                    seekstreaming_id = excluded.seekstreaming_id,
+                    doodstream_id = excluded.doodstream_id,
+                    lulustream_id = excluded.lulustream_id,
+                    worker_id = NULL,
+                    lease_expires_at = NULL,
+                    updated_at = excluded.updated_at
+            """, (url, title, seek_id, seek_id, dood_id, lulu_id))
+
     def log_error(self, url, error_msg, provider=None):
-        """Mark video as FAILED with error details."""
-        with self.lock:
-            conn = sqlite3.connect(self.db_path, timeout=60.0, isolation_level='DEFERRED')
-            conn.execute('PRAGMA busy_timeout = 60000')  # 60 second busy timeout
-            cursor = conn.cursor()
-            if provider:
-                cursor.execute("""
-                    UPDATE videos 
-                    SET status = 'FAILED', error_message = ?, upload_provider = ?, updated_at = ? 
-                    WHERE original_url = ?
-                """, (error_msg, provider, datetime.now(), url))
-            else:
-                cursor.execute("""
-                    UPDATE videos 
-                    SET status = 'FAILED', error_message = ?, updated_at = ? 
-                    WHERE original_url = ?
-                """, (error_msg, datetime.now(), url))
-            conn.commit()
-            conn.close()
-    
+        """
+        Mark video as FAILED (COMPLETED if SeekStreaming already has it) with error details,
+        fingerprinted into error_classes; dead-letter it if it will not succeed on retry.
+        """
+        with self._write() as conn:
+            class_id, permanent = self._classify_error(conn, error_msg)
+            provider_sql = "upload_provider = ?," if provider else ""
+            params = [short_error(error_msg), class_id] + ([provider] if provider else []) + [url]
+            conn.execute(f"""
+                UPDATE videos
+                SET status = CASE WHEN seekstreaming_id IS NOT NULL THEN 'COMPLETED' ELSE 'FAILED' END,
+                    error_message = ?,
+                    error_class_id = ?,
+                    failure_count = failure_count + CASE WHEN seekstreaming_id IS NULL THEN 1 ELSE 0 END,
+                    {provider_sql}
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE original_url = ?
+            """, params)
+            row = conn.execute(
+                "SELECT status, failure_count FROM videos WHERE original_url = ?", (url,)
+            ).fetchone()
+            if row and row[0] == 'FAILED' and (permanent or row[1] >= DEAD_LETTER_AFTER_FAILURES):
+                if self._move_to_dead_letters(conn, "original_url = ?", (url,)):
+                    logger.info(f"[QUEUE] Dead-lettered {url} after {row[1]} failure(s)")
+
+    def _classify_error(self, conn, error_msg):
+        """Count one occurrence of the message's error class. Returns (error_class_id, permanent)."""
+        fingerprint, template = error_fingerprint(error_msg)
+        conn.execute("""
+            INSERT INTO error_classes (fingerprint, template, permanent, occurrences)
+            VALUES (?, ?, ?, 1)
+            ON CONFLICT (fingerprint) DO UPDATE
+            SET occurrences = occurrences + 1, last_seen = CURRENT_TIMESTAMP
+        """, (fingerprint, template, is_permanent_error(template)))
+        class_id, permanent = conn.execute(
+            "SELECT id, permanent FROM error_classes WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        return class_id, bool(permanent)
+
+    def _move_to_dead_letters(self, conn, where, params=()):
+        """Move FAILED videos matching `where` from videos to dead_letters. Returns the count."""
+        conn.execute(f"""
+            INSERT INTO dead_letters (original_url, error_class_id, failures, dead_at)
+            SELECT original_url, error_class_id, MAX(failure_count, 1), CURRENT_TIMESTAMP
+            FROM videos
+            WHERE status = 'FAILED' AND {where}
+            ON CONFLICT (original_url) DO UPDATE
+            SET error_class_id = excluded.error_class_id,
+                failures = failures + excluded.failures,
+                dead_at = excluded.dead_at
+        """, params)
+        return conn.execute(f"DELETE FROM videos WHERE status = 'FAILED' AND {where}", params).rowcount
+
+    def record_upload(self, url, provider, remote_id, size=None, status=None):
+        """Save one provider's upload ID (and optionally the status); `size` is not stored here."""
+        prov_col = self._provider_column(provider)
+        with self._write() as conn:
+            if status == 'COMPLETED' and prov_col != 'seekstreaming_id':
+                row = conn.execute("SELECT seekstreaming_id FROM videos WHERE original_url = ?", (url,)).fetchone()
+                if row and not row[0]:
+                    raise InvalidTransitionError(f"Cannot record {provider} upload as COMPLETED without a primary upload", url=url)
+            cursor = conn.execute(f"""
+                UPDATE videos
+                SET {prov_col} = ?, status = COALESCE(?, status), updated_at = CURRENT_TIMESTAMP
+                WHERE original_url = ?
+            """, (remote_id, status, url))
+            return cursor.rowcount > 0
+
+    def clear_provider_upload(self, url, provider):
+        """Forget a video's upload on one provider and queue it again (status PENDING)."""
+        prov_col = self._provider_column(provider)
+        with self._write() as conn:
+            cursor = conn.execute(f"""
+                UPDATE videos
+                SET {prov_col} = NULL, status = 'PENDING', updated_at = CURRENT_TIMESTAMP
+                WHERE original_url = ?
+            """, (url,))
+            return cursor.rowcount > 0
+
+    def clear_provider_uploads(self, urls, provider, batch_size=1000, on_progress=None):
+        """Forget one provider's upload for many videos, one UPDATE per batch of URLs."""
+        prov_col = self._provider_column(provider)
+        urls = list(dict.fromkeys(urls))
+        reset = 0
+        for start in range(0, len(urls), batch_size):
+            batch = urls[start:start + batch_size]
+            with self._write() as conn:
+                reset += conn.execute(f"""
+                    UPDATE videos
+                    SET {prov_col} = NULL, status = 'PENDING', updated_at = CURRENT_TIMESTAMP
+                    WHERE original_url IN (SELECT value FROM json_each(?))
+                """, (json.dumps(batch),)).rowcount
+            if on_progress:
+                on_progress(start + len(batch), len(urls))
+        return reset
+
+    def _write_batches(self, where, params=(), columns="id", batch_size=1000):
+        """
+        Walk the videos matching `where` once in id order, yielding (conn, rows) per batch
+        of at most `batch_size` rows inside its own write transaction, so workers get the
+        write lock between batches. `columns` must start with id.
+        """
+        last_id = 0
+        while True:
+            with self._write() as conn:
+                rows = conn.execute(f"""
+                    SELECT {columns} FROM videos
+                    WHERE id > ? AND {where}
+                    ORDER BY id
+                    LIMIT ?
+                """, (last_id, *params, batch_size)).fetchall()
+                if rows:
+                    yield conn, rows
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1][0]
+
+    def _in_flight_params(self):
+        """SQL placeholder list and params for IN_FLIGHT_STATUSES."""
+        return ", ".join("?" * len(self.IN_FLIGHT_STATUSES)), self.IN_FLIGHT_STATUSES
+
+    def claim_jobs(self, worker_id, limit=1, lease_seconds=900, current_provider=None, with_records=False):
+        """
+        Atomically lease up to `limit` pending videos to one worker (status CLAIMED).
+
+        Returns:
+            list: Claimed URLs, oldest first (job record dicts if with_records)
+        """
+        if limit <= 0:
+            return []
+
+        where, params = self._pending_filter(current_provider)
+        with self._write() as conn:
+            rows = conn.execute(f"""
+                SELECT id, original_url, {", ".join(self.JOB_COLUMNS)}
+                FROM videos
+                WHERE {where}
+                  AND (lease_expires_at IS NULL OR lease_expires_at < CURRENT_TIMESTAMP)
+                ORDER BY created_at ASC, id ASC
+                LIMIT ?
+            """, (*params, limit)).fetchall()
+            conn.executemany("""
+                UPDATE videos
+                SET status = 'CLAIMED',
+                    worker_id = ?,
+                    lease_expires_at = datetime('now', ?),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, [(worker_id, f"+{int(lease_seconds)} seconds", row[0]) for row in rows])
+
+        if with_records:
+            return [{**self._job_record(row[1:]), 'status': 'CLAIMED'} for row in rows]
+        return [row[1] for row in rows]
+
+    def renew_leases(self, worker_id, lease_seconds=900):
+        """Extend the lease on every video this worker currently owns."""
+        placeholders, statuses = self._in_flight_params()
+        with self._write() as conn:
+            cursor = conn.execute(f"""
+                UPDATE videos
+                SET lease_expires_at = datetime('now', ?)
+                WHERE worker_id = ? AND status IN ({placeholders})
+            """, (f"+{int(lease_seconds)} seconds", worker_id, *statuses))
+            return cursor.rowcount
+
+    def release_jobs(self, worker_id, urls):
+        """Hand back claimed videos that were never started (e.g. stop requested)."""
+        if not urls:
+            return 0
+        with self._write() as conn:
+            cursor = conn.executemany("""
+                UPDATE videos
+                SET status = 'PENDING', worker_id = NULL, lease_expires_at = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE worker_id = ? AND status = 'CLAIMED' AND original_url = ?
+            """, [(worker_id, url) for url in urls])
+            affected = cursor.rowcount
+
+        if affected > 0:
+            logger.info(f"[QUEUE] Released {affected} unstarted jobs")
+        return affected
+
+    def _reset_in_flight(self, lease_filter):
+        """Return in-flight videos matching `lease_filter` to PENDING (or COMPLETED)."""
+        placeholders, statuses = self._in_flight_params()
+        with self._write() as conn:
+            cursor = conn.execute(f"""
+                UPDATE videos
+                SET status = CASE WHEN seekstreaming_id IS NOT NULL THEN 'COMPLETED' ELSE 'PENDING' END,
+                    worker_id = NULL,
+                    lease_expires_at = NULL,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE status IN ({placeholders}) AND {lease_filter}
+            """, statuses)
+            return cursor.rowcount
+
+    def reclaim_expired_leases(self):
+        """Return in-flight videos whose lease expired to the queue."""
+        affected = self._reset_in_flight("lease_expires_at < CURRENT_TIMESTAMP")
+        if affected > 0:
+            logger.info(f"[QUEUE] Reclaimed {affected} videos with expired leases")
+        return affected
+
+    def reset_stale_statuses(self):
+        """
+        Reset zombie threads from previous crashes.
+        CLAIMED/DOWNLOADING/UPLOADING/EXTRACTING -> PENDING (or COMPLETED if seekstreaming_id exists),
+        unless still covered by a live lease.
+        """
+        affected = self._reset_in_flight("(lease_expires_at IS NULL OR lease_expires_at < CURRENT_TIMESTAMP)")
+        if affected > 0:
+            logger.info(f"[RESET] Reset {affected} stale videos")
+        return affected
+
+    def _iter_keyset(self, columns, where, params=(), page_size=500):
+        """Stream rows of `videos` in (created_at, id) order, one page per query."""
+        last_key = None
+        while True:
+            keyset_sql = "" if last_key is None else "AND (created_at, id) > (?, ?)"
+            with self._read() as conn:
+                rows = conn.execute(f"""
+                    SELECT {columns}, created_at, id
+                    FROM videos
+                    WHERE ({where}) {keyset_sql}
+                    ORDER BY created_at ASC, id ASC
+                    LIMIT ?
+                """, (*params, *(last_key or ()), page_size)).fetchall()
+
+            for row in rows:
+                yield row[:-2]
+
+            if len(rows) < page_size:
+                return
+            last_key = rows[-1][-2:]
+
+    def iter_pending_videos(self, current_provider=None, page_size=500):
+        """Stream URLs still waiting for an upload, oldest first."""
+        where, params = self._pending_filter(current_provider)
+        for row in self._iter_keyset("original_url", where, params, page_size):
+            yield row[0]
+
+    def iter_missing_backup_videos(self, page_size=500, with_records=False):
+        """Stream URLs live on SeekStreaming but missing a backup host (job records if with_records)."""
+        if with_records:
+            columns = "original_url, " + ", ".join(self.JOB_COLUMNS)
+            for row in self._iter_keyset(columns, self.MISSING_BACKUP_FILTER, page_size=page_size):
+                yield self._job_record(row)
+            return
+        for row in self._iter_keyset("original_url", self.MISSING_BACKUP_FILTER, page_size=page_size):
+            yield row[0]
+
+    def iter_unsynced_metadata_videos(self, page_size=500):
+        """Stream COMPLETED videos whose metadata has not been synced to the providers."""
+        columns = "original_url, unique_id, title, description, seekstreaming_id, doodstream_id, lulustream_id"
+        yield from self._iter_keyset(columns, self.UNSYNCED_METADATA_FILTER, page_size=page_size)
+
+    def iter_provider_uploads(self, provider, page_size=500):
+        """Stream (url, remote_id) for every video uploaded to one provider."""
+        prov_col = self._provider_column(provider)
+        yield from self._iter_keyset(f"original_url, {prov_col}", f"{prov_col} IS NOT NULL", page_size=page_size)
+
+    def iter_missing_provider_uploads(self, provider, page_size=500):
+        """Stream URLs live on SeekStreaming but not yet uploaded to one backup provider."""
+        prov_col = self._provider_column(provider)
+        if provider.strip().lower() not in self.BACKUP_PROVIDERS:
+            return
+        where = f"(seekstreaming_id IS NOT NULL OR status = 'COMPLETED') AND {prov_col} IS NULL"
+        for row in self._iter_keyset("original_url", where, page_size=page_size):
+            yield row[0]
+
+    def clean_failed_videos(self, batch_size=1000, on_progress=None):
+        """Move FAILED videos that retrying will not fix to dead_letters (classifying old failures first)."""
+        classes = {}
+        for conn, unclassified in self._write_batches(
+                "status = 'FAILED' AND error_class_id IS NULL", columns="id, error_message",
+                batch_size=batch_size):
+            for video_id, error_msg in unclassified:
+                if error_msg not in classes:
+                    classes[error_msg] = self._classify_error(conn, error_msg)[0]
+                conn.execute("""
+                    UPDATE videos SET error_class_id = ?, failure_count = MAX(failure_count, 1) WHERE id = ?
+                """, (classes[error_msg], video_id))
+
+        affected = 0
+        for conn, batch in self._write_batches("""
+                status = 'FAILED'
+                AND (failure_count >= ? OR error_class_id IN (SELECT id FROM error_classes WHERE permanent))
+            """, (DEAD_LETTER_AFTER_FAILURES,), batch_size=batch_size):
+            affected += self._move_to_dead_letters(
+                conn, "id IN (SELECT value FROM json_each(?))", (json.dumps([row[0] for row in batch]),)
+            )
+            if on_progress:
+                on_progress(affected, None)
+
+        if affected > 0:
+            logger.info(f"[MAINTENANCE] Moved {affected} failed videos to dead_letters")
+        return affected
+
+    def get_error_classes(self, limit=20):
+        """Most frequent error classes with their dead-letter counts."""
+        with self._read() as conn:
+            rows = conn.execute("""
+                SELECT c.id, c.template, c.permanent, c.occurrences, c.last_seen,
+                       (SELECT COUNT(*) FROM dead_letters d WHERE d.error_class_id = c.id)
+                FROM error_classes c
+                ORDER BY c.occurrences DESC
+                LIMIT ?
+            """, (limit,)).fetchall()
+        return [
+            {'id': row[0], 'template': row[1], 'permanent': bool(row[2]), 'occurrences': row[3],
+             'last_seen': row[4], 'dead_letters': row[5]}
+            for row in rows
+        ]
+
+    def release_dead_letters(self, error_class_id=None, mark_transient=False):
+        """Forget dead-lettered URLs (all, or one error class) so discovery can queue them again."""
+        with self._write() as conn:
+            if error_class_id is None:
+                return conn.execute("DELETE FROM dead_letters").rowcount
+            released = conn.execute(
+                "DELETE FROM dead_letters WHERE error_class_id = ?", (error_class_id,)
+            ).rowcount
+            if mark_transient:
+                conn.execute("UPDATE error_classes SET permanent = FALSE WHERE id = ?", (error_class_id,))
+        return released
+
+    def reset_seekstreaming_missing_metadata(self, batch_size=1000, on_progress=None):
+        """Reset SeekStreaming videos with missing title to PENDING for re-upload, in batches."""
+        affected = 0
+        for conn, batch in self._write_batches(
+                "seekstreaming_id IS NOT NULL AND (title IS NULL OR title = '')", batch_size=batch_size):
+            affected += conn.execute("""
+                UPDATE videos
+                SET seekstreaming_id = NULL, status = 'PENDING', updated_at = CURRENT_TIMESTAMP
+                WHERE id IN (SELECT value FROM json_each(?))
+            """, (json.dumps([row[0] for row in batch]),)).rowcount
+            if on_progress:
+                on_progress(affected, None)
+
+        if affected > 0:
+            logger.info(f"[RESET] Reset {affected} SeekStreaming videos with missing metadata to PENDING")
+        return affected
+
+    def promote_seekstreaming_completed(self):
+        """Mark every video with a SeekStreaming upload as COMPLETED."""
+        with self._write() as conn:
+            return conn.execute("""
+                UPDATE videos SET status = 'COMPLETED'
+                WHERE seekstreaming_id IS NOT NULL AND status != 'COMPLETED'
+            """).rowcount
+
+    def get_counters(self):
+        """
+        Dashboard counters, computed directly (a local file scan is cheap).
+
+        Returns:
+            dict: {'total': int, 'status': {status: count}, 'provider': {provider: count}}
+        """
+        with self._read() as conn:
+            status_rows = conn.execute("""
+                SELECT COALESCE(status, 'UNKNOWN'), COUNT(*) FROM videos GROUP BY 1
+            """).fetchall()
+            provider_row = conn.execute("""
+                SELECT COUNT(seekstreaming_id), COUNT(doodstream_id), COUNT(lulustream_id), COUNT(bunny_guid)
+                FROM videos
+            """).fetchone()
+
+        providers = dict(zip(('seekstreaming', 'doodstream', 'lulustream', 'bunny'), provider_row))
+        return {
+            'total': sum(count for _, count in status_rows),
+            'status': dict(status_rows),
+            'provider': {name: count for name, count in providers.items() if count}
+        }
+
     def get_stats(self, provider=None):
         """Get status distribution for monitoring."""
         if not provider:
-            with self.lock:
-                conn = sqlite3.connect(self.db_path, timeout=60.0, isolation_level='DEFERRED')
-                conn.execute('PRAGMA busy_timeout = 60000')  # 60 second busy timeout
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT status, COUNT(*) 
-                    FROM videos 
+            with self._read() as conn:
+                return dict(conn.execute("""
+                    SELECT status, COUNT(*)
+                    FROM videos
                     GROUP BY status
-                """)
-                stats = dict(cursor.fetchall())
-                conn.close()
-                return stats
+                """).fetchall())
 
         provider = provider.strip().lower()
-        with self.lock:
-            conn = sqlite3.connect(self.db_path, timeout=60.0, isolation_level='DEFERRED')
-            conn.execute('PRAGMA busy_timeout = 60000')  # 60 second busy timeout
-            cursor = conn.cursor()
-            query = """
-                SELECT 
-                    CASE 
-                        WHEN status = 'COMPLETED' AND upload_provider = ? THEN 'COMPLETED'
+        prov_col = self.PROVIDER_COLUMNS.get(provider)
+        completed = f"{prov_col} IS NOT NULL" if prov_col else "status = 'COMPLETED' AND upload_provider = ?"
+        params = (provider,) * (5 if not prov_col else 4)
+        with self._read() as conn:
+            return dict(conn.execute(f"""
+                SELECT
+                    CASE
+                        WHEN {completed} THEN 'COMPLETED'
                         WHEN status = 'FAILED' AND upload_provider = ? THEN 'FAILED'
                         WHEN status = 'EXTRACTING' AND upload_provider = ? THEN 'EXTRACTING'
                         WHEN status = 'DOWNLOADING' AND upload_provider = ? THEN 'DOWNLOADING'
@@ -269,12 +855,122 @@ class DatabaseManager:
                     COUNT(*)
                 FROM videos
                 GROUP BY status_bucket
-            """
-            cursor.execute(query, (provider, provider, provider, provider, provider))
-            stats = dict(cursor.fetchall())
-            conn.close()
-            return stats
+            """, params).fetchall())
+
+    def get_recent_videos(self, limit=20):
+        """Fetch the most recently completed videos with their metadata."""
+        with self._read() as conn:
+            rows = conn.execute("""
+                SELECT original_url, title, description, seekstreaming_id, doodstream_id, lulustream_id, updated_at
+                FROM videos
+                WHERE status = 'COMPLETED'
+                ORDER BY updated_at IS NULL, updated_at DESC
+                LIMIT ?
+            """, (limit,)).fetchall()
+
+        results = []
+        for row in rows:
+            results.append({
+                "URL": row[0] if row[0] else "",
+                "Title": row[1] if row[1] else "Untitled",
+                "Description": row[2][:50] + "..." if row[2] and len(row[2]) > 50 else (row[2] or ""),
+                "SeekStreaming": row[3] if row[3] else "",
+                "DoodStream": row[4] if row[4] else "",
+                "LuluStream": row[5] if row[5] else "",
+                "Completed At": str(row[6])[:19] if row[6] else ""
+            })
+        return results
+
+    # Attempt fields stored as columns of video_attempts (stages go to the JSON column)
+    ATTEMPT_COLUMNS = (
+        'video_url', 'kind', 'worker_id', 'domain', 'extractor', 'outcome', 'error_message',
+        'started_at', 'finished_at', 'duration_seconds', 'bytes_downloaded', 'bytes_uploaded'
+    )
+
+    # SQL for each get_stage_percentiles grouping key (s = one stage of a.stages)
+    ATTEMPT_GROUP_SQL = {
+        'stage': "json_extract(s.value, '$.stage')",
+        'provider': "json_extract(s.value, '$.provider')",
+        'domain': "a.domain",
+        'extractor': "a.extractor",
+        'kind': "a.kind"
+    }
+
+    def record_attempt(self, attempt):
+        """Store one processing attempt with its stage timings."""
+        values = [attempt.get(column) for column in self.ATTEMPT_COLUMNS]
+        values = [value.isoformat(' ') if hasattr(value, 'isoformat') else value for value in values]
+        with self._write() as conn:
+            conn.execute(f"""
+                INSERT INTO video_attempts ({', '.join(self.ATTEMPT_COLUMNS)}, stages)
+                VALUES ({', '.join(['?'] * len(self.ATTEMPT_COLUMNS))}, ?)
+            """, values + [json.dumps(attempt.get('stages', []))])
+
+    def get_stage_percentiles(self, group_by=('stage', 'provider'), since_hours=24):
+        """
+        Wall-time percentiles of pipeline stages (SQLite has no percentile_cont,
+        so stage durations are grouped and interpolated in Python).
+        """
+        keys = self._attempt_group_keys(group_by)
+        key_sql = ", ".join(self.ATTEMPT_GROUP_SQL[key] for key in keys)
+        window_sql, params = "", ()
+        if since_hours is not None:
+            # started_at is stored as local time (datetime.now())
+            window_sql, params = "WHERE a.started_at >= ?", (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time() - since_hours * 3600)),)
+
+        with self._read() as conn:
+            rows = conn.execute(f"""
+                SELECT {key_sql},
+                    json_extract(s.value, '$.seconds'),
+                    json_extract(s.value, '$.ok'),
+                    json_extract(s.value, '$.bytes')
+                FROM video_attempts a, json_each(a.stages) AS s
+                {window_sql}
+            """, params).fetchall()
+
+        groups = {}
+        for row in rows:
+            seconds, ok, size = row[len(keys):]
+            group = groups.setdefault(tuple(row[:len(keys)]), {'seconds': [], 'failures': 0, 'bytes': None})
+            if seconds is not None:
+                group['seconds'].append(seconds)
+            if not ok:
+                group['failures'] += 1
+            if size is not None:
+                group['bytes'] = (group['bytes'] or 0) + size
 
+        results = []
+        for group_key in sorted(groups, key=lambda k: tuple((v is None, v or '') for v in k)):
+            group = groups[group_key]
+            durations = sorted(group['seconds'])
+            p50, p95 = percentile(durations, 0.5), percentile(durations, 0.95)
+            result = dict(zip(keys, group_key))
+            result.update({
+                'count': len(durations),
+                'failures': group['failures'],
+                'p50': round(p50, 3) if p50 is not None else None,
+                'p95': round(p95, 3) if p95 is not None else None,
+                'bytes': group['bytes']
+            })
+            results.append(result)
+        return results
 
-# Singleton instance
-db = DatabaseManager()
+    def export_videos_csv(self, out, columns, since=None, lag_seconds=60):
+        """Stream videos changed after `since` into `out` as CSV (see BaseStorage). No archive here."""
+        select = ", ".join("0 AS archived" if column == 'archived' else column for column in columns)
+        text = io.TextIOWrapper(out, encoding='utf-8', newline='')
+        writer = csv.writer(text)
+        writer.writerow(columns)
+        with self._read() as conn:
+            until = conn.execute(
+                "SELECT datetime('now', ?)", (f"-{int(lag_seconds)} seconds",)
+            ).fetchone()[0]
+            where, params = f"{CHANGED_AT_SQL} <= ?", [until]
+            if since:
+                where += f" AND {CHANGED_AT_SQL} > ?"
+                params.append(since)
+            for row in conn.execute(f"SELECT {select} FROM videos WHERE {where} ORDER BY {CHANGED_AT_SQL}", params):
+                writer.writerow(['\\N' if value is None else value for value in row])
+        text.flush()
+        text.detach()
+        return until
@@ -0,0 +1,186 @@
+"""
+Columnar snapshot export of the videos catalog.
+
+Streams every video (live and archived) out of the database with COPY ... TO STDOUT
+into a zstd-compressed Parquet file (or Arrow IPC with --format arrow), in row
+groups of EXPORT_ROW_GROUP_SIZE rows, so analytics and reporting read files
+instead of querying the production table.
+
+Exports are incremental: each run writes one part file under the output directory
+and records in _watermark.json the change time (COALESCE(updated_at, created_at))
+it exported up to; the next run only exports rows changed after it. A video that
+changed again shows up in a later part too, so readers keep the row with the
+highest changed_at per id. Dead-lettered (deleted) videos are not tracked.
+
+Usage:
+    python export_snapshot.py [--out DIR] [--format parquet|arrow] [--full]
+
+--full ignores the watermark and exports the whole catalog.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.ipc as pa_ipc
+import pyarrow.parquet as pq
+from config import EXPORT_DIR, EXPORT_ROW_GROUP_SIZE, EXPORT_WATERMARK_LAG_SECONDS
+from core.logger import logger
+from storage import get_storage
+
+WATERMARK_FILE = "_watermark.json"
+
+# Exported columns, shared by every backend (the SQLite one has no archive: archived is false)
+SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("original_url", pa.string()),
+    ("status", pa.string()),
+    ("upload_provider", pa.string()),
+    ("seekstreaming_id", pa.string()),
+    ("doodstream_id", pa.string()),
+    ("lulustream_id", pa.string()),
+    ("title", pa.string()),
+    ("description", pa.string()),
+    ("unique_id", pa.string()),
+    ("metadata_synced", pa.bool_()),
+    ("error_message", pa.string()),
+    ("created_at", pa.timestamp("us")),
+    ("updated_at", pa.timestamp("us")),
+    ("archived", pa.bool_()),
+])
+
+# What the part files hold: SCHEMA plus changed_at
+EXPORT_SCHEMA = SCHEMA.append(pa.field("changed_at", pa.timestamp("us")))
+
+# CSV as written by export_videos_csv(): unquoted \N is NULL, a quoted "" an empty string
+CONVERT_OPTIONS = pa_csv.ConvertOptions(
+    column_types=SCHEMA,
+    null_values=["\\N"],
+    strings_can_be_null=True,
+    quoted_strings_can_be_null=False,
+    true_values=["t", "true", "1"],
+    false_values=["f", "false", "0"],
+)
+
+
+def read_watermark(out_dir):
+    """Change time exported up to by the last run, or None."""
+    try:
+        with open(os.path.join(out_dir, WATERMARK_FILE)) as f:
+            return json.load(f).get("until")
+    except FileNotFoundError:
+        return None
+
+
+def write_watermark(out_dir, until, part):
+    """Atomically record the new watermark."""
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"until": until, "part": part, "exported_at": datetime.now().isoformat()}, f)
+    os.replace(path + ".tmp", path)
+
+
+def with_changed_at(batch):
+    """Append changed_at = COALESCE(updated_at, created_at), the column parts are merged on."""
+    changed_at = pc.coalesce(batch.column("updated_at"), batch.column("created_at"))
+    return pa.RecordBatch.from_arrays(batch.columns + [changed_at], schema=EXPORT_SCHEMA)
+
+
+class RowGroupWriter:
+    """Buffers CSV blocks and writes them in row groups of `row_group_size` rows."""
+
+    def __init__(self, path, schema, file_format, row_group_size):
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self._pending = []
+        self._pending_rows = 0
+        if file_format == "parquet":
+            self._writer = pq.ParquetWriter(path, schema, compression="zstd")
+            self._write = lambda table: self._writer.write_table(table, row_group_size=row_group_size)
+        else:
+            options = pa_ipc.IpcWriteOptions(compression="zstd")
+            self._writer = pa_ipc.new_file(path, schema, options=options)
+            self._write = lambda table: self._writer.write_table(table, max_chunksize=row_group_size)
+
+    def write(self, batch):
+        self._pending.append(batch)
+        self._pending_rows += batch.num_rows
+        self.rows += batch.num_rows
+        if self._pending_rows >= self.row_group_size:
+            table = pa.Table.from_batches(self._pending)
+            full = (table.num_rows // self.row_group_size) * self.row_group_size
+            self._write(table.slice(0, full))
+            self._pending = table.slice(full).to_batches()
+            self._pending_rows = table.num_rows - full
+
+    def close(self):
+        if self._pending_rows:
+            self._write(pa.Table.from_batches(self._pending))
+        self._writer.close()
+
+
+def export_snapshot(db, out_dir, file_format="parquet", full=False,
+                    row_group_size=EXPORT_ROW_GROUP_SIZE, lag_seconds=EXPORT_WATERMARK_LAG_SECONDS):
+    """
+    Export the videos changed since the last run into one new part file.
+
+    Returns:
+        tuple: (part file path or None if nothing changed, rows exported)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    since = None if full else read_watermark(out_dir)
+
+    # COPY spools to disk, pyarrow then converts it block by block: memory stays
+    # bounded by the row group size, however large the table is
+    with tempfile.TemporaryFile(dir=out_dir) as spool:
+        until = db.export_videos_csv(spool, SCHEMA.names, since=since, lag_seconds=lag_seconds)
+        spool.seek(0)
+        reader = pa_csv.open_csv(spool, convert_options=CONVERT_OPTIONS)
+
+        stamp = datetime.fromisoformat(until).strftime("%Y%m%dT%H%M%S")
+        name = f"videos-{'full-' if since is None else ''}{stamp}.{'parquet' if file_format == 'parquet' else 'arrow'}"
+        path = os.path.join(out_dir, name)
+        writer = RowGroupWriter(path + ".tmp", EXPORT_SCHEMA, file_format, row_group_size)
+        try:
+            for batch in reader:
+                writer.write(with_changed_at(batch))
+        finally:
+            writer.close()
+
+    if writer.rows:
+        os.replace(path + ".tmp", path)
+    else:
+        os.remove(path + ".tmp")
+        path = None
+    write_watermark(out_dir, until, name if path else None)
+    logger.info(f"[EXPORT] {writer.rows} rows changed {'since ' + since if since else 'in total'} "
+                f"up to {until} -> {path or 'no new part'}")
+    return path, writer.rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--out", default=EXPORT_DIR, help=f"Output directory (default: {EXPORT_DIR})")
+    parser.add_argument("--format", choices=("parquet", "arrow"), default="parquet")
+    parser.add_argument("--full", action="store_true", help="Ignore the watermark and export everything")
+    args = parser.parse_args()
+
+    db = get_storage()
+    path, rows = export_snapshot(db, args.out, args.format, full=args.full)
+    print(f"Exported {rows} rows" + (f" to {path}" if path else " (nothing changed)"))
+
+
+if __name__ == "__main__":
+    main()
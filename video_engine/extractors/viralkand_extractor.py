@@ -2,12 +2,12 @@
 Custom extractor for viralkand.com and thekamababa.com.
 These sites embed videos via iframe with base64 encoded video URLs.
 """
-import requests
 import base64
 import urllib.parse
 from bs4 import BeautifulSoup
 from extractors.base_extractor import BaseExtractor
 from core.logger import logger
+from core.sessions import get_client
 from core.exceptions import ExtractionError
 
 
@@ -52,16 +52,15 @@ class ViralkandExtractor(BaseExtractor):
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
                 'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
                 'Accept-Language': 'en-US,en;q=0.5',
-                'Accept-Encoding': 'gzip, deflate, br',
                 'DNT': '1',
-                'Connection': 'keep-alive',
                 'Upgrade-Insecure-Requests': '1',
                 'Sec-Fetch-Dest': 'document',
                 'Sec-Fetch-Mode': 'navigate',
                 'Sec-Fetch-Site': 'none',
                 'Cache-Control': 'max-age=0'
             }
-            response = requests.get(url, headers=headers, timeout=15)
+            # Shared pooled client: repeat requests to the site reuse a warm connection
+            response = get_client().get(url, headers=headers)
             response.raise_for_status()
             
             soup = BeautifulSoup(response.text, 'html.parser')
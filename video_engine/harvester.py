@@ -4,14 +4,14 @@ Automatically discovers video URLs from website homepages/sitemaps.
 
 This transforms the pipeline from "Processing Engine" to "Auto-Scraper".
 """
-import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 import re
+from config import HARVEST_CONCURRENCY, HARVEST_STOP_AFTER_KNOWN_PAGES
+from core.fetcher import get_fetcher
 from core.logger import logger
-from database_supabase import db
-import time
-import random
+from core.utils import get_random_user_agent
+from storage import db
 from collections import deque
 
 
@@ -21,14 +21,55 @@ class BaseHarvester:
     Discovers video page URLs from a website.
     """
     
-    def __init__(self, base_url):
+    def __init__(self, base_url, fetcher=None):
         """
         Args:
             base_url: Homepage or category page URL
+            fetcher: PageFetcher to use (default: the process-wide one, which
+                enforces the per-domain rate limit)
         """
         self.base_url = base_url
         self.domain = urlparse(base_url).netloc
         self.discovered_urls = set()
+        self.new_urls = []  # URLs inserted by the last save_to_database() call
+        self.fetcher = fetcher or get_fetcher()
+        self.pages_crawled = 0  # Pages processed by the last discover() call
+    
+    def page_headers(self):
+        """Browser-like headers with a rotated User-Agent (called once per request)."""
+        return {
+            'User-Agent': get_random_user_agent(),
+            'Referer': self.base_url,  # Makes it look like human browsing
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+        }
+    
+    def known_urls(self, urls):
+        """
+        Which of `urls` the database already has (one batched lookup).
+        A failed lookup counts nothing as known, so discovery carries on.
+        """
+        if not urls:
+            return set()
+        try:
+            return db.get_known_urls(urls)
+        except Exception as e:
+            logger.warning(f"[HARVESTER] Known-URL lookup failed: {e}")
+            return set()
+    
+    def harvest_mark(self):
+        """This site's crawl progress from harvest_marks, or None."""
+        try:
+            return db.get_harvest_mark(self.base_url)
+        except Exception as e:
+            logger.warning(f"[HARVESTER] Could not read crawl progress: {e}")
+            return None
+    
+    def save_harvest_mark(self, high_water_page, reached_end):
+        try:
+            db.save_harvest_mark(self.base_url, high_water_page, reached_end)
+        except Exception as e:
+            logger.warning(f"[HARVESTER] Could not save crawl progress: {e}")
     
     def discover(self, max_pages=10):
         """
@@ -114,17 +155,23 @@ class BaseHarvester:
             urls: Set of URLs to save
             
         Returns:
-            int: Number of new URLs added
+            int: Number of new URLs added (the URLs themselves are kept in self.new_urls)
         """
+        self.new_urls = []
         if not urls:
             return 0
         
         logger.info(f"[HARVESTER] Saving {len(urls)} URLs to database (batch mode)...")
         
-        # Use batch insert for better performance
-        new_count = db.insert_videos_batch(urls, status='PENDING')
+        # Large discoveries are streamed through COPY by the database layer
+        try:
+            self.new_urls = db.seed_new_links(urls, status='PENDING')
+        except Exception as e:
+            logger.error(f"[HARVESTER] Failed to save URLs: {e}")
+            return 0
         
-        logger.info(f"[HARVESTER] Successfully added {new_count} new URLs")
+        new_count = len(self.new_urls)
+        logger.info(f"[HARVESTER] Successfully added {new_count} new URLs (skipped {len(urls) - new_count} already known)")
         return new_count
 
 
@@ -150,48 +197,51 @@ class GenericHarvester(BaseHarvester):
         crawled_pages = set()
         
         while pages_to_crawl and len(crawled_pages) < max_pages:
-            current_page = pages_to_crawl.pop(0)
+            # Fetch the next wave of the frontier concurrently
+            wave = []
+            while pages_to_crawl and len(wave) < min(HARVEST_CONCURRENCY, max_pages - len(crawled_pages)):
+                page = pages_to_crawl.pop(0)
+                if page not in crawled_pages and page not in wave:
+                    wave.append(page)
             
-            if current_page in crawled_pages:
-                continue
-            
-            try:
-                logger.info(f"[HARVESTER] Crawling page {len(crawled_pages)+1}/{max_pages}: {current_page}")
-                
-                # Fetch page
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                }
-                response = requests.get(current_page, headers=headers, timeout=15)
-                response.raise_for_status()
-                
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # Find all links
-                all_links = []
-                for link in soup.find_all('a', href=True):
-                    full_url = urljoin(current_page, link['href'])
-                    all_links.append(full_url)
-                
-                # Filter for video pages
-                video_urls = self.filter_urls(all_links)
-                self.discovered_urls.update(video_urls)
-                
-                # Find pagination/category pages for further crawling
-                pagination_patterns = ['/page/', '?page=']
-                for link in all_links:
-                    if any(pattern in link for pattern in pagination_patterns):
-                        if link not in crawled_pages and link not in pages_to_crawl:
-                            pages_to_crawl.append(link)
-                
-                crawled_pages.add(current_page)
-                
-            except Exception as e:
-                logger.error(f"[HARVESTER] Error crawling {current_page}: {e}")
-                crawled_pages.add(current_page)  # Mark as crawled to avoid retry
+            for current_page, response in zip(wave, self.fetcher.fetch_many(wave, headers=self.page_headers)):
+                self._crawl_generic_page(current_page, response, crawled_pages, pages_to_crawl, max_pages)
         
         logger.info(f"[HARVESTER] Discovery complete: {len(self.discovered_urls)} video URLs found")
         return self.discovered_urls
+    
+    def _crawl_generic_page(self, current_page, response, crawled_pages, pages_to_crawl, max_pages):
+        """Harvest one fetched page and queue its pagination links."""
+        try:
+            logger.info(f"[HARVESTER] Crawling page {len(crawled_pages)+1}/{max_pages}: {current_page}")
+            if isinstance(response, Exception):
+                raise response
+            response.raise_for_status()
+            
+            soup = BeautifulSoup(response.text, 'html.parser')
+            
+            # Find all links
+            all_links = []
+            for link in soup.find_all('a', href=True):
+                full_url = urljoin(current_page, link['href'])
+                all_links.append(full_url)
+            
+            # Filter for video pages
+            video_urls = self.filter_urls(all_links)
+            self.discovered_urls.update(video_urls)
+            
+            # Find pagination/category pages for further crawling
+            pagination_patterns = ['/page/', '?page=']
+            for link in all_links:
+                if any(pattern in link for pattern in pagination_patterns):
+                    if link not in crawled_pages and link not in pages_to_crawl:
+                        pages_to_crawl.append(link)
+            
+            crawled_pages.add(current_page)
+            
+        except Exception as e:
+            logger.error(f"[HARVESTER] Error crawling {current_page}: {e}")
+            crawled_pages.add(current_page)  # Mark as crawled to avoid retry
 
 
 class LinkHarvester(BaseHarvester):
@@ -201,81 +251,93 @@ class LinkHarvester(BaseHarvester):
     Features:
     - Supports ?page=n and /page/n patterns
     - Auto-stops when no new links found (prevents infinite loops)
-    - Random delay (2-5s) between pages to avoid IP bans
+    - Fetches HARVEST_CONCURRENCY pages at a time, rate-limited per domain (see core/fetcher.py)
     - Hard max_pages limit for safety
     """
     
-    def discover(self, max_pages=5, start_page=1):
+    def page_url(self, page_num):
+        """URL of one listing page."""
+        if page_num == 1:
+            return self.base_url
+        if '?' in self.base_url:
+            return f"{self.base_url}&page={page_num}"
+        # viralkand.com usually uses /page/n/
+        return f"{self.base_url.rstrip('/')}/page/{page_num}/"
+    
+    def discover(self, max_pages=5, start_page=1, incremental=True):
         """
         Discover video URLs using pagination with auto-stop.
         
+        Pages are fetched in windows of HARVEST_CONCURRENCY and processed in page
+        order, so the auto-stop rules behave as in a sequential crawl; at most one
+        window past the stopping page is fetched.
+        
+        Incremental runs check each page's links against the database in one lookup.
+        Inside the part of the listing crawled before (up to the site's high-water
+        page), HARVEST_STOP_AFTER_KNOWN_PAGES consecutive pages of known URLs end the
+        crawl if an earlier run reached the end of the listing; otherwise the crawl
+        jumps past the high-water page and spends the rest of max_pages on the backfill.
+        
         Args:
             max_pages: Maximum pages to crawl (default=5, hard limit)
             start_page: Page number to start from (default=1)
+            incremental: Stop early on already-known pages (default=True)
         
         Returns:
             set: Discovered video URLs
         """
-        import time
-        import random
-        
         logger.info(f"[HARVESTER] Starting pagination discovery from {self.base_url}")
         logger.info(f"[HARVESTER] Start page: {start_page}, Max pages: {max_pages if max_pages > 0 else 'Unlimited'}")
         
+        mark = self.harvest_mark()
+        high_water = mark['high_water_page'] if mark else 0
+        reached_end = mark['reached_end'] if mark else False
+        covered = high_water  # Last page of the gap-free crawled prefix of the listing
+        stop_after_known = HARVEST_STOP_AFTER_KNOWN_PAGES if incremental and high_water and start_page == 1 else 0
+        if stop_after_known:
+            logger.info(f"[HARVESTER] Incremental run: crawled up to page {high_water} before"
+                        f"{' (end of listing reached)' if reached_end else ''}")
+        
         page_num = start_page
-        end_page = start_page + max_pages if max_pages > 0 else float('inf')
+        budget = max_pages if max_pages > 0 else float('inf')
+        self.pages_crawled = 0
         consecutive_zero_pages = 0
-        
-        while page_num < end_page:
-            # URL Construction Logic
-            if page_num == 1:
-                current_page_url = self.base_url
-            elif '?' in self.base_url:
-                current_page_url = f"{self.base_url}&page={page_num}"
-            else:
-                # viralkand.com usually uses /page/n/
-                current_page_url = f"{self.base_url.rstrip('/')}/page/{page_num}/"
+        consecutive_known_pages = 0
+        stop = False
+        
+        while budget > 0 and not stop:
+            window = list(range(page_num, page_num + int(min(HARVEST_CONCURRENCY, budget))))
+            urls = [self.page_url(n) for n in window]
+            responses = self.fetcher.fetch_many(urls, headers=self.page_headers)
+            next_page = window[-1] + 1
             
-            try:
-                logger.info(f"[HARVESTER] Crawling page {page_num} of {end_page-1 if end_page != float('inf') else 'Unlimited'}: {current_page_url}")
-                
-                # CRITICAL: Rotate User-Agent on every page to prevent fingerprinting
-                from core.utils import get_random_user_agent
-                headers = {
-                    'User-Agent': get_random_user_agent(),
-                    'Referer': self.base_url,  # Makes it look like human browsing
-                    'Connection': 'keep-alive',  # Better performance
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                    'Accept-Language': 'en-US,en;q=0.5',
-                }
-                response = requests.get(current_page_url, headers=headers, timeout=15)
+            for page_num, current_page_url, response in zip(window, urls, responses):
+                budget -= 1
+                self.pages_crawled += 1
+                logger.info(f"[HARVESTER] Crawling page {page_num} ({self.pages_crawled}/{max_pages if max_pages > 0 else 'Unlimited'}): {current_page_url}")
                 
+                if isinstance(response, Exception):
+                    # Don't break the whole loop on one page error
+                    logger.error(f"[HARVESTER] Error crawling page {page_num}: {response}")
+                    continue
                 if response.status_code == 404:
                     logger.info(f"[HARVESTER] Page {page_num} returned 404 - reached end of pagination")
+                    reached_end = reached_end or page_num <= covered + 1
+                    stop = True
                     break
                 elif response.status_code != 200:
                     logger.warning(f"[HARVESTER] Page {page_num} returned status {response.status_code}")
                     # Don't break immediately on other errors, just skip
-                    page_num += 1
                     continue
-                    
-                soup = BeautifulSoup(response.text, 'html.parser')
                 
-                # Find all links on this page
-                all_links = []
-                for link in soup.find_all('a', href=True):
-                    from urllib.parse import urljoin
-                    full_url = urljoin(current_page_url, link['href'])
-                    all_links.append(full_url)
-                
-                # Filter for video pages
-                before_count = len(self.discovered_urls)
-                video_urls = self.filter_urls(all_links)
-                self.discovered_urls.update(video_urls)
-                after_count = len(self.discovered_urls)
-                
-                new_links_found = after_count - before_count
-                logger.info(f"✅ Page {page_num}: Found {new_links_found} new video links (Total: {after_count})")
+                try:
+                    candidates, new_links_found = self._harvest_listing(current_page_url, response.text)
+                except Exception as e:
+                    logger.error(f"[HARVESTER] Error crawling page {page_num}: {e}")
+                    continue
+                if page_num == covered + 1:
+                    covered = page_num
+                logger.info(f"✅ Page {page_num}: Found {new_links_found} new video links (Total: {len(self.discovered_urls)})")
                 
                 # AUTO-STOP: If no new links found, stop crawling
                 if new_links_found == 0:
@@ -284,28 +346,50 @@ class LinkHarvester(BaseHarvester):
                     
                     if consecutive_zero_pages >= 2:
                         logger.info(f"[HARVESTER] Auto-stopping: 2 consecutive pages with no new links")
+                        stop = True
                         break
                 else:
                     consecutive_zero_pages = 0  # Reset counter
                 
-                # Rate limiting: Random delay to avoid IP bans
-                if page_num < end_page:
-                    delay = random.uniform(2.0, 5.0)
-                    logger.debug(f"[HARVESTER] Waiting {delay:.1f}s before next page...")
-                    time.sleep(delay)
-                
-                page_num += 1
-                
-            except Exception as e:
-                logger.error(f"[HARVESTER] Error crawling page {page_num}: {e}")
-                # Don't break the whole loop on one page error
-                page_num += 1
-                continue
+                # INCREMENTAL STOP: pages the database already has in full
+                if stop_after_known and page_num <= high_water:
+                    unknown = candidates - self.known_urls(candidates)
+                    consecutive_known_pages = 0 if unknown else consecutive_known_pages + 1
+                    if consecutive_known_pages >= stop_after_known:
+                        if reached_end:
+                            logger.info(f"[HARVESTER] Caught up: {consecutive_known_pages} pages of known URLs, stopping")
+                            stop = True
+                        else:
+                            logger.info(f"[HARVESTER] Caught up: resuming backfill after page {high_water}")
+                            next_page = high_water + 1
+                            stop_after_known = 0
+                        break
             
-
+            page_num = next_page
+        
+        if covered and (mark is None or covered > high_water or reached_end != mark['reached_end']):
+            self.save_harvest_mark(covered, reached_end)
         
-        logger.info(f"[HARVESTER] Pagination complete: {len(self.discovered_urls)} total video URLs discovered across {page_num-1} pages")
+        logger.info(f"[HARVESTER] Pagination complete: {len(self.discovered_urls)} total video URLs discovered across {self.pages_crawled} pages")
         return self.discovered_urls
+    
+    def _harvest_listing(self, page_url, html):
+        """
+        Add the video links of one listing page to discovered_urls.
+        
+        Returns:
+            tuple: (the page's video links, number of them not seen before in this run)
+        """
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        # Find all links on this page
+        all_links = [urljoin(page_url, link['href']) for link in soup.find_all('a', href=True)]
+        
+        # Filter for video pages
+        video_urls = self.filter_urls(all_links)
+        before_count = len(self.discovered_urls)
+        self.discovered_urls.update(video_urls)
+        return video_urls, len(self.discovered_urls) - before_count
 
 
 class SitemapHarvester(BaseHarvester):
@@ -329,11 +413,12 @@ class SitemapHarvester(BaseHarvester):
         
         logger.info(f"[HARVESTER] Trying sitemap discovery...")
         
-        for sitemap_url in sitemap_urls:
+        # Probe every candidate at once; the first one that exists wins
+        responses = self.fetcher.fetch_many(sitemap_urls, headers=lambda: {'User-Agent': get_random_user_agent()})
+        for sitemap_url, response in zip(sitemap_urls, responses):
             try:
-                from core.utils import get_random_user_agent
-                headers = {'User-Agent': get_random_user_agent()}
-                response = requests.get(sitemap_url, headers=headers, timeout=15)
+                if isinstance(response, Exception):
+                    raise response
                 if response.status_code == 200:
                     logger.info(f"[HARVESTER] Found sitemap: {sitemap_url}")
                     
@@ -356,7 +441,7 @@ class SitemapHarvester(BaseHarvester):
         
         logger.warning(f"[HARVESTER] No sitemap found, falling back to generic crawl")
         # Fallback to generic discovery
-        generic = GenericHarvester(self.base_url)
+        generic = GenericHarvester(self.base_url, self.fetcher)
         return generic.discover()
 
 
@@ -366,18 +451,33 @@ class ViralkandHarvester(BaseHarvester):
     Prioritizes Video Links, then Categories. Skips Tags.
     """
     
-    def discover(self, max_pages=10):
+    def discover(self, max_pages=10, incremental=True):
         """
         Discover video URLs using a controlled BFS + Priority Queue logic.
         
+        The queue is crawled in waves of up to HARVEST_CONCURRENCY pages fetched
+        concurrently; the per-domain rate limit replaces the old 3-7s sleep per page.
+        
+        Incremental runs check each page's video links against the database in one
+        lookup and stop after HARVEST_STOP_AFTER_KNOWN_PAGES consecutive pages of known
+        URLs, once an earlier run exhausted the queue or crawled at least max_pages
+        (a run asking for more pages than ever before is a backfill and goes on).
+        
         Args:
             max_pages: Maximum number of pages to crawl (crawl steps limit)
+            incremental: Stop early on already-known pages (default=True)
         
         Returns:
             set: Discovered video URLs
         """
         logger.info(f"[HARVESTER] Starting Viralkand BFS discovery from {self.base_url}")
         
+        mark = self.harvest_mark()
+        caught_up = mark is not None and (mark['reached_end'] or 0 < max_pages <= mark['high_water_page'])
+        stop_after_known = HARVEST_STOP_AFTER_KNOWN_PAGES if incremental and caught_up else 0
+        consecutive_known_pages = 0
+        stopped_early = False
+        
         visited = set()
         # Queue stores URLs to crawl. 
         # We use a deque for efficient pops from left.
@@ -389,82 +489,101 @@ class ViralkandHarvester(BaseHarvester):
         
         pages_crawled = 0
         
-        while queue and (pages_crawled < max_pages if max_pages > 0 else True):
-            current_url = queue.popleft()
-            
-            if current_url in visited:
-                continue
+        while queue and not stopped_early and (pages_crawled < max_pages if max_pages > 0 else True):
+            wave_size = min(HARVEST_CONCURRENCY, max_pages - pages_crawled) if max_pages > 0 else HARVEST_CONCURRENCY
+            wave = []
+            while queue and len(wave) < wave_size:
+                url = queue.popleft()
+                if url not in visited and url not in wave:
+                    wave.append(url)
             
-            try:
-                # SAFETY DELAY: 3-7s random sleep to behave like a human
-                delay = random.uniform(3.0, 7.0)
-                logger.info(f"[HARVESTER] ⏳ Waiting {delay:.1f}s...")
-                time.sleep(delay)
-                
-                logger.info(f"[HARVESTER] 🕸️ Crawling {pages_crawled + 1}/{max_pages if max_pages > 0 else 'Unlimited'}: {current_url}")
-                
-                # Fetch page
-                from core.utils import get_random_user_agent
-                headers = {
-                    'User-Agent': get_random_user_agent(),
-                    'Referer': self.base_url,
-                    'Connection': 'keep-alive'
-                }
-                
-                response = requests.get(current_url, headers=headers, timeout=15)
-                response.raise_for_status()
-                
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # Extract ALL links
-                page_links = []
-                for a in soup.find_all('a', href=True):
-                    full_url = urljoin(current_url, a['href'])
-                    # Basic cleanup
-                    full_url = full_url.split('#')[0].split('?')[0] # Remove fragments/queries for cleaner crawling
+            responses = self.fetcher.fetch_many(wave, headers=lambda: {
+                'User-Agent': get_random_user_agent(),
+                'Referer': self.base_url,
+            })
+            for current_url, response in zip(wave, responses):
+                try:
+                    logger.info(f"[HARVESTER] 🕸️ Crawling {pages_crawled + 1}/{max_pages if max_pages > 0 else 'Unlimited'}: {current_url}")
+                    if isinstance(response, Exception):
+                        raise response
+                    response.raise_for_status()
                     
-                    # Ensure domain match
-                    if self.domain not in full_url:
-                        continue
-                        
-                    page_links.append(full_url)
-                
-                # SEPARATE: Video Links vs Category Links
-                video_candidates = []
-                category_candidates = []
-                
-                for link in page_links:
-                    if self.is_video_page(link):
-                        video_candidates.append(link)
-                    elif self.is_category_link(link):
-                        category_candidates.append(link)
-                    elif '/page/' in link:
-                         category_candidates.append(link) # Treat pagination like categories (crawl targets)
-
-                # PROCESS 1: Add Video Links (Immediate Reward)
-                new_videos = 0
-                for v_link in video_candidates:
-                    if v_link not in self.discovered_videos:
-                        self.discovered_videos.add(v_link)
-                        new_videos += 1
-                
-                logger.info(f"   found {new_videos} new videos, {len(category_candidates)} crawl targets")
-
-                # PROCESS 2: Add Category Links to Queue (Future Reward)
-                # Sort unique candidates to keep order deterministic-ish
-                for c_link in sorted(list(set(category_candidates))):
-                    if c_link not in visited and c_link not in queue:
-                        queue.append(c_link)
-                
-                visited.add(current_url)
-                pages_crawled += 1
+                    video_candidates, category_candidates = self._harvest_page(current_url, response.text)
+                    
+                    # PROCESS 2: Add Category Links to Queue (Future Reward)
+                    # Sort unique candidates to keep order deterministic-ish
+                    for c_link in sorted(list(set(category_candidates))):
+                        if c_link not in visited and c_link not in queue:
+                            queue.append(c_link)
+                    
+                    visited.add(current_url)
+                    pages_crawled += 1
+                    
+                except Exception as e:
+                    logger.error(f"[HARVESTER] Error crawling {current_url}: {e}")
+                    visited.add(current_url) # Mark visited so we don't retry forever
+                    continue
                 
-            except Exception as e:
-                logger.error(f"[HARVESTER] Error crawling {current_url}: {e}")
-                visited.add(current_url) # Mark visited so we don't retry forever
+                # INCREMENTAL STOP: pages the database already has in full
+                if stop_after_known:
+                    unknown = set(video_candidates) - self.known_urls(video_candidates)
+                    consecutive_known_pages = 0 if unknown else consecutive_known_pages + 1
+                    if consecutive_known_pages >= stop_after_known:
+                        logger.info(f"[HARVESTER] Caught up: {consecutive_known_pages} pages of known URLs, stopping")
+                        stopped_early = True
+                        break
+        
+        self.pages_crawled = pages_crawled
+        if pages_crawled and not stopped_early:
+            self.save_harvest_mark(pages_crawled, reached_end=not queue)
         
         logger.info(f"[HARVESTER] Viralkand discovery complete. Found {len(self.discovered_videos)} videos.")
         return self.discovered_videos
+    
+    def _harvest_page(self, current_url, html):
+        """
+        Collect the video links of one page into discovered_videos.
+        
+        Returns:
+            tuple: (video links, category/pagination links (crawl targets)) found on the page
+        """
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        # Extract ALL links
+        page_links = []
+        for a in soup.find_all('a', href=True):
+            full_url = urljoin(current_url, a['href'])
+            # Basic cleanup
+            full_url = full_url.split('#')[0].split('?')[0] # Remove fragments/queries for cleaner crawling
+            
+            # Ensure domain match
+            if self.domain not in full_url:
+                continue
+                
+            page_links.append(full_url)
+        
+        # SEPARATE: Video Links vs Category Links
+        video_candidates = []
+        category_candidates = []
+        
+        for link in page_links:
+            if self.is_video_page(link):
+                video_candidates.append(link)
+            elif self.is_category_link(link):
+                category_candidates.append(link)
+            elif '/page/' in link:
+                 category_candidates.append(link) # Treat pagination like categories (crawl targets)
+
+        # PROCESS 1: Add Video Links (Immediate Reward)
+        new_videos = 0
+        for v_link in video_candidates:
+            if v_link not in self.discovered_videos:
+                self.discovered_videos.add(v_link)
+                new_videos += 1
+        
+        logger.info(f"   found {new_videos} new videos, {len(category_candidates)} crawl targets")
+        return video_candidates, category_candidates
+
 
     def is_video_page(self, url):
         """
@@ -535,7 +654,7 @@ class ViralkandHarvester(BaseHarvester):
 
 
 
-def harvest_and_save(base_url, method='auto', max_pages=5, start_page=1):
+def harvest_and_save(base_url, method='auto', max_pages=5, start_page=1, incremental=True):
     """
     Convenience function to discover and save URLs with detailed stats.
     
@@ -544,6 +663,7 @@ def harvest_and_save(base_url, method='auto', max_pages=5, start_page=1):
         method: 'auto', 'sitemap', 'generic', or 'pagination'
         max_pages: Maximum pages to crawl (for pagination/generic methods)
         start_page: Page number to start crawling from (for pagination method)
+        incremental: Stop at pages whose links are all known (pagination and viralkand)
         
     Returns:
         dict: Statistics with keys:
@@ -565,7 +685,9 @@ def harvest_and_save(base_url, method='auto', max_pages=5, start_page=1):
     
     # Discover URLs
     if isinstance(harvester, LinkHarvester):
-        urls = harvester.discover(max_pages=max_pages, start_page=start_page)
+        urls = harvester.discover(max_pages=max_pages, start_page=start_page, incremental=incremental)
+    elif isinstance(harvester, ViralkandHarvester):
+        urls = harvester.discover(max_pages=max_pages, incremental=incremental)
     else:
         urls = harvester.discover(max_pages=max_pages)
     
@@ -573,7 +695,7 @@ def harvest_and_save(base_url, method='auto', max_pages=5, start_page=1):
     new_count = harvester.save_to_database(urls)
     
     stats = {
-        'pages_scanned': max_pages,  # Approximate
+        'pages_scanned': harvester.pages_crawled or max_pages,  # Approximate for sitemap/generic
         'links_found': len(urls),
         'links_added': new_count
     }
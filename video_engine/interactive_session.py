@@ -9,7 +9,7 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from config import MAX_WORKERS
-from database import db
+from storage import db
 from core.logger import logger
 from harvester import harvest_and_save
 from video_processor import process_video
@@ -80,7 +80,7 @@ def harvest_from_website():
     try:
         new_count = harvest_and_save(website_url, method=method, max_pages=max_pages, start_page=start_page)
         print(f"\n✅ Discovered {new_count} new video URLs")
-        return db.get_pending_urls()
+        return db.get_pending_videos()
     except Exception as e:
         print(f"\n❌ Discovery failed: {e}")
         return []
@@ -191,7 +191,7 @@ def main():
     print_banner()
     
     # Initialize database
-    db._init_db()
+    db.migrate()
     
     # Reset stale statuses
     stale_count = db.reset_stale_statuses()
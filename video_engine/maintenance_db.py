@@ -8,16 +8,17 @@ load_dotenv()
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from database_supabase import SupabaseManager
+from storage import get_storage
+from config import ARCHIVE_COMPLETED_AFTER_DAYS, ARCHIVE_BATCH_SIZE, MAINTENANCE_BATCH_SIZE
 from core.logger import logger
 
 def clean_database():
     print("=" * 60)
-    print("Supabase Database Maintenance")
+    print("Database Maintenance")
     print("=" * 60)
     
     try:
-        db = SupabaseManager()
+        db = get_storage()
     except Exception as e:
         print(f"Failed to connect to database: {e}")
         return
@@ -31,22 +32,36 @@ def clean_database():
     else:
         print("   Database is empty.")
 
-    # 2. Identify failed entries to clean
-    print("\n2. Cleaning up failed entries...")
+    # 2. Dead-letter failures that retrying will not fix
+    print("\n2. Dead-lettering permanent failures...")
     
-    deleted_count = db.clean_failed_videos()
-    if deleted_count == 0:
-        print("   No failed entries found to clean.")
+    dead_count = db.clean_failed_videos(
+        MAINTENANCE_BATCH_SIZE, on_progress=lambda done, total: print(f"   ... {done} moved so far")
+    )
+    if dead_count == 0:
+        print("   No failed entries to dead-letter.")
     else:
-        print(f"   Total failed entries removed: {deleted_count}")
+        print(f"   Moved {dead_count} failed entries to dead_letters.")
+    for error_class in db.get_error_classes(limit=10):
+        flag = "permanent" if error_class['permanent'] else "transient"
+        print(f"   #{error_class['id']:<4d} {error_class['occurrences']:6d}x  {error_class['dead_letters']:5d} dead  "
+              f"[{flag}] {error_class['template'][:80]}")
 
     # 3. Reset stale statuses
     print("\n3. Resetting stale statuses...")
     reset_count = db.reset_stale_statuses()
     print(f"   Reset {reset_count} stuck tasks to PENDING.")
 
-    # 4. Final Stats
-    print("\n4. Final Statistics:")
+    # 4. Archive finished videos
+    print("\n4. Archiving completed videos...")
+    if ARCHIVE_COMPLETED_AFTER_DAYS > 0:
+        archived_count = db.archive_completed(ARCHIVE_COMPLETED_AFTER_DAYS, ARCHIVE_BATCH_SIZE)
+        print(f"   Archived {archived_count} videos untouched for {ARCHIVE_COMPLETED_AFTER_DAYS}+ days.")
+    else:
+        print("   Disabled (set ARCHIVE_COMPLETED_AFTER_DAYS to enable).")
+
+    # 5. Final Stats
+    print("\n5. Final Statistics:")
     stats = db.get_stats()
     if stats:
         for status, count in stats.items():
@@ -0,0 +1,980 @@
+"""
+Versioned schema migrations for the Supabase (PostgreSQL) database.
+
+Each migration runs exactly once per database, in version order, and is recorded
+in the schema_migrations table. SupabaseManager.migrate() applies pending ones
+under a transaction-scoped advisory lock, so concurrent workers never race on the
+same ALTER/UPDATE. A warm start costs a single SELECT MAX(version).
+
+Rules for adding a migration:
+- Append a new (version, name, statements) tuple; never edit or renumber old ones.
+- Statements run in one transaction together with the version bookkeeping.
+- Prefer idempotent DDL (IF NOT EXISTS / DROP ... IF EXISTS): databases created
+  before schema_migrations existed replay every migration once.
+"""
+
+
+def counter_facts(rows, sign):
+    """
+    SQL producing (kind, key, delta) facts for every row of `rows` (table or transition table):
+    one 'total' fact, one 'status' fact and one 'provider' fact per non-NULL provider ID.
+    """
+    return f"""
+        SELECT 'total' AS kind, '' AS key, {sign} AS delta FROM {rows}
+        UNION ALL
+        SELECT 'status', COALESCE(status, 'UNKNOWN'), {sign} FROM {rows}
+        UNION ALL
+        SELECT 'provider', p.name, {sign}
+        FROM {rows} r
+        CROSS JOIN LATERAL (VALUES
+            ('seekstreaming', r.seekstreaming_id),
+            ('doodstream', r.doodstream_id),
+            ('lulustream', r.lulustream_id),
+            ('bunny', r.bunny_guid)
+        ) AS p(name, remote_id)
+        WHERE p.remote_id IS NOT NULL
+    """
+
+
+def counter_upsert(facts_sql):
+    """Fold facts into video_counters; rows are locked in (kind, key) order to avoid deadlocks."""
+    return f"""
+        INSERT INTO video_counters (kind, key, count)
+        SELECT kind, key, SUM(delta)
+        FROM ({facts_sql}) AS facts
+        GROUP BY kind, key
+        HAVING SUM(delta) <> 0
+        ORDER BY kind, key
+        ON CONFLICT (kind, key) DO UPDATE SET count = video_counters.count + EXCLUDED.count
+    """
+
+
+# Recompute video_counters from scratch. Writers are blocked until commit so
+# no change slips between the count and the triggers.
+SEED_COUNTERS_SQL = [
+    "LOCK TABLE videos IN SHARE ROW EXCLUSIVE MODE",
+    "DELETE FROM video_counters",
+    counter_upsert(counter_facts('videos', 1)),
+]
+
+
+# Recompute video_counters over both the live and the archived rows (see migration 7)
+SEED_ALL_COUNTERS_SQL = [
+    "LOCK TABLE videos, videos_archive IN SHARE ROW EXCLUSIVE MODE",
+    "DELETE FROM video_counters",
+    counter_upsert(counter_facts('videos', 1) + ' UNION ALL ' + counter_facts('videos_archive', 1)),
+]
+
+
+def counters_trigger_sql(truncate_sql):
+    """
+    Statement-level trigger keeping video_counters in sync with videos.
+    Uses transition tables, so a multi-row UPDATE costs one upsert, and rows whose
+    status/provider IDs did not change cancel out (+1/-1) without touching the counters.
+    """
+    return f"""
+    CREATE OR REPLACE FUNCTION video_counters_sync() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            {counter_upsert(counter_facts('new_rows', 1))};
+        ELSIF TG_OP = 'DELETE' THEN
+            {counter_upsert(counter_facts('old_rows', -1))};
+        ELSIF TG_OP = 'UPDATE' THEN
+            {counter_upsert(counter_facts('new_rows', 1) + ' UNION ALL ' + counter_facts('old_rows', -1))};
+        ELSIF TG_OP = 'TRUNCATE' THEN
+            {truncate_sql}
+        END IF;
+        RETURN NULL;
+    END
+    $$
+"""
+
+
+VIDEO_COUNTERS_TRIGGER_SQL = counters_trigger_sql("DELETE FROM video_counters;")
+
+# Once rows can live in videos_archive, truncating one table recounts the other
+ARCHIVE_COUNTERS_TRIGGER_SQL = counters_trigger_sql(
+    "DELETE FROM video_counters;\n            "
+    + counter_upsert(counter_facts('videos', 1) + ' UNION ALL ' + counter_facts('videos_archive', 1)) + ";"
+)
+
+
+# LISTEN/NOTIFY channel carrying status changes (see status_listener.py)
+STATUS_CHANNEL = 'video_status'
+
+
+def notify_payload(facts_sql, completed_sql):
+    """
+    SQL building the NOTIFY payload for one statement: the current value of every
+    counter the statement changed (read back from video_counters, so applying them
+    in commit order is exact) and the IDs of up to 50 rows that just became COMPLETED.
+    """
+    return f"""
+        SELECT jsonb_build_object(
+            'counts', COALESCE((
+                SELECT jsonb_agg(jsonb_build_array(c.kind, c.key, c.count))
+                FROM video_counters c
+                JOIN (
+                    SELECT kind, key FROM ({facts_sql}) AS facts
+                    GROUP BY kind, key
+                    HAVING SUM(delta) <> 0
+                ) AS touched USING (kind, key)
+            ), '[]'::jsonb),
+            'completed', COALESCE((
+                SELECT jsonb_agg(id) FROM ({completed_sql} LIMIT 50) AS done
+            ), '[]'::jsonb)
+        )
+    """
+
+
+# Statement-level trigger publishing status changes. Fires after the counters
+# trigger (triggers run in name order), and stays silent for statements that change
+# no counter and complete nothing, e.g. lease renewals.
+VIDEO_STATUS_NOTIFY_SQL = f"""
+    CREATE OR REPLACE FUNCTION video_status_notify() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        payload jsonb;
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            {notify_payload(counter_facts('new_rows', 1),
+                            "SELECT id FROM new_rows WHERE status = 'COMPLETED'")} INTO payload;
+        ELSIF TG_OP = 'DELETE' THEN
+            {notify_payload(counter_facts('old_rows', -1),
+                            "SELECT NULL::int AS id WHERE FALSE")} INTO payload;
+        ELSIF TG_OP = 'UPDATE' THEN
+            {notify_payload(counter_facts('new_rows', 1) + ' UNION ALL ' + counter_facts('old_rows', -1),
+                            "SELECT n.id FROM new_rows n JOIN old_rows o ON o.id = n.id "
+                            "WHERE n.status = 'COMPLETED' AND o.status IS DISTINCT FROM 'COMPLETED'")} INTO payload;
+        ELSE
+            PERFORM pg_notify('{STATUS_CHANNEL}', '{{"resync": true}}');
+            RETURN NULL;
+        END IF;
+        
+        IF payload->'counts' <> '[]'::jsonb OR payload->'completed' <> '[]'::jsonb THEN
+            PERFORM pg_notify('{STATUS_CHANNEL}', payload::text);
+        END IF;
+        RETURN NULL;
+    END
+    $$
+"""
+
+
+# Columns of videos as of migration 7, shared with videos_archive (which adds archived_at)
+VIDEO_COLUMNS_V7 = (
+    "id", "original_url", "status", "bunny_guid", "upload_provider", "upload_id",
+    "local_filename", "error_message", "created_at", "updated_at",
+    "doodstream_id", "seekstreaming_id", "lulustream_id", "title", "description",
+    "unique_id", "metadata_synced", "worker_id", "lease_expires_at",
+)
+
+
+# Fixed-width lookup key: md5 of the URL as a UUID (16 bytes, whatever the URL length).
+# Generated, so it is never written and always matches original_url.
+URL_HASH_COLUMN_SQL = "url_hash UUID GENERATED ALWAYS AS (md5(original_url)::uuid) STORED"
+
+# Columns exposed by videos_all from migration 10 on
+VIDEO_VIEW_COLUMNS_V10 = VIDEO_COLUMNS_V7 + ("url_hash",)
+
+# Failure history (migration 11), shared with videos_archive from migration 16 on
+VIDEO_COLUMNS_V16 = VIDEO_COLUMNS_V7 + ("error_class_id", "failure_count")
+VIDEO_VIEW_COLUMNS_V16 = VIDEO_VIEW_COLUMNS_V10 + ("error_class_id", "failure_count")
+
+# When a row last changed, for incremental exports
+CHANGED_AT_SQL = "COALESCE(updated_at, created_at)"
+
+
+def videos_all_view_sql(columns):
+    """Live and archived rows as one relation, with an `archived` flag."""
+    column_list = ", ".join(columns)
+    return f"""
+        CREATE OR REPLACE VIEW videos_all AS
+        SELECT {column_list}, FALSE AS archived FROM videos
+        UNION ALL
+        SELECT {column_list}, TRUE AS archived FROM videos_archive
+    """
+
+
+def table_triggers_sql(table, prefix, function, truncate=True):
+    """(Re)create the INSERT/UPDATE/DELETE(/TRUNCATE) statement triggers `prefix`_* on `table`."""
+    events = [
+        ("insert", "INSERT", "REFERENCING NEW TABLE AS new_rows"),
+        ("update", "UPDATE", "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+        ("delete", "DELETE", "REFERENCING OLD TABLE AS old_rows"),
+    ]
+    if truncate:
+        events.append(("truncate", "TRUNCATE", ""))
+    statements = []
+    for suffix, event, referencing in events:
+        statements.append(f"DROP TRIGGER IF EXISTS {prefix}_{suffix} ON {table}")
+        statements.append(f"""
+        CREATE TRIGGER {prefix}_{suffix} AFTER {event} ON {table}
+        {referencing}
+        FOR EACH STATEMENT EXECUTE FUNCTION {function}()
+        """)
+    return statements
+
+
+# Providers whose upload ID also lives in a videos column. video_uploads mirrors these
+# columns; hosts added later (upload_providers rows) exist only in video_uploads.
+LEGACY_PROVIDER_COLUMNS = (
+    ("seekstreaming", "seekstreaming_id"),
+    ("doodstream", "doodstream_id"),
+    ("lulustream", "lulustream_id"),
+    ("bunny", "bunny_guid"),
+)
+
+
+def legacy_upload_ids(row):
+    """VALUES list of (provider, remote_id) read from the legacy ID columns of `row`."""
+    values = ", ".join(f"('{name}', {row}.{column})" for name, column in LEGACY_PROVIDER_COLUMNS)
+    return f"(VALUES {values}) AS l(provider, remote_id)"
+
+
+def primary_done(row):
+    """True once `row` is live on the primary host (first half of MISSING_BACKUP_FILTER)."""
+    return f"({row}.seekstreaming_id IS NOT NULL OR {row}.status = 'COMPLETED')"
+
+
+def upload_counter_facts(rows, sign):
+    """(kind, key, delta) facts for video_uploads rows: 'uploaded' or 'missing' per provider."""
+    return f"""
+        SELECT CASE WHEN state = 'UPLOADED' THEN 'uploaded' ELSE 'missing' END AS kind,
+               provider AS key, {sign} AS delta
+        FROM {rows}
+    """
+
+
+# video_counters kinds derived from videos/videos_archive (the rest come from video_uploads)
+VIDEO_COUNTER_KINDS = "('total', 'status', 'provider')"
+
+# From migration 9 on, truncating videos must leave the upload counters alone
+VIDEO_COUNTERS_TRIGGER_SQL_V9 = counters_trigger_sql(
+    f"DELETE FROM video_counters WHERE kind IN {VIDEO_COUNTER_KINDS};\n            "
+    + counter_upsert(counter_facts('videos', 1) + ' UNION ALL ' + counter_facts('videos_archive', 1)) + ";"
+)
+
+# Per-provider 'uploaded'/'missing' counters, same statement-level scheme as videos
+UPLOAD_COUNTERS_TRIGGER_SQL = f"""
+    CREATE OR REPLACE FUNCTION video_upload_counters_sync() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            {counter_upsert(upload_counter_facts('new_rows', 1))};
+        ELSIF TG_OP = 'DELETE' THEN
+            {counter_upsert(upload_counter_facts('old_rows', -1))};
+        ELSIF TG_OP = 'UPDATE' THEN
+            {counter_upsert(upload_counter_facts('new_rows', 1) + ' UNION ALL ' + upload_counter_facts('old_rows', -1))};
+        ELSIF TG_OP = 'TRUNCATE' THEN
+            DELETE FROM video_counters WHERE kind IN ('uploaded', 'missing');
+        END IF;
+        RETURN NULL;
+    END
+    $$
+"""
+
+# Recompute every counter: videos, videos_archive and video_uploads (see migration 9)
+SEED_ALL_COUNTERS_SQL_V9 = [
+    "LOCK TABLE videos, videos_archive, video_uploads IN SHARE ROW EXCLUSIVE MODE",
+    "DELETE FROM video_counters",
+    counter_upsert(counter_facts('videos', 1) + ' UNION ALL ' + counter_facts('videos_archive', 1)),
+    counter_upsert(upload_counter_facts('video_uploads', 1)),
+]
+
+# Row-level trigger keeping video_uploads in step with videos and videos_archive:
+# - legacy ID columns are upserted as UPLOADED rows (and dropped when cleared),
+# - a video live on the primary host gets a PENDING row on every backup provider,
+# - rows deleted for good (not just moved to/from the archive) lose their uploads.
+VIDEO_UPLOADS_SYNC_SQL = f"""
+    CREATE OR REPLACE FUNCTION video_uploads_sync() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'TRUNCATE' THEN
+            DELETE FROM video_uploads u
+            WHERE NOT EXISTS (SELECT 1 FROM videos v WHERE v.id = u.video_id)
+              AND NOT EXISTS (SELECT 1 FROM videos_archive a WHERE a.id = u.video_id);
+            RETURN NULL;
+        ELSIF TG_OP = 'DELETE' THEN
+            -- Fires at the end of the statement, so a row moved by archive_completed
+            -- or _restore_archived is already in the other table
+            IF NOT EXISTS (SELECT 1 FROM videos WHERE id = OLD.id)
+               AND NOT EXISTS (SELECT 1 FROM videos_archive WHERE id = OLD.id) THEN
+                DELETE FROM video_uploads WHERE video_id = OLD.id;
+            END IF;
+            RETURN NULL;
+        END IF;
+
+        INSERT INTO video_uploads (video_id, provider, remote_id, state, uploaded_at)
+        SELECT NEW.id, l.provider, l.remote_id, 'UPLOADED', CURRENT_TIMESTAMP
+        FROM {legacy_upload_ids('NEW')}
+        WHERE l.remote_id IS NOT NULL
+        ON CONFLICT (video_id, provider) DO UPDATE
+        SET remote_id = EXCLUDED.remote_id, state = 'UPLOADED', uploaded_at = EXCLUDED.uploaded_at
+        WHERE video_uploads.state <> 'UPLOADED' OR video_uploads.remote_id IS DISTINCT FROM EXCLUDED.remote_id;
+
+        DELETE FROM video_uploads u
+        USING {legacy_upload_ids('NEW')}
+        WHERE u.video_id = NEW.id AND u.provider = l.provider
+          AND l.remote_id IS NULL AND u.state = 'UPLOADED';
+
+        IF {primary_done('NEW')} THEN
+            INSERT INTO video_uploads (video_id, provider, state)
+            SELECT NEW.id, p.name, 'PENDING' FROM upload_providers p WHERE p.is_backup
+            ON CONFLICT (video_id, provider) DO NOTHING;
+        ELSE
+            DELETE FROM video_uploads WHERE video_id = NEW.id AND state = 'PENDING';
+        END IF;
+        RETURN NULL;
+    END
+    $$
+"""
+
+
+# Fill video_uploads from the legacy columns of videos_all (migration 9, verify_query_plans.py)
+VIDEO_UPLOADS_BACKFILL_SQL = [
+    f"""
+    INSERT INTO video_uploads (video_id, provider, remote_id, state, uploaded_at)
+    SELECT v.id, l.provider, l.remote_id, 'UPLOADED', v.updated_at
+    FROM videos_all v
+    CROSS JOIN LATERAL {legacy_upload_ids('v')}
+    WHERE l.remote_id IS NOT NULL
+    ON CONFLICT (video_id, provider) DO NOTHING
+    """,
+    f"""
+    INSERT INTO video_uploads (video_id, provider, state)
+    SELECT v.id, p.name, 'PENDING'
+    FROM videos_all v
+    JOIN upload_providers p ON p.is_backup
+    WHERE {primary_done('v')}
+    ON CONFLICT (video_id, provider) DO NOTHING
+    """,
+]
+
+
+def uploads_sync_triggers_sql(table):
+    """
+    (Re)create the `table`_uploads_* triggers running video_uploads_sync(). The WHEN
+    clauses skip every write that changes neither an ID column nor COMPLETED-ness
+    (stage updates, lease renewals), so the hot path pays nothing.
+    """
+    columns = [column for _, column in LEGACY_PROVIDER_COLUMNS]
+    inserted = " OR ".join(["NEW.status = 'COMPLETED'"] + [f"NEW.{column} IS NOT NULL" for column in columns])
+    changed = " OR ".join(
+        ["(OLD.status = 'COMPLETED') IS DISTINCT FROM (NEW.status = 'COMPLETED')"]
+        + [f"OLD.{column} IS DISTINCT FROM NEW.{column}" for column in columns]
+    )
+    triggers = [
+        ("insert", "INSERT", "FOR EACH ROW", f"WHEN ({inserted})"),
+        ("update", f"UPDATE OF status, {', '.join(columns)}", "FOR EACH ROW", f"WHEN ({changed})"),
+        ("delete", "DELETE", "FOR EACH ROW", ""),
+        ("truncate", "TRUNCATE", "FOR EACH STATEMENT", ""),
+    ]
+    statements = []
+    for suffix, event, level, when in triggers:
+        statements.append(f"DROP TRIGGER IF EXISTS {table}_uploads_{suffix} ON {table}")
+        statements.append(f"""
+        CREATE TRIGGER {table}_uploads_{suffix} AFTER {event} ON {table}
+        {level} {when}
+        EXECUTE FUNCTION video_uploads_sync()
+        """)
+    return statements
+
+
+# Result of the stage functions: `applied` and the job record (BaseStorage.JOB_COLUMNS).
+# No row means the video is not stored; applied = FALSE that its current status does
+# not allow the transition (the record is returned unchanged).
+STAGE_RESULT_SQL = (
+    "applied BOOLEAN, status TEXT, upload_provider TEXT, upload_id TEXT, "
+    "doodstream_id TEXT, seekstreaming_id TEXT, lulustream_id TEXT, bunny_guid TEXT"
+)
+STAGE_RECORD_SQL = "v.status, v.upload_provider, v.upload_id, v.doodstream_id, v.seekstreaming_id, v.lulustream_id, v.bunny_guid"
+
+# Pipeline stage -> statuses it may be entered from (BaseStorage.STAGE_TRANSITIONS)
+STAGE_FROM_SQL = """CASE p_stage
+            WHEN 'EXTRACTING' THEN ARRAY['PENDING', 'FAILED', 'CLAIMED', 'EXTRACTING', 'COMPLETED']
+            WHEN 'DOWNLOADING' THEN ARRAY['EXTRACTING', 'DOWNLOADING']
+            WHEN 'UPLOADING' THEN ARRAY['DOWNLOADING', 'UPLOADING']
+        END"""
+
+# Pipeline stage -> further statuses it may be entered from once the primary upload
+# exists (BaseStorage.PRIMARY_STAGE_TRANSITIONS, migration 15)
+PRIMARY_STAGE_FROM_SQL = """CASE p_stage
+            WHEN 'UPLOADING' THEN ARRAY['COMPLETED']
+        END"""
+
+
+def stage_column_sql(column):
+    """SET expression taking `column` from p_fields when the caller passed it."""
+    return f"{column} = CASE WHEN p_fields ? '{column}' THEN p_fields->>'{column}' ELSE v.{column} END"
+
+
+def restore_archived_function_sql(columns):
+    """restore_archived_video() SQL function, moving `columns` of an archived video back."""
+    column_list = ", ".join(columns)
+    return f"""
+CREATE OR REPLACE FUNCTION restore_archived_video(p_hash UUID) RETURNS BOOLEAN
+LANGUAGE plpgsql AS $$
+BEGIN
+    WITH restored AS (
+        DELETE FROM videos_archive WHERE url_hash = p_hash
+        RETURNING {column_list}
+    )
+    INSERT INTO videos ({column_list})
+    SELECT {column_list} FROM restored
+    ON CONFLICT (url_hash) DO NOTHING;
+    RETURN FOUND;
+END
+$$
+"""
+
+
+def start_stage_function_sql(primary_stage_from_sql="NULL"):
+    """
+    start_stage() SQL function. Migration 13 created it without the transitions that
+    need the primary upload (primary_stage_from_sql NULL); migration 15 adds them.
+    """
+    return f"""
+CREATE OR REPLACE FUNCTION start_stage(p_url TEXT, p_stage TEXT, p_fields JSONB DEFAULT '{{}}')
+RETURNS TABLE ({STAGE_RESULT_SQL})
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_hash UUID := md5(p_url)::uuid;
+    v_from TEXT[] := {STAGE_FROM_SQL};
+    v_primary_from TEXT[] := {primary_stage_from_sql};
+    v_status TEXT;
+    v_primary TEXT;
+BEGIN
+    IF v_from IS NULL THEN
+        RAISE EXCEPTION 'Unknown pipeline stage: %', p_stage USING ERRCODE = 'invalid_parameter_value';
+    END IF;
+
+    SELECT v.status, v.seekstreaming_id INTO v_status, v_primary FROM videos v WHERE v.url_hash = v_hash FOR UPDATE;
+    IF NOT FOUND THEN
+        -- Archived videos come back; new ones are inserted by their first stage
+        IF NOT restore_archived_video(v_hash) THEN
+            IF p_stage <> 'EXTRACTING' OR EXISTS (SELECT 1 FROM dead_letters d WHERE d.url_hash = v_hash) THEN
+                RETURN;
+            END IF;
+            INSERT INTO videos (original_url, status, unique_id, created_at)
+            VALUES (p_url, 'PENDING', replace(gen_random_uuid()::text, '-', ''), CURRENT_TIMESTAMP)
+            ON CONFLICT (url_hash) DO NOTHING;
+        END IF;
+        SELECT v.status, v.seekstreaming_id INTO v_status, v_primary FROM videos v WHERE v.url_hash = v_hash FOR UPDATE;
+        IF NOT FOUND THEN
+            RETURN;
+        END IF;
+    END IF;
+
+    IF NOT (COALESCE(v_status, 'PENDING') = ANY (v_from)
+            OR (v_primary IS NOT NULL AND COALESCE(v_status = ANY (v_primary_from), FALSE))) THEN
+        RETURN QUERY SELECT FALSE, {STAGE_RECORD_SQL} FROM videos v WHERE v.url_hash = v_hash;
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    UPDATE videos v
+    SET status = p_stage,
+        {stage_column_sql("upload_provider")},
+        {stage_column_sql("local_filename")},
+        {stage_column_sql("title")},
+        {stage_column_sql("description")},
+        {stage_column_sql("unique_id")},
+        updated_at = CURRENT_TIMESTAMP
+    WHERE v.url_hash = v_hash
+    RETURNING TRUE, {STAGE_RECORD_SQL};
+END
+$$
+"""
+
+
+# One round trip per pipeline step (SupabaseManager.start_stage, record_upload and
+# save_successful_upload): validate, move an archived video back, write, and return
+# the job record. Rows are locked before the check, so two workers cannot both pass it.
+STAGE_FUNCTIONS_SQL = [
+    restore_archived_function_sql(VIDEO_COLUMNS_V7),
+    start_stage_function_sql(),
+    f"""
+    CREATE OR REPLACE FUNCTION record_provider_upload(
+        p_url TEXT, p_provider TEXT, p_remote_id TEXT, p_bytes BIGINT DEFAULT NULL, p_status TEXT DEFAULT NULL
+    )
+    RETURNS TABLE ({STAGE_RESULT_SQL})
+    LANGUAGE plpgsql AS $$
+    #variable_conflict use_column
+    DECLARE
+        v_hash UUID := md5(p_url)::uuid;
+        v_id INTEGER;
+        v_primary TEXT;
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM upload_providers p WHERE p.name = p_provider) THEN
+            RAISE EXCEPTION 'Unknown upload provider: %', p_provider USING ERRCODE = 'invalid_parameter_value';
+        END IF;
+        IF COALESCE(p_remote_id, '') = '' THEN
+            RAISE EXCEPTION 'Empty % upload ID', p_provider USING ERRCODE = 'invalid_parameter_value';
+        END IF;
+
+        SELECT v.id, v.seekstreaming_id INTO v_id, v_primary FROM videos v WHERE v.url_hash = v_hash FOR UPDATE;
+        IF NOT FOUND THEN
+            IF NOT restore_archived_video(v_hash) THEN
+                RETURN;
+            END IF;
+            SELECT v.id, v.seekstreaming_id INTO v_id, v_primary FROM videos v WHERE v.url_hash = v_hash FOR UPDATE;
+        END IF;
+
+        -- COMPLETED means live on the primary host
+        IF p_status = 'COMPLETED' AND p_provider <> 'seekstreaming' AND v_primary IS NULL THEN
+            RETURN QUERY SELECT FALSE, {STAGE_RECORD_SQL} FROM videos v WHERE v.id = v_id;
+            RETURN;
+        END IF;
+
+        RETURN QUERY
+        UPDATE videos v
+        SET seekstreaming_id = CASE WHEN p_provider = 'seekstreaming' THEN p_remote_id ELSE v.seekstreaming_id END,
+            doodstream_id = CASE WHEN p_provider = 'doodstream' THEN p_remote_id ELSE v.doodstream_id END,
+            lulustream_id = CASE WHEN p_provider = 'lulustream' THEN p_remote_id ELSE v.lulustream_id END,
+            bunny_guid = CASE WHEN p_provider = 'bunny' THEN p_remote_id ELSE v.bunny_guid END,
+            status = COALESCE(p_status, v.status),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE v.id = v_id
+        RETURNING TRUE, {STAGE_RECORD_SQL};
+
+        INSERT INTO video_uploads (video_id, provider, remote_id, state, bytes, uploaded_at)
+        VALUES (v_id, p_provider, p_remote_id, 'UPLOADED', p_bytes, CURRENT_TIMESTAMP)
+        ON CONFLICT (video_id, provider) DO UPDATE
+        SET remote_id = EXCLUDED.remote_id, state = 'UPLOADED',
+            bytes = COALESCE(EXCLUDED.bytes, video_uploads.bytes),
+            uploaded_at = CASE
+                WHEN video_uploads.state = 'UPLOADED'
+                 AND video_uploads.remote_id IS NOT DISTINCT FROM EXCLUDED.remote_id
+                THEN video_uploads.uploaded_at ELSE EXCLUDED.uploaded_at
+            END;
+    END
+    $$
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION finish_video(
+        p_url TEXT, p_title TEXT, p_seek_id TEXT, p_dood_id TEXT, p_lulu_id TEXT
+    )
+    RETURNS TABLE ({STAGE_RESULT_SQL})
+    LANGUAGE plpgsql AS $$
+    #variable_conflict use_column
+    DECLARE
+        v_hash UUID := md5(p_url)::uuid;
+    BEGIN
+        -- COMPLETED means live on the primary host
+        IF COALESCE(p_seek_id, '') = '' THEN
+            RETURN QUERY SELECT FALSE, {STAGE_RECORD_SQL} FROM videos_all v WHERE v.url_hash = v_hash;
+            RETURN;
+        END IF;
+
+        PERFORM restore_archived_video(v_hash);
+        -- A success supersedes an earlier give-up
+        DELETE FROM dead_letters d WHERE d.url_hash = v_hash;
+
+        RETURN QUERY
+        INSERT INTO videos AS v (
+            original_url, title, status, upload_provider, upload_id,
+            seekstreaming_id, doodstream_id, lulustream_id, updated_at
+        )
+        VALUES (p_url, p_title, 'COMPLETED', 'seekstreaming', p_seek_id, p_seek_id, p_dood_id, p_lulu_id, CURRENT_TIMESTAMP)
+        ON CONFLICT (url_hash) DO UPDATE SET
+            title = EXCLUDED.title,
+            status = EXCLUDED.status,
+            upload_provider = EXCLUDED.upload_provider,
+            upload_id = EXCLUDED.upload_id,
+            seekstreaming_id = EXCLUDED.seekstreaming_id,
+            doodstream_id = EXCLUDED.doodstream_id,
+            lulustream_id = EXCLUDED.lulustream_id,
+            worker_id = NULL,
+            lease_expires_at = NULL,
+            updated_at = EXCLUDED.updated_at
+        RETURNING TRUE, {STAGE_RECORD_SQL};
+    END
+    $$
+    """,
+]
+
+MIGRATIONS = [
+    (1, "create_videos_table", [
+        """
+        CREATE TABLE IF NOT EXISTS videos (
+            id SERIAL PRIMARY KEY,
+            original_url TEXT UNIQUE NOT NULL,
+            status TEXT DEFAULT 'PENDING',
+            bunny_guid TEXT,
+            upload_provider TEXT,
+            upload_id TEXT,
+            local_filename TEXT,
+            error_message TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP
+        )
+        """,
+        """
+        ALTER TABLE videos
+        ADD COLUMN IF NOT EXISTS upload_provider TEXT,
+        ADD COLUMN IF NOT EXISTS upload_id TEXT,
+        ADD COLUMN IF NOT EXISTS doodstream_id TEXT,
+        ADD COLUMN IF NOT EXISTS seekstreaming_id TEXT,
+        ADD COLUMN IF NOT EXISTS lulustream_id TEXT,
+        ADD COLUMN IF NOT EXISTS title TEXT,
+        ADD COLUMN IF NOT EXISTS description TEXT,
+        ADD COLUMN IF NOT EXISTS unique_id TEXT,
+        ADD COLUMN IF NOT EXISTS metadata_synced BOOLEAN DEFAULT FALSE
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_status ON videos(status)",
+        "CREATE INDEX IF NOT EXISTS idx_created_at ON videos(created_at)",
+    ]),
+
+    (2, "backfill_legacy_provider_ids", [
+        # Migrate any old streamwish entries to seekstreaming
+        "UPDATE videos SET upload_provider = 'seekstreaming' WHERE upload_provider = 'streamwish'",
+        # Copy old upload_id values to their respective provider-specific columns
+        """
+        UPDATE videos SET doodstream_id = upload_id
+        WHERE upload_provider = 'doodstream' AND doodstream_id IS NULL AND upload_id IS NOT NULL
+        """,
+        """
+        UPDATE videos SET seekstreaming_id = upload_id
+        WHERE upload_provider = 'seekstreaming' AND seekstreaming_id IS NULL AND upload_id IS NOT NULL
+        """,
+        """
+        UPDATE videos SET lulustream_id = upload_id
+        WHERE upload_provider = 'lulustream' AND lulustream_id IS NULL AND upload_id IS NOT NULL
+        """,
+        """
+        UPDATE videos SET bunny_guid = upload_id
+        WHERE upload_provider = 'bunny' AND bunny_guid IS NULL AND upload_id IS NOT NULL
+        """,
+        # Any video with seekstreaming_id is COMPLETED
+        "UPDATE videos SET status = 'COMPLETED' WHERE seekstreaming_id IS NOT NULL AND status != 'COMPLETED'",
+    ]),
+
+    (3, "job_leases", [
+        """
+        ALTER TABLE videos
+        ADD COLUMN IF NOT EXISTS worker_id TEXT,
+        ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP
+        """,
+    ]),
+
+    (4, "video_counters", [
+        """
+        CREATE TABLE IF NOT EXISTS video_counters (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            count BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (kind, key)
+        )
+        """,
+        VIDEO_COUNTERS_TRIGGER_SQL,
+        "DROP TRIGGER IF EXISTS videos_counters_insert ON videos",
+        "DROP TRIGGER IF EXISTS videos_counters_update ON videos",
+        "DROP TRIGGER IF EXISTS videos_counters_delete ON videos",
+        "DROP TRIGGER IF EXISTS videos_counters_truncate ON videos",
+        """
+        CREATE TRIGGER videos_counters_insert AFTER INSERT ON videos
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION video_counters_sync()
+        """,
+        """
+        CREATE TRIGGER videos_counters_update AFTER UPDATE ON videos
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION video_counters_sync()
+        """,
+        """
+        CREATE TRIGGER videos_counters_delete AFTER DELETE ON videos
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION video_counters_sync()
+        """,
+        """
+        CREATE TRIGGER videos_counters_truncate AFTER TRUNCATE ON videos
+        FOR EACH STATEMENT EXECUTE FUNCTION video_counters_sync()
+        """,
+        *SEED_COUNTERS_SQL,
+    ]),
+
+    # Partial indexes matched to the hot queries in SupabaseManager. Each one only
+    # holds the rows its query can return, so it stays small as COMPLETED rows pile up.
+    # Keyset iterators order by (created_at, id); INCLUDE (original_url) lets the
+    # URL-only iterators run as index-only scans. Check with verify_query_plans.py.
+    (5, "hot_path_indexes", [
+        # Upload queue (_pending_filter): implied by every provider's filter
+        """
+        CREATE INDEX IF NOT EXISTS idx_videos_queue
+        ON videos (created_at, id) INCLUDE (original_url)
+        WHERE status IN ('PENDING', 'FAILED')
+        """,
+        # Backup queue (MISSING_BACKUP_FILTER)
+        """
+        CREATE INDEX IF NOT EXISTS idx_videos_missing_backup
+        ON videos (created_at, id) INCLUDE (original_url)
+        WHERE (seekstreaming_id IS NOT NULL OR status = 'COMPLETED')
+          AND (doodstream_id IS NULL OR lulustream_id IS NULL)
+        """,
+        # Metadata backfill (UNSYNCED_METADATA_FILTER)
+        """
+        CREATE INDEX IF NOT EXISTS idx_videos_unsynced_metadata
+        ON videos (created_at, id)
+        WHERE status = 'COMPLETED' AND (metadata_synced IS NULL OR metadata_synced = FALSE)
+        """,
+        # Dashboard feed (get_recent_videos)
+        """
+        CREATE INDEX IF NOT EXISTS idx_videos_recent_completed
+        ON videos (updated_at DESC NULLS LAST)
+        WHERE status = 'COMPLETED'
+        """,
+        # Lease renewal/reclaim and stale reset (IN_FLIGHT_STATUSES)
+        """
+        CREATE INDEX IF NOT EXISTS idx_videos_in_flight
+        ON videos (worker_id, lease_expires_at)
+        WHERE status IN ('CLAIMED', 'EXTRACTING', 'DOWNLOADING', 'UPLOADING')
+        """,
+        "ANALYZE videos",
+    ]),
+
+    (6, "status_notify", [
+        VIDEO_STATUS_NOTIFY_SQL,
+        "DROP TRIGGER IF EXISTS videos_notify_insert ON videos",
+        "DROP TRIGGER IF EXISTS videos_notify_update ON videos",
+        "DROP TRIGGER IF EXISTS videos_notify_delete ON videos",
+        "DROP TRIGGER IF EXISTS videos_notify_truncate ON videos",
+        """
+        CREATE TRIGGER videos_notify_insert AFTER INSERT ON videos
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION video_status_notify()
+        """,
+        """
+        CREATE TRIGGER videos_notify_update AFTER UPDATE ON videos
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION video_status_notify()
+        """,
+        """
+        CREATE TRIGGER videos_notify_delete AFTER DELETE ON videos
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION video_status_notify()
+        """,
+        """
+        CREATE TRIGGER videos_notify_truncate AFTER TRUNCATE ON videos
+        FOR EACH STATEMENT EXECUTE FUNCTION video_status_notify()
+        """,
+    ]),
+
+    # Archive for finished videos (SupabaseManager.archive_completed). Rows keep their
+    # id and columns; original_url stays unique across both tables because every
+    # insert path skips archived URLs and every write to one moves it back first.
+    # A migration adding a column to videos must add it here too and recreate videos_all.
+    (7, "completed_archive", [
+        "CREATE TABLE IF NOT EXISTS videos_archive (LIKE videos INCLUDING DEFAULTS)",
+        "ALTER TABLE videos_archive ALTER COLUMN id DROP DEFAULT",
+        "ALTER TABLE videos_archive ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_videos_archive_id ON videos_archive (id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_videos_archive_url ON videos_archive (original_url)",
+        # Keyset iteration over videos_all (iter_provider_uploads)
+        "CREATE INDEX IF NOT EXISTS idx_videos_archive_created ON videos_archive (created_at, id)",
+        # Dashboard feed: merged with idx_videos_recent_completed through videos_all
+        """
+        CREATE INDEX IF NOT EXISTS idx_videos_archive_recent_completed
+        ON videos_archive (updated_at DESC NULLS LAST)
+        WHERE status = 'COMPLETED'
+        """,
+        videos_all_view_sql(VIDEO_COLUMNS_V7),
+        ARCHIVE_COUNTERS_TRIGGER_SQL,
+        *table_triggers_sql("videos_archive", "videos_archive_counters", "video_counters_sync"),
+        *table_triggers_sql("videos_archive", "videos_archive_notify", "video_status_notify"),
+    ]),
+
+    # One row per processing attempt (core.attempts.AttemptRecorder). Stages are a
+    # JSONB array of {stage, provider, seconds, bytes, ok}, written in one INSERT
+    # when the attempt ends. Not tied to videos: history outlives deletes and archival.
+    (8, "video_attempts", [
+        """
+        CREATE TABLE IF NOT EXISTS video_attempts (
+            id BIGSERIAL PRIMARY KEY,
+            video_url TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            worker_id TEXT,
+            domain TEXT,
+            extractor TEXT,
+            outcome TEXT,
+            error_message TEXT,
+            started_at TIMESTAMP NOT NULL,
+            finished_at TIMESTAMP,
+            duration_seconds DOUBLE PRECISION,
+            bytes_downloaded BIGINT,
+            bytes_uploaded BIGINT,
+            stages JSONB NOT NULL DEFAULT '[]'::jsonb
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_video_attempts_started ON video_attempts (started_at)",
+        "CREATE INDEX IF NOT EXISTS idx_video_attempts_url ON video_attempts (video_url)",
+    ]),
+
+    # One row per (video, provider), the data-driven replacement for the per-provider
+    # ID columns: a new host is an upload_providers row, not a schema change. Backup
+    # hosts (is_backup) get a PENDING row for every video live on the primary host, so
+    # "missing on X" and per-provider counts are index/counter reads. The legacy
+    # columns stay authoritative for their four providers and are mirrored by trigger.
+    (9, "video_uploads", [
+        """
+        CREATE TABLE IF NOT EXISTS upload_providers (
+            name TEXT PRIMARY KEY,
+            is_backup BOOLEAN NOT NULL DEFAULT FALSE,
+            added_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        INSERT INTO upload_providers (name, is_backup) VALUES
+            ('seekstreaming', FALSE), ('doodstream', TRUE), ('lulustream', TRUE), ('bunny', FALSE)
+        ON CONFLICT (name) DO NOTHING
+        """,
+        # video_id is videos.id or videos_archive.id (no FK: rows move between the two)
+        """
+        CREATE TABLE IF NOT EXISTS video_uploads (
+            video_id INTEGER NOT NULL,
+            provider TEXT NOT NULL REFERENCES upload_providers (name) ON UPDATE CASCADE,
+            remote_id TEXT,
+            state TEXT NOT NULL DEFAULT 'PENDING',
+            bytes BIGINT,
+            uploaded_at TIMESTAMP,
+            PRIMARY KEY (video_id, provider)
+        )
+        """,
+        # Missing on one provider (iter_missing_provider_uploads)
+        """
+        CREATE INDEX IF NOT EXISTS idx_video_uploads_missing
+        ON video_uploads (provider, video_id)
+        WHERE state <> 'UPLOADED'
+        """,
+        # Uploaded on one provider (iter_provider_uploads, get_stats(provider))
+        """
+        CREATE INDEX IF NOT EXISTS idx_video_uploads_uploaded
+        ON video_uploads (provider, video_id) INCLUDE (remote_id)
+        WHERE state = 'UPLOADED'
+        """,
+        VIDEO_COUNTERS_TRIGGER_SQL_V9,
+        UPLOAD_COUNTERS_TRIGGER_SQL,
+        *table_triggers_sql("video_uploads", "video_uploads_counters", "video_upload_counters_sync"),
+        VIDEO_UPLOADS_SYNC_SQL,
+        *uploads_sync_triggers_sql("videos"),
+        *uploads_sync_triggers_sql("videos_archive"),
+        # The triggers above keep it current from here on (writers are blocked by
+        # the CREATE TRIGGER locks until this transaction commits)
+        *VIDEO_UPLOADS_BACKFILL_SQL,
+        "ANALYZE video_uploads",
+    ]),
+
+    # Every per-video query used to probe the unique B-tree on original_url, whose
+    # keys are whole URLs. url_hash is a generated 16-byte key with its own unique
+    # index; lookups and ON CONFLICT go through it and the wide URL indexes are
+    # dropped. Adding a stored column rewrites both tables once.
+    (10, "url_hash", [
+        f"ALTER TABLE videos ADD COLUMN IF NOT EXISTS {URL_HASH_COLUMN_SQL}",
+        f"ALTER TABLE videos_archive ADD COLUMN IF NOT EXISTS {URL_HASH_COLUMN_SQL}",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_videos_url_hash ON videos (url_hash)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_videos_archive_url_hash ON videos_archive (url_hash)",
+        "ALTER TABLE videos DROP CONSTRAINT IF EXISTS videos_original_url_key",
+        "DROP INDEX IF EXISTS idx_videos_archive_url",
+        # url_hash goes before the `archived` flag, which CREATE OR REPLACE cannot do
+        "DROP VIEW IF EXISTS videos_all",
+        videos_all_view_sql(VIDEO_VIEW_COLUMNS_V10),
+        "ANALYZE videos",
+        "ANALYZE videos_archive",
+    ]),
+
+    # Failures are fingerprinted into error_classes (one row per normalized message
+    # template, see core/fingerprint.py). Videos that failed permanently, or too
+    # often, leave the queue for dead_letters, which seeding consults so the
+    # harvester cannot re-queue them.
+    (11, "dead_letters", [
+        """
+        CREATE TABLE IF NOT EXISTS error_classes (
+            id SERIAL PRIMARY KEY,
+            fingerprint UUID NOT NULL UNIQUE,
+            template TEXT NOT NULL,
+            permanent BOOLEAN NOT NULL DEFAULT FALSE,
+            occurrences BIGINT NOT NULL DEFAULT 0,
+            first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        ALTER TABLE videos
+        ADD COLUMN IF NOT EXISTS error_class_id INTEGER REFERENCES error_classes (id),
+        ADD COLUMN IF NOT EXISTS failure_count INTEGER NOT NULL DEFAULT 0
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS dead_letters (
+            url_hash UUID PRIMARY KEY,
+            original_url TEXT NOT NULL,
+            error_class_id INTEGER REFERENCES error_classes (id),
+            failures INTEGER NOT NULL DEFAULT 1,
+            dead_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_dead_letters_class ON dead_letters (error_class_id)",
+    ]),
+
+    # Change-time watermark of incremental snapshot exports (export_snapshot.py).
+    # Freshly seeded rows have no updated_at, hence the COALESCE.
+    (12, "snapshot_changed_at", [
+        f"CREATE INDEX IF NOT EXISTS idx_videos_changed_at ON videos ({CHANGED_AT_SQL})",
+        f"CREATE INDEX IF NOT EXISTS idx_videos_archive_changed_at ON videos_archive ({CHANGED_AT_SQL})",
+    ]),
+
+    # Server-side stage transitions (STAGE_FUNCTIONS_SQL)
+    (13, "stage_functions", STAGE_FUNCTIONS_SQL),
+
+    # Per-site discovery progress (harvester.py): the listing page up to which a
+    # site has been crawled without gaps, and whether a crawl ever reached its end.
+    # Incremental runs stop once they only see known URLs, and resume an unfinished
+    # backfill past high_water_page.
+    (14, "harvest_marks", [
+        """
+        CREATE TABLE IF NOT EXISTS harvest_marks (
+            site TEXT PRIMARY KEY,
+            high_water_page INTEGER NOT NULL DEFAULT 0,
+            reached_end BOOLEAN NOT NULL DEFAULT FALSE,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+
+    # A backup host's upload may start from COMPLETED once the primary upload exists:
+    # a failed backup upload leaves the video COMPLETED (log_error), and the next
+    # backup host is still tried in the same run.
+    (15, "stage_from_completed", [start_stage_function_sql(PRIMARY_STAGE_FROM_SQL)]),
+
+    # Migration 11 added the failure history to videos only, so archiving a video
+    # and moving it back reset it. videos_archive gets the columns too, and they are
+    # copied both ways (ARCHIVE_COLUMNS, restore_archived_video) and shown by videos_all.
+    (16, "archive_failure_history", [
+        """
+        ALTER TABLE videos_archive
+        ADD COLUMN IF NOT EXISTS error_class_id INTEGER REFERENCES error_classes (id),
+        ADD COLUMN IF NOT EXISTS failure_count INTEGER NOT NULL DEFAULT 0
+        """,
+        # The new columns go before the `archived` flag, which CREATE OR REPLACE cannot do
+        "DROP VIEW IF EXISTS videos_all",
+        videos_all_view_sql(VIDEO_VIEW_COLUMNS_V16),
+        restore_archived_function_sql(VIDEO_COLUMNS_V16),
+    ]),
+]
+
+# pg_advisory_xact_lock key serialising migration runs across processes
+MIGRATION_LOCK_ID = 7_310_426_001
+
+# Schema version the code in this tree expects
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Migrations that enable optional read paths in SupabaseManager
+COUNTERS_VERSION = 4
+UPLOADS_VERSION = 9
+STAGE_FUNCTIONS_VERSION = 13
+
+# Columns copied between videos and videos_archive (url_hash is generated on both sides)
+ARCHIVE_COLUMNS = VIDEO_COLUMNS_V16
+
+# Columns of the videos_all view, minus its `archived` flag
+VIEW_COLUMNS = VIDEO_VIEW_COLUMNS_V16
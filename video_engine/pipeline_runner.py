@@ -7,37 +7,47 @@ Compatible with Supabase (PostgreSQL) for persistent state.
 """
 import sys
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import threading
 import time
 import uuid
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from config import MAX_WORKERS, MIN_FREE_DISK_GB, DEFAULT_MAX_PAGES
-from database_supabase import db
+from config import MAX_WORKERS, MIN_FREE_DISK_GB, DEFAULT_MAX_PAGES, WORKER_ID, JOB_LEASE_SECONDS
+from storage import db
 from core.logger import logger
+from core.attempts import AttemptRecorder, save_attempt
+from core.jobs import CachedJob
 from core.downloader import VideoDownloader
 from core.uploader import get_uploader
 from core.utils import cleanup_file, check_disk_space
 from extractors import get_extractor
 from core.exceptions import (
     PipelineException, ExtractionError, DownloadError, 
-    UploadError, DiskSpaceError
+    UploadError, DiskSpaceError, InvalidTransitionError
 )
 from harvester import harvest_and_save
 
 
-def process_video(url):
+def process_video(url, record=None):
     """
     Complete workflow for a single video with granular status tracking.
     Includes bulletproof cleanup even on failure.
+    Stage timings, bytes and the outcome are recorded in video_attempts.
+    
+    The row is read at most once (not at all when `record` is given) and kept in a
+    CachedJob that this function's own writes update.
     
     Args:
         url: Video page URL
+        record (dict, optional): Job record from claim_jobs(..., with_records=True)
     """
     filepath = None
     current_provider = None
+    attempt = None
+    job = CachedJob(db, url, record)
     
     try:
         # 1. Check if already processed or stop requested
@@ -46,26 +56,21 @@ def process_video(url):
             logger.info(f"Stop requested. Skipping {url}")
             return
             
-        # Get upload details from database
-        upload_details = db.get_all_upload_ids(url) or {}
-        
         # SeekStreaming is the primary compulsory provider, followed by backup hosts
         providers_to_upload = ['seekstreaming', 'doodstream', 'lulustream']
         
         # Check if SeekStreaming is already uploaded
-        seek_id = upload_details.get('seekstreaming_id')
+        seek_id = job.get('seekstreaming_id')
         if seek_id:
             logger.info(f"Skipping {url} (already COMPLETED on SeekStreaming: {seek_id})")
-            db.update_status(url, 'COMPLETED')
+            job.update_status('COMPLETED')
             return
             
         logger.info(f"Processing {url} for primary upload to SeekStreaming...")
+        attempt = AttemptRecorder(url, 'primary', worker_id=WORKER_ID).start()
         
         unique_id = str(uuid.uuid4())
         
-        if not upload_details:
-            db.insert_video(url)
-        
         # 2. Check disk space before proceeding
         if not check_disk_space(MIN_FREE_DISK_GB):
             logger.warning(f"Low disk space, pausing processing for {url}")
@@ -73,10 +78,12 @@ def process_video(url):
             if not check_disk_space(MIN_FREE_DISK_GB):
                 raise DiskSpaceError(f"Insufficient disk space (< {MIN_FREE_DISK_GB}GB)", url=url)
         
-        # 3. Extract video URL, title, and description
-        db.update_status(url, 'EXTRACTING')
-        extractor = get_extractor(url)
-        video_url, title, description = extractor.extract(url)
+        # 3. Extract video URL, title, and description (inserts the video if it is new)
+        job.start_stage('EXTRACTING')
+        with attempt.stage('extract'):
+            extractor = get_extractor(url)
+            attempt.extractor = type(extractor).__name__
+            video_url, title, description = extractor.extract(url)
         
         if not video_url:
             raise ExtractionError("Failed to extract video URL", url=url)
@@ -85,16 +92,20 @@ def process_video(url):
         title, description = clean_metadata(title, description)
             
         # Assign unique_id if not already assigned, save title/desc
-        db.update_status(url, 'EXTRACTING', title=title, description=description, unique_id=unique_id)
+        job.start_stage('EXTRACTING', title=title, description=description, unique_id=unique_id)
         
         # 4. Download
-        db.update_status(url, 'DOWNLOADING')
-        downloader = VideoDownloader()
-        filename, filepath = downloader.download(video_url, original_page_url=url)
+        job.start_stage('DOWNLOADING')
+        with attempt.stage('download') as stage:
+            downloader = VideoDownloader()
+            filename, filepath = downloader.download(video_url, original_page_url=url)
+            file_size = os.path.getsize(filepath)
+            stage['bytes'] = file_size
         
         # Validate video file before uploading
         from core.utils import validate_video_file
-        validate_video_file(filepath)
+        with attempt.stage('validate'):
+            validate_video_file(filepath)
         
         try:
             # 5. Upload to SeekStreaming (Primary) first, then backup hosts
@@ -104,24 +115,25 @@ def process_video(url):
             for provider in providers_to_upload:
                 prov_col = f"{provider}_id"
                 
-                # Re-fetch to handle concurrent runs or previous iterations
-                current_details = db.get_all_upload_ids(url) or {}
-                if current_details.get(prov_col):
-                    logger.info(f"Skipping {url} for {provider} (already uploaded with ID: {current_details[prov_col]})")
-                    provider_ids[provider] = current_details[prov_col]
+                # Served from the job cache: the lease makes this worker the only writer
+                if job.get(prov_col):
+                    logger.info(f"Skipping {url} for {provider} (already uploaded with ID: {job.get(prov_col)})")
+                    provider_ids[provider] = job.get(prov_col)
                     success_count += 1
                     continue
                     
                 logger.info(f"Uploading {url} to {provider}...")
-                db.update_status(url, 'UPLOADING', local_filename=filename, upload_provider=provider)
+                job.start_stage('UPLOADING', local_filename=filename, upload_provider=provider)
                 
                 try:
-                    uploader = get_uploader(provider=provider)
-                    video_title = title or filename
-                    upload_id = uploader.upload(video_title, filepath, description=description)
+                    with attempt.stage('upload', provider) as stage:
+                        uploader = get_uploader(provider=provider)
+                        video_title = title or filename
+                        upload_id = uploader.upload(video_title, filepath, description=description)
+                        stage['bytes'] = file_size
                     
-                    # Save this provider's ID to database immediately
-                    db.update_status(url, 'UPLOADING', **{prov_col: upload_id}, local_filename=filename, upload_provider=provider)
+                    # Save this provider's ID (and the uploaded size) to database immediately
+                    job.record_upload(provider, upload_id, size=file_size)
                     
                     provider_ids[provider] = upload_id
                     logger.info(f"SUCCESS: {url} -> {provider.upper()} ID: {upload_id}")
@@ -133,62 +145,81 @@ def process_video(url):
                         raise upload_err
                     else:
                         # Backup providers (doodstream/lulustream) failures are logged as warnings
-                        db.log_error(url, f"Backup upload to {provider} failed: {str(upload_err)}", provider=provider)
+                        job.log_error(f"Backup upload to {provider} failed: {str(upload_err)}", provider=provider)
             
             # 6. Final Status Evaluation
-            current_details = db.get_all_upload_ids(url) or {}
-            seek_upload_id = provider_ids.get('seekstreaming') or current_details.get('seekstreaming_id')
+            seek_upload_id = provider_ids.get('seekstreaming') or job.get('seekstreaming_id')
             
             if seek_upload_id:
-                db.save_successful_upload(
-                    url=url,
+                job.save_successful_upload(
                     title=title,
                     seek_id=seek_upload_id,
-                    dood_id=provider_ids.get('doodstream') or current_details.get('doodstream_id'),
-                    lulu_id=provider_ids.get('lulustream') or current_details.get('lulustream_id')
+                    dood_id=provider_ids.get('doodstream') or job.get('doodstream_id'),
+                    lulu_id=provider_ids.get('lulustream') or job.get('lulustream_id')
                 )
                 logger.info(f"✅ COMPLETED on SeekStreaming: {url} ({success_count}/{len(providers_to_upload)} platforms complete)")
+                attempt.finish('COMPLETED')
             else:
-                db.update_status(url, 'PENDING')
+                job.update_status('PENDING')
                 logger.warning(f"⚠️ SeekStreaming upload missing for {url}. Status set to PENDING.")
+                attempt.finish('PENDING')
         
         finally:
             # GUARANTEED cleanup (even if upload fails)
             cleanup_file(filepath)
     
+    except InvalidTransitionError as e:
+        # The video moved on without us (lease reclaimed, finished elsewhere): leave its row alone
+        if attempt:
+            attempt.finish('FAILED', e)
+        if filepath:
+            cleanup_file(filepath)
+    
     except PipelineException as e:
         # Already logged by exception __init__
-        db.log_error(url, str(e), provider=current_provider)
+        job.log_error(str(e), provider=current_provider)
+        if attempt:
+            attempt.finish('FAILED', e)
         if filepath:
             cleanup_file(filepath)
     
     except Exception as e:
         logger.error(f"FAILED: {url}")
         logger.error(f"   Error: {str(e)}")
-        db.log_error(url, str(e), provider=current_provider)
+        job.log_error(str(e), provider=current_provider)
+        if attempt:
+            attempt.finish('FAILED', e)
         
         # Cleanup on failure too
         if filepath:
             cleanup_file(filepath)
+    
+    finally:
+        save_attempt(db, attempt)
 
 
-def process_backup_video(url):
+def process_backup_video(url, record=None):
     """
     Backup upload workflow: Downloads video and uploads ONLY to missing backup platforms (DoodStream, LuluStream)
     for videos that are already COMPLETED on SeekStreaming.
+    
+    Args:
+        url: Video page URL
+        record (dict, optional): Job record from iter_missing_backup_videos(with_records=True)
     """
     filepath = None
+    attempt = None
+    job = CachedJob(db, url, record)
     try:
         import config
         if getattr(config, "STOP_PROCESSING", False):
             logger.info(f"Stop requested. Skipping backup for {url}")
             return
 
-        upload_details = db.get_all_upload_ids(url) or {}
         missing_providers = []
-        if not upload_details.get('doodstream_id'):
+        if not job.get('doodstream_id'):
             missing_providers.append('doodstream')
-        if not upload_details.get('lulustream_id'):
+        if not job.get('lulustream_id'):
             missing_providers.append('lulustream')
 
         if not missing_providers:
@@ -196,6 +227,7 @@ def process_backup_video(url):
             return
 
         logger.info(f"Processing backup uploads for {url} -> missing hosts: {missing_providers}")
+        attempt = AttemptRecorder(url, 'backup', worker_id=WORKER_ID).start()
 
         if not check_disk_space(MIN_FREE_DISK_GB):
             logger.warning(f"Low disk space, pausing backup processing for {url}")
@@ -203,8 +235,10 @@ def process_backup_video(url):
             if not check_disk_space(MIN_FREE_DISK_GB):
                 raise DiskSpaceError(f"Insufficient disk space (< {MIN_FREE_DISK_GB}GB)", url=url)
 
-        extractor = get_extractor(url)
-        video_url, title, description = extractor.extract(url)
+        with attempt.stage('extract'):
+            extractor = get_extractor(url)
+            attempt.extractor = type(extractor).__name__
+            video_url, title, description = extractor.extract(url)
 
         if not video_url:
             raise ExtractionError("Failed to extract video URL for backup upload", url=url)
@@ -212,30 +246,141 @@ def process_backup_video(url):
         from core.utils import clean_metadata
         title, description = clean_metadata(title, description)
 
-        downloader = VideoDownloader()
-        filename, filepath = downloader.download(video_url, original_page_url=url)
+        with attempt.stage('download') as stage:
+            downloader = VideoDownloader()
+            filename, filepath = downloader.download(video_url, original_page_url=url)
+            file_size = os.path.getsize(filepath)
+            stage['bytes'] = file_size
 
         from core.utils import validate_video_file
-        validate_video_file(filepath)
+        with attempt.stage('validate'):
+            validate_video_file(filepath)
 
         try:
             for provider in missing_providers:
                 logger.info(f"Uploading backup {url} to {provider}...")
-                uploader = get_uploader(provider=provider)
-                video_title = title or filename
-                upload_id = uploader.upload(video_title, filepath, description=description)
+                with attempt.stage('upload', provider) as stage:
+                    uploader = get_uploader(provider=provider)
+                    video_title = title or filename
+                    upload_id = uploader.upload(video_title, filepath, description=description)
+                    stage['bytes'] = file_size
 
-                prov_col = f"{provider}_id"
-                db.update_status(url, 'COMPLETED', **{prov_col: upload_id})
+                job.record_upload(provider, upload_id, size=file_size, status='COMPLETED')
                 logger.info(f"✅ BACKUP SUCCESS: {url} -> {provider.upper()} ID: {upload_id}")
+            attempt.finish('COMPLETED')
         finally:
             cleanup_file(filepath)
 
     except Exception as e:
         logger.error(f"Backup processing failed for {url}: {e}")
+        if attempt:
+            attempt.finish('FAILED', e)
         if filepath:
             cleanup_file(filepath)
 
+    finally:
+        save_attempt(db, attempt)
+
+
+class LeaseHeartbeat:
+    """
+    Background thread that keeps this worker's job leases alive and returns
+    jobs abandoned by crashed workers (expired leases) to the queue.
+    """
+    
+    def __init__(self, worker_id, lease_seconds):
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.interval = max(5, lease_seconds // 3)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                db.renew_leases(self.worker_id, self.lease_seconds)
+                db.reclaim_expired_leases()
+            except Exception as e:
+                logger.warning(f"[QUEUE] Lease heartbeat failed: {e}")
+    
+    def __enter__(self):
+        self._thread.start()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+
+def run_leased_processing(worker_fn, max_workers, current_provider=None, on_progress=None,
+                          worker_id=WORKER_ID, lease_seconds=JOB_LEASE_SECONDS):
+    """
+    Keep `max_workers` threads busy with jobs leased from the database queue.
+    
+    Jobs are claimed only when a thread is free, so nothing is read up front and
+    several processes/hosts can run this loop against the same database.
+    The claim returns each job's row, which is handed to the worker so it does not
+    read it again. Stops when the queue is empty or config.STOP_PROCESSING is set.
+    
+    Args:
+        worker_fn: Callable taking a URL and its job record (process_video)
+        max_workers: Number of concurrent worker threads
+        current_provider (str, optional): Passed to db.claim_jobs()
+        on_progress (callable, optional): Called with (completed, failed) after each job
+        worker_id: Lease owner identifier
+        lease_seconds: Lease duration (renewed by LeaseHeartbeat)
+    
+    Returns:
+        dict: {'completed': int, 'failed': int}
+    """
+    import config
+    
+    completed = 0
+    failed = 0
+    claimed = set()
+    
+    db.reclaim_expired_leases()
+    
+    with LeaseHeartbeat(worker_id, lease_seconds), ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        queue_empty = False
+        
+        while True:
+            stop_requested = getattr(config, "STOP_PROCESSING", False)
+            free_slots = max_workers - len(futures)
+            
+            if not stop_requested and not queue_empty and free_slots > 0:
+                records = db.claim_jobs(worker_id, limit=free_slots, lease_seconds=lease_seconds,
+                                        current_provider=current_provider, with_records=True)
+                if not records:
+                    queue_empty = True
+                for record in records:
+                    url = record['original_url']
+                    claimed.add(url)
+                    futures[executor.submit(worker_fn, url, record)] = url
+            
+            if not futures:
+                break
+            
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                url = futures.pop(future)
+                try:
+                    future.result()
+                    completed += 1
+                except Exception as e:
+                    logger.error(f"Unhandled error for {url}: {e}")
+                    failed += 1
+                
+                if on_progress:
+                    on_progress(completed, failed)
+    
+    # Jobs that returned early because of the stop request are still CLAIMED: hand them back
+    if getattr(config, "STOP_PROCESSING", False):
+        db.release_jobs(worker_id, claimed)
+    
+    return {'completed': completed, 'failed': failed}
+
 
 def phase_a_discovery(website_url, max_pages=None):
     """
@@ -283,42 +428,24 @@ def phase_b_processing(max_workers=None):
     logger.info("PHASE B: PROCESSING")
     logger.info("=" * 60)
     
-    # Reset stale statuses from previous crashes
+    # Reset stale statuses from previous crashes (live leases of other workers are kept)
     stale_count = db.reset_stale_statuses()
     if stale_count > 0:
         logger.info(f"♻️  Reset {stale_count} stale videos to PENDING")
     
-    # Get pending URLs (we pass None to get all pending since we're doing multi-provider)
-    import config
-    pending_urls = db.get_pending_videos(current_provider=None)
-    
-    if not pending_urls:
-        logger.info("No pending URLs to process")
-        return {'completed': 0, 'failed': 0}
-    
-    logger.info(f"Processing {len(pending_urls)} videos with {max_workers} workers")
+    logger.info(f"Claiming jobs for worker {WORKER_ID} with {max_workers} workers")
     
     # Show current stats
     stats = db.get_stats()
     logger.info(f"Current status distribution: {stats}")
     
-    # Process videos concurrently
-    completed = 0
-    failed = 0
+    # Process videos concurrently (None = all pending since we're doing multi-provider)
+    result = run_leased_processing(process_video, max_workers, current_provider=None)
+    completed = result['completed']
+    failed = result['failed']
     
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Submit all tasks
-        futures = {executor.submit(process_video, url): url for url in pending_urls}
-        
-        # Process results as they complete
-        for future in as_completed(futures):
-            url = futures[future]
-            try:
-                future.result()
-                completed += 1
-            except Exception as e:
-                logger.error(f"Unhandled error for {url}: {e}")
-                failed += 1
+    if completed + failed == 0:
+        logger.info("No pending URLs to process")
     
     # Final stats
     logger.info("=" * 60)
@@ -0,0 +1,60 @@
+"""
+Pipeline stage timings from the video_attempts history.
+
+Prints p50/p95 wall time per stage, optionally split by provider, domain,
+extractor or attempt kind, for capacity tuning (worker counts, timeouts, leases).
+
+Usage:
+    python stage_timings.py [--by provider] [--by domain] [--hours 24]
+"""
+import argparse
+import os
+import sys
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from storage import get_storage
+from core.storage import BaseStorage
+
+
+def format_bytes(size):
+    if not size:
+        return "-"
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+def print_report(rows, keys):
+    if not rows:
+        print("No attempts recorded in this window.")
+        return
+    widths = {key: max(len(key), *(len(str(row[key] or "-")) for row in rows)) for key in keys}
+    header = "  ".join(f"{key:{widths[key]}s}" for key in keys)
+    print(f"{header}  {'count':>6s}  {'failed':>6s}  {'p50 (s)':>9s}  {'p95 (s)':>9s}  {'bytes':>8s}")
+    for row in rows:
+        labels = "  ".join(f"{str(row[key] or '-'):{widths[key]}s}" for key in keys)
+        print(
+            f"{labels}  {row['count']:6d}  {row['failures']:6d}  "
+            f"{row['p50'] or 0:9.2f}  {row['p95'] or 0:9.2f}  {format_bytes(row['bytes']):>8s}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show p50/p95 stage timings from video_attempts.")
+    parser.add_argument("--by", action="append", default=[], choices=BaseStorage.ATTEMPT_GROUP_KEYS[1:],
+                        help="Extra grouping key (repeatable, default: provider)")
+    parser.add_argument("--hours", type=float, default=24, help="History window in hours (0 = all, default: 24)")
+    args = parser.parse_args()
+
+    group_by = tuple(args.by) or ('provider',)
+    db = get_storage()
+    rows = db.get_stage_percentiles(group_by=group_by, since_hours=args.hours or None)
+    print_report(rows, db._attempt_group_keys(group_by))
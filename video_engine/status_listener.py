@@ -0,0 +1,299 @@
+"""
+Live status feed for the dashboard and monitors.
+
+Keeps an in-memory view of the dashboard numbers (status/provider counters and the
+most recently completed videos), so readers never query the videos table.
+
+- PostgreSQL: a dedicated connection LISTENs on migrations.STATUS_CHANNEL. The
+  videos_notify_* triggers publish the new value of every counter a statement
+  changed, so the view follows writes as they commit and costs nothing while idle.
+- Other backends: the view is re-read lazily, at most every STATUS_POLL_SECONDS.
+
+Usage:
+    from status_listener import create_status_listener
+    feed = create_status_listener(db)
+    feed.snapshot()            # {'total': int, 'status': {...}, 'provider': {...}}
+    feed.recent(20)            # same rows as db.get_recent_videos(20)
+    feed.subscribe(callback)   # callback(event) after every change
+"""
+import json
+import select
+import threading
+import time
+from config import STATUS_POLL_SECONDS
+from migrations import STATUS_CHANNEL
+from core.logger import logger
+
+
+class StatusListener:
+    """
+    Polling status feed: refreshes counters and recent completions from storage
+    when read and older than `poll_seconds`. Base class of NotifyStatusListener.
+    """
+
+    def __init__(self, storage, recent_limit=50, poll_seconds=STATUS_POLL_SECONDS):
+        """
+        Args:
+            storage: BaseStorage backend to read from
+            recent_limit: Number of recent completions kept in memory
+            poll_seconds: Maximum age of the view before a read refreshes it
+        """
+        self.storage = storage
+        self.recent_limit = recent_limit
+        self.poll_seconds = poll_seconds
+
+        self._cond = threading.Condition()
+        self._counters = {'total': 0, 'status': {}, 'provider': {}}
+        self._recent = []
+        self._version = 0
+        self._loaded_at = None
+        self._subscribers = []
+
+    def start(self):
+        """Start receiving changes (no-op when polling). Returns self."""
+        return self
+
+    def stop(self):
+        """Stop receiving changes."""
+        pass
+
+    @property
+    def version(self):
+        """Incremented on every change to the view."""
+        with self._cond:
+            return self._version
+
+    def subscribe(self, callback):
+        """
+        Call `callback(event)` after every change. Events are the decoded NOTIFY
+        payloads ({'counts': [[kind, key, count], ...], 'completed': [id, ...]}),
+        or {'resync': True} when the whole view was reloaded.
+        Callbacks run on the listener thread and must not block.
+        """
+        with self._cond:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._cond:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: {'total': int, 'status': {status: count}, 'provider': {provider: count}}
+        """
+        self._ensure_fresh()
+        with self._cond:
+            return {
+                'total': self._counters['total'],
+                'status': dict(self._counters.get('status', {})),
+                'provider': dict(self._counters.get('provider', {}))
+            }
+
+    def recent(self, limit=None):
+        """
+        Returns:
+            list of dict: Most recently completed videos, like storage.get_recent_videos()
+        """
+        self._ensure_fresh()
+        with self._cond:
+            return list(self._recent[:limit or self.recent_limit])
+
+    def wait_for_change(self, since_version, timeout=None):
+        """
+        Block until the view changes after `since_version` (see `version`).
+
+        Returns:
+            int: Current version (equal to since_version on timeout)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self._ensure_fresh()
+            with self._cond:
+                if self._version != since_version:
+                    return self._version
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return self._version
+                wait = self.poll_seconds if remaining is None else min(remaining, self.poll_seconds)
+                self._cond.wait(max(wait, 0.01))
+
+    def _ensure_fresh(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.poll_seconds:
+            self.refresh()
+
+    def refresh(self):
+        """Reload the whole view from storage."""
+        counters = self.storage.get_counters()
+        recent = self.storage.get_recent_videos(limit=self.recent_limit)
+        with self._cond:
+            changed = counters != self._counters or recent != self._recent
+            self._counters = counters
+            self._recent = recent
+            self._loaded_at = time.monotonic()
+            if changed:
+                self._version += 1
+                self._cond.notify_all()
+        if changed:
+            self._publish({'resync': True})
+
+    def _publish(self, event):
+        with self._cond:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"[STATUS] Subscriber failed: {e}")
+
+
+class NotifyStatusListener(StatusListener):
+    """
+    Push status feed for PostgreSQL.
+
+    A background thread holds one dedicated connection (outside the pool, LISTEN is
+    session state), applies each NOTIFY to the in-memory counters, and re-reads the
+    recent completions only when a notification reports new ones. While the
+    connection is down, reads fall back to polling and the thread reconnects with
+    backoff, reloading the whole view once LISTEN is active again.
+    """
+
+    def __init__(self, storage, recent_limit=50, poll_seconds=STATUS_POLL_SECONDS):
+        super().__init__(storage, recent_limit, poll_seconds)
+        self._stop = threading.Event()
+        self._thread = None
+        self._listening = False
+        self._notifications = 0
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="status-listener")
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def stats(self):
+        """
+        Returns:
+            dict: {listening, notifications, version}
+        """
+        with self._cond:
+            return {
+                'listening': self._listening,
+                'notifications': self._notifications,
+                'version': self._version
+            }
+
+    def _ensure_fresh(self):
+        if not self._listening:
+            super()._ensure_fresh()
+
+    def _connect(self):
+        import psycopg2
+        # Keepalives so a silently dropped connection is noticed instead of waiting forever
+        conn = psycopg2.connect(
+            self.storage.database_url,
+            keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3
+        )
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {STATUS_CHANNEL}")
+        return conn
+
+    def _run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                # Load after LISTEN so nothing committed in between is missed
+                self.refresh()
+                with self._cond:
+                    self._listening = True
+                backoff = 1
+                logger.info(f"[STATUS] Listening for status changes on '{STATUS_CHANNEL}'")
+
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    payloads = []
+                    while conn.notifies:
+                        payloads.append(conn.notifies.pop(0).payload)
+                    if payloads:
+                        self._apply(payloads)
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                logger.warning(f"[STATUS] Listener connection lost ({e}), reconnecting in {backoff}s")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60)
+            finally:
+                with self._cond:
+                    self._listening = False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def _apply(self, payloads):
+        """Apply a batch of notifications to the view."""
+        events = []
+        for payload in payloads:
+            try:
+                events.append(json.loads(payload))
+            except ValueError:
+                logger.warning(f"[STATUS] Ignoring malformed notification: {payload[:100]}")
+
+        if any(event.get('resync') for event in events):
+            self.refresh()
+            return
+
+        # Counts are absolute values delivered in commit order, so the last one wins
+        with self._cond:
+            counters = {
+                'total': self._counters['total'],
+                'status': dict(self._counters.get('status', {})),
+                'provider': dict(self._counters.get('provider', {}))
+            }
+            for event in events:
+                for kind, key, count in event.get('counts', ()):
+                    if kind == 'total':
+                        counters['total'] = count
+                    elif count:
+                        counters.setdefault(kind, {})[key] = count
+                    else:
+                        counters.get(kind, {}).pop(key, None)
+            self._counters = counters
+            self._notifications += len(events)
+
+        # One indexed read per batch, and only when something completed
+        if any(event.get('completed') for event in events):
+            recent = self.storage.get_recent_videos(limit=self.recent_limit)
+            with self._cond:
+                self._recent = recent
+
+        with self._cond:
+            self._version += 1
+            self._cond.notify_all()
+        for event in events:
+            self._publish(event)
+
+
+def create_status_listener(storage, recent_limit=50):
+    """
+    Factory function to create the status feed for a storage backend.
+    PostgreSQL gets the LISTEN/NOTIFY listener (already started), anything else the polling one.
+    """
+    from database_supabase import SupabaseManager
+
+    if isinstance(storage, SupabaseManager):
+        return NotifyStatusListener(storage, recent_limit).start()
+    return StatusListener(storage, recent_limit)
@@ -0,0 +1,47 @@
+"""
+Storage backend selection.
+
+DATABASE_URL picks the backend by scheme:
+- postgresql:// (or postgres://) → SupabaseManager (shared PostgreSQL)
+- sqlite:///path/to/videos.db    → DatabaseManager (local file; sqlite:/// alone uses config.DB_PATH)
+
+Usage:
+    from storage import db
+"""
+from urllib.parse import urlparse
+from config import DATABASE_URL, DB_PATH
+from core.exceptions import ConfigurationError
+from core.storage import BaseStorage
+
+
+def sqlite_path_from_url(database_url):
+    """
+    Map a sqlite:/// URL to a file path (sqlite:///videos.db is relative, sqlite:////data/videos.db absolute).
+    """
+    path = database_url[len("sqlite:///"):] if database_url.startswith("sqlite:///") else ""
+    return path.split("?", 1)[0] or DB_PATH
+
+
+def get_storage(database_url=None) -> BaseStorage:
+    """
+    Factory function to create the storage backend for a database URL.
+    If database_url is not passed, it uses DATABASE_URL from config.
+    """
+    database_url = database_url or DATABASE_URL
+    scheme = urlparse(database_url).scheme.lower()
+
+    if scheme in ("postgresql", "postgres"):
+        from database_supabase import SupabaseManager
+        return SupabaseManager(database_url)
+    elif scheme == "sqlite":
+        from database import DatabaseManager
+        return DatabaseManager(sqlite_path_from_url(database_url))
+    else:
+        raise ConfigurationError(
+            f"Unsupported DATABASE_URL scheme: {scheme or database_url!r} "
+            "(expected postgresql:// or sqlite:///)"
+        )
+
+
+# Global thread-safe instance
+db = get_storage()
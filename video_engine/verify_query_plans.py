@@ -0,0 +1,293 @@
+"""
+Query plan check for SupabaseManager.
+
+Builds a large synthetic copy of the videos, videos_archive, video_uploads and
+dead_letters tables (same columns and indexes) in a scratch schema, runs every hot query method against it and EXPLAINs
+each statement it issues. Exits non-zero if any of them falls back to a sequential
+scan on one of these tables, unless the table is small enough (SMALL_TABLE_PAGES)
+that reading it whole is the cheaper plan.
+
+Usage:
+    python verify_query_plans.py [--rows 200000] [--keep]
+
+Needs DATABASE_URL and a schema at the latest migration. The real videos table is
+never read or written.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from psycopg2.extensions import make_dsn
+from database_supabase import SupabaseManager
+from migrations import ARCHIVE_COLUMNS, VIEW_COLUMNS, VIDEO_UPLOADS_BACKFILL_SQL, videos_all_view_sql
+from core.logger import logger
+
+SCHEMA = "plan_check"
+WORKER = "plan-check-worker"
+SAMPLE_URL = "https://plan-check.invalid/video/{}"
+
+# Tables that must never be sequentially scanned by a hot query
+HOT_TABLES = ("videos", "videos_archive", "video_uploads", "dead_letters")
+
+# Tables up to this many 8 kB pages (4 MB) are read faster whole than through an
+# index, so a sequential scan of one is the planner's right call: dead_letters at
+# any realistic size, everything when the check runs with a small --rows
+SMALL_TABLE_PAGES = 512
+
+# Intentionally full-table maintenance methods, not part of the hot path
+EXEMPT = ("clean_failed_videos", "reset_seekstreaming_missing_metadata", "archive_completed", "add_upload_provider")
+
+
+class _ExplainingCursor:
+    """Cursor proxy that records EXPLAIN output for each statement before running it."""
+
+    _EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+    def __init__(self, cursor, record):
+        self._cursor = cursor
+        self._record = record
+
+    def execute(self, query, params=None):
+        if isinstance(query, bytes):
+            # execute_values() sends pre-rendered bytes
+            query = query.decode()
+        if query.lstrip().upper().startswith(self._EXPLAINABLE):
+            self._cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            plan = self._cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            self._record(query, plan[0]["Plan"])
+        return self._cursor.execute(query, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class PlanCheckManager(SupabaseManager):
+    """SupabaseManager whose cursors EXPLAIN every statement, labelled by the current check."""
+
+    def __init__(self, database_url):
+        self.label = None
+        self.plans = []
+        super().__init__(database_url, write_behind_ms=0)
+
+    @contextmanager
+    def get_cursor(self):
+        with super().get_cursor() as cursor:
+            if self.label is None:
+                yield cursor
+            else:
+                yield _ExplainingCursor(cursor, lambda q, p: self.plans.append((self.label, q, p)))
+
+
+def scan_nodes(plan):
+    """Yield every node of a JSON plan tree."""
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from scan_nodes(child)
+
+
+def create_synthetic_table(db, rows):
+    """
+    Fill SCHEMA.videos with `rows` videos, distributed like a mature library:
+    mostly COMPLETED everywhere, with small slices in each queue. The oldest
+    finished third is then moved to SCHEMA.videos_archive, as archive_completed would,
+    and SCHEMA.video_uploads is backfilled from both like migration 9 does.
+    SCHEMA.dead_letters gets one dead URL per 50 videos.
+    """
+    columns = ", ".join(ARCHIVE_COLUMNS)
+    with db.get_cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+        cursor.execute(f"CREATE TABLE {SCHEMA}.videos (LIKE public.videos INCLUDING ALL)")
+        cursor.execute(f"CREATE TABLE {SCHEMA}.videos_archive (LIKE public.videos_archive INCLUDING ALL)")
+        cursor.execute(f"CREATE TABLE {SCHEMA}.video_uploads (LIKE public.video_uploads INCLUDING ALL)")
+        cursor.execute(f"CREATE TABLE {SCHEMA}.error_classes (LIKE public.error_classes INCLUDING ALL)")
+        cursor.execute(f"CREATE TABLE {SCHEMA}.dead_letters (LIKE public.dead_letters INCLUDING ALL)")
+        cursor.execute(videos_all_view_sql(VIEW_COLUMNS).replace("VIEW videos_all", f"VIEW {SCHEMA}.videos_all"))
+        cursor.execute(f"""
+            INSERT INTO {SCHEMA}.videos (
+                original_url, status, unique_id, title, description,
+                seekstreaming_id, doodstream_id, lulustream_id, upload_provider,
+                metadata_synced, worker_id, lease_expires_at, created_at, updated_at
+            )
+            SELECT
+                format(%s, i),
+                CASE
+                    WHEN b < 92 THEN 'COMPLETED'
+                    WHEN b < 97 THEN 'PENDING'
+                    WHEN b < 98 THEN 'FAILED'
+                    WHEN b < 99 THEN 'CLAIMED'
+                    ELSE 'UPLOADING'
+                END,
+                md5(i::text),
+                'Video ' || i,
+                'Synthetic row ' || i,
+                CASE WHEN b < 92 THEN 'seek' || i END,
+                CASE WHEN b < 92 THEN 'dood' || i END,
+                CASE WHEN b < 85 OR b BETWEEN 90 AND 91 THEN 'lulu' || i END,
+                CASE WHEN b < 92 THEN 'seekstreaming' END,
+                b < 90,
+                CASE WHEN b >= 98 THEN 'worker-' || (i %% 7) END,
+                CASE WHEN b >= 98 THEN now() + interval '10 minutes' - (i %% 1200) * interval '1 second' END,
+                now() - (%s - i) * interval '1 second',
+                now() - (%s - i) * interval '1 second' + interval '1 hour'
+            FROM generate_series(1, %s) AS i,
+                 LATERAL (SELECT i %% 100 AS b) AS bucket
+        """, (SAMPLE_URL.replace("{}", "%s"), rows, rows, rows))
+        cursor.execute(f"""
+            WITH moved AS (
+                DELETE FROM {SCHEMA}.videos
+                WHERE id < (SELECT MIN(id) FROM {SCHEMA}.videos) + %s
+                  AND {SupabaseManager.ARCHIVABLE_FILTER}
+                RETURNING {columns}
+            )
+            INSERT INTO {SCHEMA}.videos_archive ({columns})
+            SELECT {columns} FROM moved
+        """, (rows // 3,))
+        for statement in VIDEO_UPLOADS_BACKFILL_SQL:
+            cursor.execute(statement)
+        cursor.execute(f"""
+            INSERT INTO {SCHEMA}.dead_letters (url_hash, original_url)
+            SELECT md5(u)::uuid, u
+            FROM generate_series(1, %s) AS i, LATERAL (SELECT format(%s, 'dead-' || i) AS u) AS url
+        """, (rows // 50, SAMPLE_URL.replace("{}", "%s")))
+        cursor.execute(f"ANALYZE {SCHEMA}.dead_letters")
+        cursor.execute(f"ANALYZE {SCHEMA}.videos")
+        cursor.execute(f"ANALYZE {SCHEMA}.videos_archive")
+        cursor.execute(f"ANALYZE {SCHEMA}.video_uploads")
+
+
+def table_pages(db):
+    """
+    Size of the synthetic HOT_TABLES, as of their last ANALYZE.
+
+    Returns:
+        dict: {table: pages}
+    """
+    with db.get_cursor() as cursor:
+        cursor.execute("""
+            SELECT relname, relpages FROM pg_class
+            WHERE relnamespace = %s::regnamespace AND relname = ANY(%s)
+        """, (SCHEMA, list(HOT_TABLES)))
+        return dict(cursor.fetchall())
+
+
+def build_checks(rows):
+    """(label, callable) pairs covering the hot query methods of SupabaseManager."""
+    state = {}
+    sample = SAMPLE_URL.format(rows // 2)
+    archived = SAMPLE_URL.format(rows // 4)
+    failed = SAMPLE_URL.format(rows // 2 + 97)  # i % 100 == 97 is FAILED
+
+    def claim(db):
+        state["claimed"] = db.claim_jobs(WORKER, limit=5)
+        return state["claimed"]
+
+    return [
+        ("get_pending_videos", lambda db: db.get_pending_videos()),
+        ("get_pending_videos[doodstream]", lambda db: db.get_pending_videos("doodstream")),
+        ("get_pending_videos[lulustream]", lambda db: db.get_pending_videos("lulustream")),
+        ("iter_pending_videos", lambda db: list(itertools.islice(db.iter_pending_videos(page_size=100), 250))),
+        ("claim_jobs", claim),
+        ("renew_leases", lambda db: db.renew_leases(WORKER)),
+        ("release_jobs", lambda db: db.release_jobs(WORKER, state.get("claimed", []))),
+        ("reclaim_expired_leases", lambda db: db.reclaim_expired_leases()),
+        ("reset_stale_statuses", lambda db: db.reset_stale_statuses()),
+        ("get_missing_backup_videos", lambda db: db.get_missing_backup_videos()),
+        ("iter_missing_backup_videos", lambda db: list(itertools.islice(db.iter_missing_backup_videos(page_size=100), 250))),
+        ("iter_unsynced_metadata_videos", lambda db: list(itertools.islice(db.iter_unsynced_metadata_videos(page_size=100), 250))),
+        ("get_recent_videos", lambda db: db.get_recent_videos()),
+        ("get_video_status", lambda db: db.get_video_status(sample)),
+        ("get_video_details", lambda db: db.get_video_details(sample)),
+        ("get_all_upload_ids", lambda db: db.get_all_upload_ids(sample)),
+        ("get_all_upload_ids[archived]", lambda db: db.get_all_upload_ids(archived)),
+        ("get_known_urls", lambda db: db.get_known_urls([SAMPLE_URL.format(i) for i in range(1, rows, max(1, rows // 50))])),
+        ("iter_provider_uploads", lambda db: list(itertools.islice(db.iter_provider_uploads("lulustream", page_size=100), 250))),
+        ("iter_missing_provider_uploads", lambda db: list(itertools.islice(db.iter_missing_provider_uploads("lulustream", page_size=100), 250))),
+        ("get_stats[doodstream]", lambda db: db.get_stats("doodstream")),
+        ("update_status", lambda db: db.update_status(sample, "COMPLETED")),
+        ("record_upload", lambda db: db.record_upload(sample, "lulustream", "plan-check", size=1)),
+        ("insert_video", lambda db: db.insert_video(SAMPLE_URL.format("new"))),
+        ("seed_new_links", lambda db: db.seed_new_links([SAMPLE_URL.format(f"seed-{i}") for i in range(50)])),
+        ("update_status[archived]", lambda db: db.update_status(archived, "COMPLETED")),
+        ("clear_provider_uploads", lambda db: db.clear_provider_uploads(
+            [archived] + [SAMPLE_URL.format(i) for i in range(3, rows, max(1, rows // 100))], "lulustream", batch_size=50)),
+        ("log_error[dead_letter]", lambda db: db.log_error(failed, "HTTP Error 404: Not Found")),
+    ]
+
+
+def verify(rows, keep=False):
+    """
+    Run the plan check.
+
+    Returns:
+        bool: True if no hot query sequentially scans a HOT_TABLES table over SMALL_TABLE_PAGES
+    """
+    database_url = os.getenv("DATABASE_URL")
+    # Make sure the real schema is current before shadowing it
+    SupabaseManager(database_url).close()
+    db = PlanCheckManager(make_dsn(database_url, options=f"-c search_path={SCHEMA},public"))
+
+    try:
+        print(f"Building synthetic table {SCHEMA}.videos with {rows} rows...")
+        create_synthetic_table(db, rows)
+        pages = table_pages(db)
+
+        for label, check in build_checks(rows):
+            db.label = label
+            try:
+                check(db)
+            finally:
+                db.label = None
+
+        failures = 0
+        for label, query, plan in db.plans:
+            nodes = list(scan_nodes(plan))
+            scanned = {n.get("Relation Name") for n in nodes if n["Node Type"] == "Seq Scan"} & set(HOT_TABLES)
+            seq_scans = sorted(t for t in scanned if pages.get(t, 0) > SMALL_TABLE_PAGES)
+            access = ", ".join(sorted({n["Index Name"] for n in nodes if "Index Name" in n})) or "-"
+            small = sorted(scanned - set(seq_scans))
+            if small:
+                access += f" (seq scan of small {', '.join(small)})"
+            verdict = "FAIL" if seq_scans else "ok"
+            failures += bool(seq_scans)
+            print(f"  [{verdict:4s}] {label:32s} {access}")
+            if seq_scans:
+                print("         " + " ".join(query.split())[:160])
+
+        print(f"\n{len(db.plans)} statements checked, {failures} sequential scan(s) on {'/'.join(HOT_TABLES)}")
+        print(f"Table sizes (pages, small <= {SMALL_TABLE_PAGES}): "
+              + ", ".join(f"{table} {pages.get(table, 0)}" for table in HOT_TABLES))
+        print(f"Not checked (full-table maintenance): {', '.join(EXEMPT)}")
+        return failures == 0
+    finally:
+        if not keep:
+            with db.get_cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if a hot SupabaseManager query needs a sequential scan.")
+    parser.add_argument("--rows", type=int, default=200000, help="Synthetic table size (default: 200000)")
+    parser.add_argument("--keep", action="store_true", help=f"Keep the {SCHEMA} schema for inspection")
+    args = parser.parse_args()
+
+    ok = verify(args.rows, keep=args.keep)
+    if not ok:
+        logger.error("[MAINTENANCE] Query plan check failed")
+    sys.exit(0 if ok else 1)
@@ -11,7 +11,7 @@ import time
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from config import MAX_WORKERS, MIN_FREE_DISK_GB
-from database_supabase import db
+from storage import db
 from core.logger import logger
 from core.downloader import VideoDownloader
 from core.uploader import get_uploader
@@ -19,7 +19,7 @@ from core.utils import cleanup_file, check_disk_space
 from extractors import get_extractor
 from core.exceptions import (
     PipelineException, ExtractionError, DownloadError, 
-    UploadError, DiskSpaceError
+    UploadError, DiskSpaceError, InvalidTransitionError
 )
 
 
@@ -46,8 +46,6 @@ def process_video(url):
             if status == 'COMPLETED' and upload_provider == current_provider:
                 logger.info(f"Skipping {url} (already COMPLETED on {current_provider})")
                 return
-        else:
-            db.insert_video(url)
         
         # 2. Check disk space before proceeding
         if not check_disk_space(MIN_FREE_DISK_GB):
@@ -56,8 +54,8 @@ def process_video(url):
             if not check_disk_space(MIN_FREE_DISK_GB):
                 raise DiskSpaceError(f"Insufficient disk space (< {MIN_FREE_DISK_GB}GB)", url=url)
         
-        # 3. Extract video URL and title
-        db.update_status(url, 'EXTRACTING', upload_provider=current_provider)
+        # 3. Extract video URL and title (inserts the video if it is new)
+        db.start_stage(url, 'EXTRACTING', upload_provider=current_provider)
         extractor = get_extractor(url)
         video_url, title, description = extractor.extract(url)
         
@@ -68,13 +66,13 @@ def process_video(url):
         title, description = clean_metadata(title, description)
         
         # 4. Download
-        db.update_status(url, 'DOWNLOADING', upload_provider=current_provider)
+        db.start_stage(url, 'DOWNLOADING', upload_provider=current_provider)
         downloader = VideoDownloader()
         filename, filepath = downloader.download(video_url, original_page_url=url)
         
         try:
             # 5. Upload to Selected Provider
-            db.update_status(url, 'UPLOADING', local_filename=filename, upload_provider=current_provider)
+            db.start_stage(url, 'UPLOADING', local_filename=filename, upload_provider=current_provider)
             uploader = get_uploader()
             
             # upload_provider from the already-imported config at top of function
@@ -101,6 +99,11 @@ def process_video(url):
             # GUARANTEED cleanup (even if upload fails)
             cleanup_file(filepath)
     
+    except InvalidTransitionError:
+        # Another run moved the video on: leave its row alone
+        if filepath:
+            cleanup_file(filepath)
+    
     except PipelineException as e:
         # Already logged by exception __init__
         db.log_error(url, str(e), provider=current_provider)
@@ -138,8 +141,8 @@ def main():
     logger.info("Starting Video Ingestion Pipeline")
     logger.info("=" * 60)
     
-    # Initialize database
-    db._init_db()
+    # Bring the database schema up to date
+    db.migrate()
     
     # CRITICAL: Reset zombie threads from previous crashes
     stale_count = db.reset_stale_statuses()